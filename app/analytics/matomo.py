@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""Matomo API Client Module
+
+Client of the Matomo reporting API used by `flask update_analytics`.
+
+In bulk mode, the missing days are requested as ranges of consecutive days
+(period=day&date=START,END), for which Matomo answers with the report of
+each day, and the requests are grouped in API.getBulkRequest calls. The
+bulk calls run concurrently over a pooled requests.Session. Without bulk
+mode, every report of every day is requested on its own.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# maximum number of days of a range request
+MAX_RANGE_DAYS = 366
+
+# maximum number of requests grouped in one API.getBulkRequest call
+BULK_REQUEST_SIZE = 50
+
+
+class MatomoError(Exception):
+    """
+        Raised when Matomo answers a request with an error
+    """
+    pass
+
+
+def date_ranges(dates, max_days=MAX_RANGE_DAYS):
+    """
+        Groups dates into ranges of consecutive days
+
+        Args:
+            dates: list of dates as YYYY-MM-DD strings
+            max_days: maximum number of days of a range
+
+        Returns:
+            list of (first day, last day) strings
+    """
+    ranges = []
+    start = end = None
+    for day in sorted(datetime.strptime(d, '%Y-%m-%d').date() for d in set(dates)):
+        if start is not None and day == end + timedelta(days=1) \
+                and (day - start).days < max_days:
+            end = day
+            continue
+        if start is not None:
+            ranges.append((str(start), str(end)))
+        start = end = day
+    if start is not None:
+        ranges.append((str(start), str(end)))
+    return ranges
+
+
+def _check(result):
+    if isinstance(result, dict) and result.get('result') == 'error':
+        raise MatomoError(result.get('message'))
+    return result
+
+
+class MatomoClient(object):
+    """
+        Client of the reporting API of a Matomo site
+    """
+
+    def __init__(self, base_url, site_id, token_auth, bulk=True,
+                 max_workers=4, bulk_size=BULK_REQUEST_SIZE, session=None):
+        """
+            Args:
+                base_url: URL of the Matomo server, e.g. "https://matomo.example/"
+                site_id: id of the site in Matomo
+                token_auth: API token
+                bulk: whether to request day ranges in bulk requests
+                max_workers: maximum number of concurrent API calls
+                bulk_size: maximum number of requests per bulk request
+                session: requests session to use, a pooled one by default
+        """
+        self.base_url = base_url
+        self.site_id = site_id
+        self.token_auth = token_auth
+        self.bulk = bulk
+        self.max_workers = max_workers
+        self.bulk_size = bulk_size
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+
+    def _query(self, method, period, date, params):
+        query = {
+            'method': method,
+            'idSite': self.site_id,
+            'period': period,
+            'date': date,
+            'format': 'json',
+            'filter_limit': -1,
+        }
+        query.update(params)
+        return query
+
+    def request(self, query):
+        """
+            Sends one API request
+
+            Args:
+                query: dict of the API parameters
+
+            Returns:
+                the decoded JSON response
+        """
+        response = self.session.post(
+            self.base_url,
+            params={'module': 'API', 'format': 'json'},
+            data=dict(query, token_auth=self.token_auth),
+        )
+        response.raise_for_status()
+        return _check(response.json())
+
+    def bulk_request(self, queries):
+        """
+            Sends API requests grouped in one API.getBulkRequest call
+
+            Args:
+                queries: list of dicts of API parameters
+
+            Returns:
+                list of the responses, in the order of the queries
+        """
+        data = dict(
+            ('urls[{}]'.format(index), urlencode(query))
+            for index, query in enumerate(queries)
+        )
+        data['token_auth'] = self.token_auth
+        response = self.session.post(
+            self.base_url,
+            params={'module': 'API', 'method': 'API.getBulkRequest', 'format': 'json'},
+            data=data,
+        )
+        response.raise_for_status()
+        return [_check(result) for result in response.json()]
+
+    def _map(self, func, items):
+        if self.max_workers <= 1 or len(items) <= 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(func, items))
+
+    def get_days_bulk(self, method, dates, params_list):
+        """
+            Gets the daily reports of a method for several sets of
+            parameters, e.g. one set per page URL
+
+            Args:
+                method: API method, e.g. "Actions.getPageUrl"
+                dates: list of days as YYYY-MM-DD strings
+                params_list: list of dicts of extra API parameters
+
+            Returns:
+                list aligned with params_list of dicts of day -> report
+        """
+        reports = [{} for _ in params_list]
+        if not dates or not params_list:
+            return reports
+
+        if self.bulk:
+            subrequests = [
+                (index, None, self._query(method, 'day', '{},{}'.format(*day_range), params))
+                for day_range in date_ranges(dates)
+                for index, params in enumerate(params_list)
+            ]
+        else:
+            subrequests = [
+                (index, day, self._query(method, 'day', day, params))
+                for day in sorted(set(dates))
+                for index, params in enumerate(params_list)
+            ]
+
+        if self.bulk:
+            chunks = [
+                subrequests[start:start + self.bulk_size]
+                for start in range(0, len(subrequests), self.bulk_size)
+            ]
+            results = self._map(
+                lambda chunk: self.bulk_request([query for _, _, query in chunk]),
+                chunks)
+            responses = [response for result in results for response in result]
+        else:
+            responses = self._map(
+                lambda subrequest: self.request(subrequest[2]), subrequests)
+
+        for (index, day, _), response in zip(subrequests, responses):
+            if day is None:
+                # range requests answer with the report of each day
+                if isinstance(response, dict):
+                    reports[index].update(response)
+            else:
+                reports[index][day] = response
+        return reports
+
+    def get_days(self, method, dates, **params):
+        """
+            Gets the daily reports of a method
+
+            Returns:
+                dict of day -> report
+        """
+        return self.get_days_bulk(method, dates, [params])[0]
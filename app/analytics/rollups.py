@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""Matomo Rollups Module
+
+Monthly and yearly sums of the Matomo daily tables, read by the analytics
+endpoints instead of the years of daily rows.
+
+The rollups are maintained incrementally at the end of
+`flask update_analytics`: the state of each report holds the id of the
+last daily row included, and only the months and years of the newer
+daily rows are recomputed. A report whose state is behind its daily
+table is not read, the endpoints then aggregate the daily rows.
+"""
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, literal
+
+from app import db
+from app.models import (
+    MatomoDailyGetDatasetPageViewsSummary, MatomoDailyGetPageUrlsSummary,
+    MatomoDailyGetSiteSearchKeywords, MatomoDailyVisitsSummary,
+    MatomoPageViewsRollup, MatomoRollupState, MatomoVisitsSummaryRollup, eastern)
+
+
+ROLLUP_PERIODS = ("month", "year")
+
+# searches with less time spent on the results are not counted, users are
+# probably still typing the words of the search
+KEYWORD_MIN_TIME_SPENT = 2
+
+# columns of the visits summary summed over a period
+VISITS_SUMMED_COLUMNS = (
+    "bounce_count",
+    "nb_actions",
+    "nb_visits",
+    "nb_visits_converted",
+    "sum_visit_length",
+)
+
+# unique counts of the visits summary, a visitor coming back on several
+# days is counted on each of them so these are not summed over a period
+VISITS_UNIQUE_COLUMNS = (
+    "nb_uniq_visitors",
+    "nb_users",
+)
+
+
+def period_start(day, period):
+    """
+        Returns the first day of the month or year of a day
+    """
+    if period == "month":
+        return day.replace(day=1)
+    return date(day.year, 1, 1)
+
+
+def period_end(start, period):
+    """
+        Returns the first day of the next month or year
+    """
+    if period == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return date(start.year + 1, 1, 1)
+
+
+def _visits_summary_rows(period, start, end):
+    visits = MatomoDailyVisitsSummary
+    row = db.session.query(
+        func.count(visits.id),
+        func.max(visits.max_actions),
+        *[func.coalesce(func.sum(getattr(visits, column)), 0)
+          for column in VISITS_SUMMED_COLUMNS]
+    ).filter(visits.day >= start, visits.day < end).one()
+
+    if not row[0]:
+        return []
+
+    element = dict(zip(VISITS_SUMMED_COLUMNS, row[2:]))
+    element.update(period=period, period_start=start,
+                   nb_days=row[0], max_actions=row[1])
+    return [element]
+
+
+def _page_views_rows(report, daily, item, filters):
+    def rows(period, start, end):
+        url = func.min(daily.url) if hasattr(daily, "url") else literal(None)
+        nb_uniq_visitors = func.coalesce(func.sum(daily.nb_uniq_visitors), 0) \
+            if hasattr(daily, "nb_uniq_visitors") else literal(None)
+        query = db.session.query(
+            item,
+            url,
+            func.min(daily.label),
+            func.coalesce(func.sum(daily.nb_hits), 0),
+            func.coalesce(func.sum(daily.nb_visits), 0),
+            nb_uniq_visitors,
+        ).filter(daily.day >= start, daily.day < end, item.isnot(None), *filters)
+
+        return [
+            {
+                "report": report,
+                "period": period,
+                "period_start": start,
+                "item": row[0],
+                "url": row[1],
+                "label": row[2],
+                "nb_hits": row[3],
+                "nb_visits": row[4],
+                "nb_uniq_visitors": row[5],
+            }
+            for row in query.group_by(item).all()
+        ]
+    return rows
+
+
+def _reports():
+    """
+        Returns dict of report -> (daily model, rollup model, function
+        computing the rollup rows of a period)
+    """
+    views = MatomoDailyGetDatasetPageViewsSummary
+    pages = MatomoDailyGetPageUrlsSummary
+    searches = MatomoDailyGetSiteSearchKeywords
+    return {
+        "visits_summary": (
+            MatomoDailyVisitsSummary, MatomoVisitsSummaryRollup,
+            _visits_summary_rows),
+        "dataset_views": (
+            views, MatomoPageViewsRollup,
+            _page_views_rows("dataset_views", views, views.dataset_id, [])),
+        "page_urls": (
+            pages, MatomoPageViewsRollup,
+            _page_views_rows("page_urls", pages, pages.label, [])),
+        "keywords": (
+            searches, MatomoPageViewsRollup,
+            _page_views_rows("keywords", searches, searches.label,
+                             [searches.sum_time_spent >= KEYWORD_MIN_TIME_SPENT])),
+    }
+
+
+def _refresh_report(report, daily, rollup, compute_rows):
+    state = MatomoRollupState.query.filter_by(report=report).one_or_none()
+    last_id = state.last_id if state is not None else 0
+    max_id = db.session.query(func.max(daily.id)).scalar() or 0
+    if state is not None and max_id <= last_id:
+        return 0
+
+    new_days = [row[0] for row in db.session.query(daily.day).filter(
+        daily.id > last_id, daily.day.isnot(None)).distinct()]
+    periods = sorted(set(
+        (period, period_start(day, period))
+        for day in new_days for period in ROLLUP_PERIODS))
+
+    for period, start in periods:
+        query = rollup.query.filter_by(period=period, period_start=start)
+        if rollup is MatomoPageViewsRollup:
+            query = query.filter_by(report=report)
+        query.delete(synchronize_session=False)
+        db.session.bulk_insert_mappings(
+            rollup, compute_rows(period, start, period_end(start, period)))
+
+    if state is None:
+        state = MatomoRollupState(report=report)
+        db.session.add(state)
+    state.last_id = max_id
+    state.date_updated = datetime.now(tz=eastern)
+    db.session.commit()
+
+    return len(periods)
+
+
+def refresh_matomo_rollups():
+    """
+        Recomputes the rollups of the months and years of the daily rows
+        inserted since the last refresh, each report in one transaction
+
+        Returns:
+            dict of report -> number of periods recomputed
+    """
+    return dict(
+        (report, _refresh_report(report, daily, rollup, compute_rows))
+        for report, (daily, rollup, compute_rows) in _reports().items()
+    )
+
+
+def rollups_current(report):
+    """
+        Returns whether the rollups of a report include every daily row
+    """
+    daily = _reports()[report][0]
+    state = MatomoRollupState.query.filter_by(report=report).one_or_none()
+    if state is None:
+        return False
+    return state.last_id >= (db.session.query(func.max(daily.id)).scalar() or 0)
@@ -7,13 +7,22 @@
 import json
 import re
 
-from datetime import date
-from flask import render_template, request
+from datetime import date, timedelta
+from flask import abort, render_template, request
 from flask_login import current_user
+from sqlalchemy import func
+from app import db
 from app.analytics import analytics_bp
-from app.pipelines import pipelines
+from app.analytics.rollups import (
+    KEYWORD_MIN_TIME_SPENT, ROLLUP_PERIODS, VISITS_SUMMED_COLUMNS,
+    VISITS_UNIQUE_COLUMNS, period_start, rollups_current)
+from app.analytics.series import GRANULARITIES, date_bucket
+from app.analytics.totals import PORTAL_DOWNLOAD_URL
+from app.caching import conditional_json
+from app.pipelines.registry import get_pipeline_registry
 
 from app.models import MatomoDailyVisitsSummary, MatomoDailyGetDatasetPageViewsSummary, MatomoDailyGetSiteSearchKeywords, MatomoDailyGetPageUrlsSummary, Dataset, MatomoDailyGetPortalDownloadSummary
+from app.models import MatomoPageViewsRollup, MatomoVisitsSummaryRollup
 
 
 @analytics_bp.route('/analytics')
@@ -31,217 +40,380 @@ def analytics():
     return render_template('analytics.html', title='CONP | Analytics', user=current_user)
 
 
+def _request_date(arg):
+    """
+        Returns the date of an optional argument of the request formatted
+        as YYYY-MM-DD
+    """
+    value = request.args.get(arg, None)
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        abort(400)
+
+
+def _filter_date_range(query, date_column):
+    """
+        Filters a Date column of a query on the optional "from" and "to"
+        arguments of the request, inclusive dates formatted as YYYY-MM-DD
+    """
+    for arg in ('from', 'to'):
+        value = _request_date(arg)
+        if value is None:
+            continue
+        if arg == 'from':
+            query = query.filter(date_column >= value)
+        else:
+            query = query.filter(date_column <= value)
+    return query
+
+
+def _request_granularity():
+    """
+        Returns the optional "granularity" argument of the request, "day",
+        "week", "month" or "year"
+    """
+    granularity = request.args.get('granularity', None)
+    if granularity is not None and granularity not in GRANULARITIES:
+        abort(400)
+    return granularity
+
+
+def _rollup_period(report, granularity):
+    """
+        Returns the period of the rollups answering the request, None if
+        the daily rows must be aggregated instead
+
+        The monthly or yearly rollups answer the requests with a month or
+        year granularity, the yearly rollups the requests without one,
+        when the requested date range starts and ends on period boundaries
+        and the rollups of the report are up to date.
+    """
+    period = granularity if granularity is not None else 'year'
+    if period not in ROLLUP_PERIODS:
+        return None
+
+    start = _request_date('from')
+    if start is not None and period_start(start, period) != start:
+        return None
+    end = _request_date('to')
+    if end is not None:
+        next_day = end + timedelta(days=1)
+        if period_start(next_day, period) != next_day:
+            return None
+
+    if not rollups_current(report):
+        return None
+    return period
+
+
+def _page_views_source(report, granularity, daily, daily_item):
+    """
+        Returns (table, item column, date column, filters) to query the
+        page views of a report, the rollups of the report if they answer
+        the request, the daily table otherwise
+    """
+    period = _rollup_period(report, granularity)
+    if period is None:
+        return daily, daily_item, daily.day, []
+
+    rollup = MatomoPageViewsRollup
+    return rollup, rollup.item, rollup.period_start, \
+        [rollup.report == report, rollup.period == period]
+
+
+def _date_bucket(date_column, granularity):
+    return date_bucket(
+        date_column, granularity, db.session.get_bind().dialect.name)
+
+
+def _aggregate(query, date_column, granularity, group_by, order_by):
+    """
+        Runs an aggregate query on the requested date range, grouped by
+        the given columns and, if a granularity is given, by date bucket.
+        The first day of the bucket is then the last column of the rows
+        and the rows are ordered by bucket first.
+
+        The date column is either the day column of a daily table or the
+        period_start column of rollups of the requested granularity, which
+        are their own buckets.
+    """
+    group_by = list(group_by)
+    order_by = list(order_by)
+    if granularity is not None:
+        bucket = _date_bucket(date_column, granularity)
+        query = query.add_columns(bucket)
+        group_by.insert(0, bucket)
+        order_by.insert(0, bucket)
+
+    return _filter_date_range(query, date_column) \
+        .group_by(*group_by).order_by(*order_by).all()
+
+
 @analytics_bp.route('/analytics/visitors')
+@conditional_json(lambda: date.today())
 def visitors():
     """ Analytics/Visitors Route
 
         Endpoint for returning analytics related to visitors to the portal
 
         Args:
-            None
+            from, to: only return the visits between these dates
+            granularity: "day", "week", "month" or "year", sum the visits
+                         of each bucket instead of returning the daily rows,
+                         the unique visitors and users are null for buckets
+                         longer than a day
 
         Returns:
             Object
     """
 
-    elements = []
-
-    daily_visits = MatomoDailyVisitsSummary.query.order_by(
-        MatomoDailyVisitsSummary.id).all()
+    granularity = _request_granularity()
+
+    visits = MatomoDailyVisitsSummary
+
+    # the visits of the current month are not complete yet
+    first_day_of_month = date.today().replace(day=1)
+
+    if granularity is None:
+        daily_visits = _filter_date_range(visits.query, visits.day) \
+            .filter(visits.day < first_day_of_month) \
+            .order_by(visits.id).all()
+
+        elements = [
+            {
+                "id": v.id,
+                "date": v.date,
+                "avg_time_on_site": v.avg_time_on_site,
+                "bounce_count": v.bounce_count,
+                "max_actions": v.max_actions,
+                "nb_actions": v.nb_actions,
+                "nb_actions_per_visit": v.nb_actions_per_visit,
+                "nb_uniq_visitors": v.nb_uniq_visitors,
+                "nb_users": v.nb_users,
+                "nb_visits": v.nb_visits,
+                "nb_visits_converted": v.nb_visits_converted,
+                "sum_visit_length": v.sum_visit_length
+            }
+            for v in daily_visits
+        ]
+
+        return json.dumps(elements)
+
+    # the monthly rollups answer the requests aligned on months
+    period = _rollup_period('visits_summary', granularity) \
+        if granularity == 'month' else None
+    source = visits if period is None else MatomoVisitsSummaryRollup
+    # a day is its own bucket, its unique counts are exact
+    unique_columns = VISITS_UNIQUE_COLUMNS if granularity == 'day' else ()
+    query = db.session.query(
+        func.max(source.max_actions),
+        *[func.coalesce(func.sum(getattr(source, column)), 0)
+          for column in VISITS_SUMMED_COLUMNS + unique_columns]
+    )
+    if period is None:
+        date_column = visits.day
+        query = query.filter(date_column < first_day_of_month)
+    else:
+        date_column = source.period_start
+        query = query.filter(date_column < first_day_of_month, source.period == period)
 
-    current_date = date.today()
+    rows = _aggregate(query, date_column, granularity, group_by=[], order_by=[])
 
-    for v in daily_visits:
-        visit_date = date.fromisoformat(v.date)
-        if (visit_date.year == current_date.year) \
-                and (visit_date.month == current_date.month):
-            continue
-        element = {
-            "id": v.id,
-            "date": v.date,
-            "avg_time_on_site": v.avg_time_on_site,
-            "bounce_count": v.bounce_count,
-            "max_actions": v.max_actions,
-            "nb_actions": v.nb_actions,
-            "nb_actions_per_visit": v.nb_actions_per_visit,
-            "nb_uniq_visitors": v.nb_uniq_visitors,
-            "nb_users": v.nb_users,
-            "nb_visits": v.nb_visits,
-            "nb_visits_converted": v.nb_visits_converted,
-            "sum_visit_length": v.sum_visit_length
-        }
+    elements = []
+    for row in rows:
+        element = dict.fromkeys(VISITS_UNIQUE_COLUMNS)
+        element.update(zip(VISITS_SUMMED_COLUMNS + unique_columns, row[1:-1]))
+        nb_visits = element["nb_visits"]
+        element["date"] = str(row[-1])
+        element["max_actions"] = row[0]
+        element["avg_time_on_site"] = \
+            round(element["sum_visit_length"] / nb_visits) if nb_visits else 0
+        element["nb_actions_per_visit"] = \
+            round(element["nb_actions"] / nb_visits, 1) if nb_visits else 0
         elements.append(element)
 
     return json.dumps(elements)
 
 
 @analytics_bp.route('/analytics/datasets/views')
+@conditional_json()
 def datasets_views():
     """ Analytics/Datasets/Views Route
 
         Endpoint for returning analytics related to dataset page views on the portal
 
         Args:
-            None
+            id: only return the views of this dataset
+            from, to: only count the views between these dates
+            granularity: "day", "week", "month" or "year", sum the views
+                         of each dataset per bucket
 
         Returns:
             Object
     """
 
-    elements = []
+    granularity = _request_granularity()
 
-    page_views = []
+    views, dataset_id, date_column, filters = _page_views_source(
+        'dataset_views', granularity,
+        MatomoDailyGetDatasetPageViewsSummary,
+        MatomoDailyGetDatasetPageViewsSummary.dataset_id)
+    nb_hits = func.coalesce(func.sum(views.nb_hits), 0)
 
-    id = request.args.get('id', None)
+    query = db.session.query(
+        dataset_id,
+        Dataset.name,
+        func.min(views.url),
+        func.min(views.label),
+        nb_hits,
+        func.coalesce(func.sum(views.nb_visits), 0),
+        func.coalesce(func.sum(views.nb_uniq_visitors), 0),
+    ).join(Dataset, Dataset.dataset_id == dataset_id).filter(*filters)
 
+    id = request.args.get('id', None)
     if id is not None:
-        page_views = MatomoDailyGetDatasetPageViewsSummary.query.filter_by(
-            dataset_id=id).all()
+        query = query.filter(dataset_id == id)
 
-    else:
-        page_views = MatomoDailyGetDatasetPageViewsSummary.query.order_by(
-            MatomoDailyGetDatasetPageViewsSummary.id).all()
-
-    for v in page_views:
-        exists = False
-        for e in elements:
-            dataset_id = e.get("dataset_id", None)
-            if dataset_id is not None and dataset_id == v.dataset_id:
-                exists = True
-                e["nb_hits"] += v.nb_hits
-                e["nb_visits"] += v.nb_visits
-                e["nb_uniq_visitors"] += (
-                    v.nb_uniq_visitors if v.nb_uniq_visitors is not None else 0)
-
-        if not exists and v.dataset_id is not None:
-            dataset_info = Dataset.query.filter_by(dataset_id=v.dataset_id).one()
-            element = {
-                "dataset_id": v.dataset_id,
-                "dataset_name": dataset_info.name,
-                "url": v.url,
-                "label": v.label,
-                "nb_hits": v.nb_hits,
-                "nb_visits": v.nb_visits,
-                "nb_uniq_visitors": v.nb_uniq_visitors if v.nb_uniq_visitors is not None else 0,
-            }
-            elements.append(element)
+    rows = _aggregate(query, date_column, granularity,
+                      group_by=[dataset_id, Dataset.name],
+                      order_by=[nb_hits.desc(), func.min(views.id)])
 
-    elements.sort(key=lambda e: e["nb_hits"], reverse=True)
+    elements = []
+    for row in rows:
+        element = {
+            "dataset_id": row[0],
+            "dataset_name": row[1],
+            "url": row[2],
+            "label": row[3],
+            "nb_hits": row[4],
+            "nb_visits": row[5],
+            "nb_uniq_visitors": row[6],
+        }
+        if granularity is not None:
+            element["date"] = str(row[-1])
+        elements.append(element)
 
     return json.dumps(elements)
 
 
 @analytics_bp.route('/analytics/datasets/downloads')
+@conditional_json()
 def datasets_downloads():
     """ Analytics/Datasets/Downloads Route
         Endpoint for returning analytics related to dataset page downloads on the portal
         Args:
-            None
+            id: only return the downloads of this dataset
+            from, to: only count the downloads between these dates
         Returns:
             Object
     """
 
-    elements = []
+    downloads = MatomoDailyGetPortalDownloadSummary
+    nb_hits = func.coalesce(func.sum(downloads.nb_hits), 0)
 
-    page_downloads = []
+    # skip entries not pertinent to the actual dataset download
+    query = db.session.query(
+        downloads.url,
+        func.min(downloads.label),
+        nb_hits,
+        func.coalesce(func.sum(downloads.nb_visits), 0),
+        func.coalesce(func.sum(downloads.nb_uniq_visitors), 0),
+    ).filter(downloads.url.contains(PORTAL_DOWNLOAD_URL))
 
     id = request.args.get('id', None)
-    url_id = id.replace('projects/', 'https://portal.conp.ca/data/') if id else None
-
     if id is not None:
-        page_downloads = MatomoDailyGetPortalDownloadSummary.query.filter_by(
-            url=url_id).all()
-    else:
-        page_downloads = MatomoDailyGetPortalDownloadSummary.query.order_by(
-            MatomoDailyGetPortalDownloadSummary.id).all()
-
-    for v in page_downloads:
-        # skip entries not pertinent to the actual dataset download
-        if not v.url or 'https://portal.conp.ca/data/' not in v.url:
-            continue
-        exists = False
-        v.dataset_id = v.url.replace('https://portal.conp.ca/data/', '')
-        for e in elements:
-            dataset_id = e.get("dataset_id", None)
-            if dataset_id is not None and dataset_id == v.dataset_id:
-                exists = True
-                e["nb_hits"] += v.nb_hits
-                e["nb_visits"] += v.nb_visits
-                e["nb_uniq_visitors"] += (
-                    v.nb_uniq_visitors if v.nb_uniq_visitors is not None else 0)
-
-        if not exists and v.dataset_id is not None:
-            element = {
-                "dataset_id": v.dataset_id,
-                "url": v.url,
-                "label": v.label,
-                "nb_hits": v.nb_hits,
-                "nb_visits": v.nb_visits,
-                "nb_uniq_visitors": v.nb_uniq_visitors if v.nb_uniq_visitors is not None else 0,
-            }
-            elements.append(element)
-
-    elements.sort(key=lambda e: e["nb_hits"], reverse=True)
+        url_id = id.replace('projects/', PORTAL_DOWNLOAD_URL)
+        query = query.filter(downloads.url == url_id)
+
+    rows = _aggregate(query, downloads.day, None,
+                      group_by=[downloads.url],
+                      order_by=[nb_hits.desc(), func.min(downloads.id)])
+
+    elements = [
+        {
+            "dataset_id": url.replace(PORTAL_DOWNLOAD_URL, ''),
+            "url": url,
+            "label": label,
+            "nb_hits": row_nb_hits,
+            "nb_visits": nb_visits,
+            "nb_uniq_visitors": nb_uniq_visitors,
+        }
+        for url, label, row_nb_hits, nb_visits, nb_uniq_visitors in rows
+    ]
 
     return json.dumps(elements)
 
 
 @analytics_bp.route('/analytics/pipelines/views')
+@conditional_json()
 def pipelines_views():
     """ Analytics/Pipelines/Views Route
 
         Endpoint for returning analytics related to pipeline page views on the portal
 
         Args:
-            None
+            id: only return the views of this pipeline
+            from, to: only count the views between these dates
+            granularity: "day", "week", "month" or "year", sum the views
+                         of each pipeline per bucket
 
         Returns:
             Object
     """
 
-    elements = []
+    granularity = _request_granularity()
 
-    page_views = []
+    pages, label, date_column, filters = _page_views_source(
+        'page_urls', granularity,
+        MatomoDailyGetPageUrlsSummary, MatomoDailyGetPageUrlsSummary.label)
+    nb_hits = func.coalesce(func.sum(pages.nb_hits), 0)
 
-    id = request.args.get('id', None)
+    query = db.session.query(
+        label,
+        func.min(pages.url),
+        nb_hits,
+        func.coalesce(func.sum(pages.nb_visits), 0),
+        func.coalesce(func.sum(pages.nb_uniq_visitors), 0),
+    ).filter(*filters)
 
+    id = request.args.get('id', None)
     if id is not None:
-        page_views = MatomoDailyGetPageUrlsSummary.query.filter_by(
-            label="/pipeline?id=" + id).all()
-
+        query = query.filter(label == "/pipeline?id=" + id)
     else:
-        page_views = MatomoDailyGetPageUrlsSummary.query.order_by(
-            MatomoDailyGetPageUrlsSummary.id).all()
-
-    for v in page_views:
-        exists = False
-        for e in elements:
-            label = e.get("label", None)
-            if label is not None and label == v.label:
-                exists = True
-                e["nb_hits"] += v.nb_hits
-                e["nb_visits"] += v.nb_visits
-                e["nb_uniq_visitors"] += (
-                    v.nb_uniq_visitors if v.nb_uniq_visitors is not None else 0)
-
-        if not exists and v.label is not None and "/pipeline?id=" in v.label:
-            if pipelines.get_title_from_id(v.label.split('id=')[1]):
-                element = {
-                    "url": v.url,
-                    "label": v.label,
-                    "title": pipelines.get_title_from_id(v.label.split('id=')[1]),
-                    "nb_hits": v.nb_hits,
-                    "nb_visits": v.nb_visits,
-                    "nb_uniq_visitors": v.nb_uniq_visitors if v.nb_uniq_visitors is not None else 0,
-                }
-                elements.append(element)
+        query = query.filter(label.contains("/pipeline?id="))
 
-    elements.sort(key=lambda e: e["nb_hits"], reverse=True)
+    rows = _aggregate(query, date_column, granularity,
+                      group_by=[label],
+                      order_by=[nb_hits.desc(), func.min(pages.id)])
+
+    registry = get_pipeline_registry()
+    elements = []
+
+    for row in rows:
+        summary = registry.summary(row[0].split('id=')[1])
+        if summary is None or not summary.title:
+            continue
+
+        element = {
+            "url": row[1],
+            "label": row[0],
+            "title": summary.title,
+            "nb_hits": row[2],
+            "nb_visits": row[3],
+            "nb_uniq_visitors": row[4],
+        }
+        if granularity is not None:
+            element["date"] = str(row[-1])
+        elements.append(element)
 
     return json.dumps(elements)
 
 
 @analytics_bp.route('/analytics/pipelines/downloads')
+@conditional_json()
 def pipelines_downloads():
     """ Analytics/Pipelines/Downloads Route
 
@@ -256,17 +428,16 @@ def pipelines_downloads():
 
     pipeline_id = request.args.get('id', None)
 
-    pipelines_data = pipelines.get_pipelines_from_cache()
     elements = []
 
-    for pipeline in pipelines_data:
-        if pipeline_id is not None and pipeline_id == pipeline["ID"]:
-            elements.append(
-                {
-                    "id": pipeline["ID"],
-                    "nb_hits": pipeline["DOWNLOADS"]
-                }
-            )
+    summary = get_pipeline_registry().summary(pipeline_id)
+    if summary is not None:
+        elements.append(
+            {
+                "id": summary.id,
+                "nb_hits": summary.downloads
+            }
+        )
 
     elements.sort(key=lambda e: e["nb_hits"], reverse=True)
 
@@ -274,65 +445,75 @@ def pipelines_downloads():
 
 
 @analytics_bp.route('/analytics/keywords')
+@conditional_json()
 def keywords():
     """ Analytics/Keywords Route
 
         Endpoint for returning analytics related to datset page views on the portal
 
         Args:
-            None
+            from, to: only count the searches between these dates
+            granularity: "day", "week", "month" or "year", sum the
+                         searches of each keyword per bucket
 
         Returns:
             Object
     """
 
-    elements = []
-
-    keywords = MatomoDailyGetSiteSearchKeywords.query.order_by(
-        MatomoDailyGetSiteSearchKeywords.id).all()
+    granularity = _request_granularity()
 
-    datasets = Dataset.query.order_by(Dataset.dataset_id).all()
-    dataset_ids = [e.dataset_id for e in datasets]
+    daily = MatomoDailyGetSiteSearchKeywords
+    searches, keyword, date_column, filters = _page_views_source(
+        'keywords', granularity, daily, daily.label)
+    nb_hits = func.coalesce(func.sum(searches.nb_hits), 0)
 
-    for v in keywords:
+    query = db.session.query(keyword, nb_hits).filter(*filters)
+    if searches is daily:
         # skip dates with no analytics data return by the DB
-        if v.label is None:
-            continue
+        # skip searches with a short sum_time_spent as users are probably
+        # still typing the words in the searches, the rollups only count
+        # the other searches
+        query = query.filter(daily.label.isnot(None)) \
+            .filter(daily.sum_time_spent >= KEYWORD_MIN_TIME_SPENT)
 
-        # skip searches with a sum_time_spent below 5 seconds as users are probably
-        # still typing the words in the searches when the time spent on the result is
-        # less than 5 seconds
-        if v.sum_time_spent < 2:
-            continue
+    rows = _aggregate(query, date_column, granularity,
+                      group_by=[keyword],
+                      order_by=[func.min(searches.id)])
+
+    dataset_ids = None
+    elements = []
+
+    for row in rows:
+        label = row[0]
 
         # skip if the keyword is a number and is not part of a dataset name
-        if re.match(r'^\d+$', v.label) is not None:
-            r = re.compile(".*" + v.label + ".*")
+        if re.match(r'^\d+$', label) is not None:
+            if dataset_ids is None:
+                dataset_ids = [r[0] for r in db.session.query(Dataset.dataset_id)]
+            r = re.compile(".*" + label + ".*")
             matching_dataset_ids = list(filter(r.match, dataset_ids))
             if not matching_dataset_ids:
                 continue
             # the following statement will prevent the react Object.keys()
             # to reorder the keys of JSON response by showing the labels with
             # numbers first, even if they have a small number of hits
-            v.label = " " + v.label
-
-        exists = False
-        for e in elements:
-            label = e.get("label")
-            if label is not None and label == v.label:
-                exists = True
-                e["nb_hits"] += v.nb_hits
-
-        if not exists:
-            element = {
-                "label": v.label,
-                "nb_hits": v.nb_hits,
-            }
-            elements.append(element)
+            label = " " + label
+
+        # Filter out short keywords
+        if len(label) <= 2:
+            continue
 
-    # Filter out short keywords
-    elements = list(filter(lambda e: len(e['label']) > 2, elements))
+        element = {
+            "label": label,
+            "nb_hits": row[1],
+        }
+        if granularity is not None:
+            element["date"] = str(row[-1])
+        elements.append(element)
 
-    elements.sort(key=lambda e: e["nb_hits"], reverse=True)
+    if granularity is not None:
+        elements.sort(key=lambda e: (e["date"], -e["nb_hits"]))
+    else:
+        elements.sort(key=lambda e: e["nb_hits"], reverse=True)
 
     return json.dumps(elements)
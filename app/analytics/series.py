@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""Analytics Series Module
+
+Helpers of the analytics endpoints that aggregate the Matomo daily rows
+into day, week, month or year buckets in the database, on the indexed day
+column of the daily tables. A bucket is named after its first day, weeks
+starting on Monday.
+"""
+from sqlalchemy import Date, cast, func
+
+
+GRANULARITIES = ("day", "week", "month", "year")
+
+
+def date_bucket(date_column, granularity, dialect_name):
+    """
+        Returns the SQL expression of the bucket of a Date column, the first
+        day of a bucket is its own bucket
+
+        Args:
+            date_column: the Date column
+            granularity: "day", "week", "month" or "year"
+            dialect_name: name of the database dialect, e.g. "postgresql"
+
+        Returns:
+            the expression of the first day of the bucket
+    """
+    if granularity == "day":
+        return date_column
+
+    if granularity not in GRANULARITIES:
+        raise ValueError("Unknown granularity {}".format(granularity))
+
+    if dialect_name != "sqlite":
+        return cast(func.date_trunc(granularity, date_column), Date)
+
+    # SQLite stores the dates as YYYY-MM-DD strings
+    if granularity == "month":
+        return func.date(date_column, "start of month")
+    if granularity == "year":
+        return func.date(date_column, "start of year")
+    # the next Sunday (or the same day), minus six days
+    return func.date(date_column, "weekday 0", "-6 days")
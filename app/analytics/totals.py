@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""Dataset Analytics Totals Module
+
+Materialized all-time page view and download totals of the datasets.
+The totals are recomputed from the Matomo daily tables at the end of
+`flask update_analytics` and read with one query by the dataset search.
+"""
+import os
+from datetime import datetime
+
+from sqlalchemy import func
+
+from app import db
+from app.models import (
+    Dataset, DatasetAnalyticsTotals, MatomoDailyGetDatasetPageViewsSummary,
+    MatomoDailyGetPortalDownloadSummary, eastern)
+
+
+PORTAL_DOWNLOAD_URL = 'https://portal.conp.ca/data/'
+
+
+def compute_dataset_analytics_totals():
+    """
+        Aggregates the Matomo daily tables per dataset
+
+        Returns:
+            dict of dataset_id -> dict of DatasetAnalyticsTotals columns
+    """
+    totals = {}
+
+    def dataset_totals(dataset_id):
+        return totals.setdefault(dataset_id, {
+            "dataset_id": dataset_id,
+            "nb_views": None,
+            "nb_view_visits": None,
+            "nb_view_uniq_visitors": None,
+            "nb_downloads": None,
+            "nb_download_visits": None,
+            "nb_download_uniq_visitors": None,
+        })
+
+    views = MatomoDailyGetDatasetPageViewsSummary
+    view_rows = db.session.query(
+        views.dataset_id,
+        func.sum(views.nb_hits),
+        func.sum(views.nb_visits),
+        func.sum(views.nb_uniq_visitors),
+    ).filter(views.dataset_id.isnot(None)).group_by(views.dataset_id).all()
+
+    for dataset_id, nb_hits, nb_visits, nb_uniq_visitors in view_rows:
+        element = dataset_totals(dataset_id)
+        element["nb_views"] = int(nb_hits or 0)
+        element["nb_view_visits"] = int(nb_visits or 0)
+        element["nb_view_uniq_visitors"] = int(nb_uniq_visitors or 0)
+
+    downloads = MatomoDailyGetPortalDownloadSummary
+    download_rows = db.session.query(
+        downloads.url,
+        func.sum(downloads.nb_hits),
+        func.sum(downloads.nb_visits),
+        func.sum(downloads.nb_uniq_visitors),
+    ).filter(downloads.url.like(PORTAL_DOWNLOAD_URL + '%')) \
+        .group_by(downloads.url).all()
+
+    if download_rows:
+        # downloaded files are named after the dataset directory,
+        # e.g. https://portal.conp.ca/data/<directory>_version-<version>.tar.gz
+        for dataset_id, fspath in db.session.query(Dataset.dataset_id, Dataset.fspath):
+            prefix = os.path.basename(fspath) + "_version"
+            for url, nb_hits, nb_visits, nb_uniq_visitors in download_rows:
+                if not url.replace(PORTAL_DOWNLOAD_URL, '').startswith(prefix):
+                    continue
+                element = dataset_totals(dataset_id)
+                element["nb_downloads"] = \
+                    (element["nb_downloads"] or 0) + int(nb_hits or 0)
+                element["nb_download_visits"] = \
+                    (element["nb_download_visits"] or 0) + int(nb_visits or 0)
+                element["nb_download_uniq_visitors"] = \
+                    (element["nb_download_uniq_visitors"] or 0) + int(nb_uniq_visitors or 0)
+
+    return totals
+
+
+def refresh_dataset_analytics_totals():
+    """
+        Replaces the content of the dataset_analytics_totals table
+        in a single transaction
+
+        Returns:
+            the number of datasets with analytics totals
+    """
+    totals = compute_dataset_analytics_totals()
+    date_updated = datetime.now(tz=eastern)
+
+    DatasetAnalyticsTotals.query.delete()
+    for element in totals.values():
+        db.session.add(DatasetAnalyticsTotals(date_updated=date_updated, **element))
+    db.session.commit()
+
+    return len(totals)
+
+
+def get_dataset_analytics_totals():
+    """
+        Loads the analytics totals of every dataset with one query
+
+        Returns:
+            dict of dataset_id -> (nb_views, nb_downloads), where a count
+            is None if the dataset was never viewed or downloaded
+    """
+    rows = db.session.query(
+        DatasetAnalyticsTotals.dataset_id,
+        DatasetAnalyticsTotals.nb_views,
+        DatasetAnalyticsTotals.nb_downloads,
+    ).all()
+    return {dataset_id: (nb_views, nb_downloads)
+            for dataset_id, nb_views, nb_downloads in rows}
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""Bulk Writer Module
+
+Module that inserts the rows collected by the command line tools in
+chunks of multi-row INSERT statements instead of merging and committing
+them one by one.
+
+Rows that would violate a unique constraint of the table are skipped
+(INSERT ... ON CONFLICT DO NOTHING on PostgreSQL, INSERT OR IGNORE on
+SQLite), so a row already present is not an error.
+
+Rows are added in groups, e.g. the rows of one date, and a group is
+always committed in the same transaction: a date is either fully stored
+or not stored at all, and an interrupted update redoes it on the next run.
+"""
+import time
+
+from app import db
+
+
+# number of rows per INSERT statement and per commit
+BULK_CHUNK_SIZE = 1000
+
+
+def _insert_statement(table, dialect_name):
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert(table).on_conflict_do_nothing()
+    if dialect_name == 'sqlite':
+        return table.insert().prefix_with('OR IGNORE')
+    return table.insert()
+
+
+class BulkWriter(object):
+    """
+        Collects rows of a table and inserts them in chunks
+
+        Usage:
+            with BulkWriter(MatomoDailyVisitsSummary) as writer:
+                for date in dates:
+                    writer.add({"date": date, ...})
+                    writer.end_group()
+
+        The pending rows are committed when the block exits without error
+        and rolled back otherwise. Missing columns of a row are NULL.
+    """
+
+    def __init__(self, model, chunk_size=BULK_CHUNK_SIZE):
+        """
+            Args:
+                model: model of the table, e.g. MatomoDailyVisitsSummary
+                chunk_size: number of rows per INSERT statement, the rows
+                            are committed once a chunk is pending at the
+                            end of a group
+        """
+        self.table = model.__table__
+        self.chunk_size = chunk_size
+        self.added = 0
+        self.inserted = 0
+        self.commits = 0
+        self._pending = []
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self._pending = []
+            db.session.rollback()
+            return False
+
+        self.commit()
+        seconds = time.monotonic() - self._start
+        print(f'[INFO   ] Inserted {self.inserted} rows into {self.table.name} '
+              f'({self.added - self.inserted} already present) '
+              f'in {self.commits} commits and {seconds:.2f}s')
+        return False
+
+    def add(self, row):
+        """
+            Adds a row, a dict of column name -> value
+        """
+        self._pending.append(row)
+        self.added += 1
+
+    def end_group(self):
+        """
+            Marks the end of a group of rows, committed once a chunk of
+            rows is pending
+        """
+        if len(self._pending) >= self.chunk_size:
+            self.commit()
+
+    def commit(self):
+        """
+            Inserts the pending rows and commits them
+        """
+        if not self._pending:
+            return
+
+        statement = _insert_statement(
+            self.table, db.session.get_bind().dialect.name)
+        for start in range(0, len(self._pending), self.chunk_size):
+            chunk = self._pending[start:start + self.chunk_size]
+            # a multi-row VALUES clause needs the same columns in every row
+            columns = sorted(set(key for row in chunk for key in row))
+            rows = [dict((column, row.get(column)) for column in columns)
+                    for row in chunk]
+            result = db.session.execute(statement.values(rows))
+            self.inserted += max(result.rowcount, 0)
+        db.session.commit()
+
+        self.commits += 1
+        self._pending = []
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""HTTP Caching Module
+
+Module that adds ETag/Last-Modified validators to the JSON endpoints
+whose content only changes when the CLI update commands run. Those
+commands bump a catalog generation number stored in a file shared by
+every worker, and conditional requests carrying a current validator are
+answered with 304 Not Modified before the view does any work.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app, make_response, request
+from flask_login import current_user
+from werkzeug.http import is_resource_modified
+
+
+# version of the shapes of the JSON payloads, part of every ETag: bump it
+# whenever a payload changes so clients do not keep the previous body after
+# a deploy
+PAYLOAD_VERSION = 2
+
+
+class CatalogGeneration(object):
+    """
+        Generation number of the portal catalogs, stored in a small file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._cached = (None, 0)
+
+    def get(self):
+        """
+            Returns (generation, last modification time), (0, None) if
+            no update command ran yet
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return 0, None
+
+        if self._cached[0] != mtime:
+            try:
+                with open(self.path, "r") as f:
+                    generation = int(f.read().strip() or 0)
+            except (OSError, ValueError):
+                generation = 0
+            self._cached = (mtime, generation)
+
+        return self._cached[1], datetime.utcfromtimestamp(mtime)
+
+    def bump(self):
+        """
+            Increments the generation number, invalidating the validators
+            given to the clients
+
+            Returns:
+                the new generation number
+        """
+        generation = self.get()[0] + 1
+
+        generation_dir = os.path.dirname(self.path)
+        if generation_dir and not os.path.exists(generation_dir):
+            os.makedirs(generation_dir)
+
+        tmp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(tmp_path, "w") as f:
+            f.write(str(generation))
+        os.replace(tmp_path, self.path)
+
+        return generation
+
+
+_generations = {}
+
+
+def get_catalog_generation(app):
+    """
+        Returns the catalog generation configured for the app
+    """
+    path = app.config['CATALOG_GENERATION_PATH']
+    if path not in _generations:
+        _generations[path] = CatalogGeneration(path)
+    return _generations[path]
+
+
+def bump_catalog_generation(app):
+    return get_catalog_generation(app).bump()
+
+
+def conditional_json(*validators):
+    """
+        Decorator of the views returning JSON built from the catalogs
+
+        The ETag is derived from the payload version, the catalog
+        generation, the request path and arguments, the authentication
+        state and the values returned by the extra validators (callables)
+        of the view.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            generation, last_modified = get_catalog_generation(current_app).get()
+            tokens = [
+                PAYLOAD_VERSION,
+                generation,
+                request.path,
+                sorted(request.args.items(multi=True)),
+                bool(current_user.is_authenticated),
+            ] + [validator() for validator in validators]
+            etag = hashlib.sha1(
+                json.dumps(tokens, default=str).encode("utf-8")).hexdigest()
+
+            # the extra validators are not reflected by the generation date
+            if validators:
+                last_modified = None
+
+            if is_resource_modified(request.environ, etag=etag,
+                                    last_modified=last_modified):
+                response = make_response(view(*args, **kwargs))
+            else:
+                response = current_app.response_class(status=304)
+
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.headers["Cache-Control"] = "private, no-cache"
+            response.vary.add("Cookie")
+            return response
+        return wrapper
+    return decorator
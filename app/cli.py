@@ -7,6 +7,8 @@ Module that contains the special command line tools
 import os
 import uuid
 from datetime import datetime, timedelta
+import click
+from app.jobs import report_progress, run_stage
 from app.threads import UpdatePipelineData
 
 
@@ -47,28 +49,81 @@ def register(app):
         """
         Wrapper to call the updating to the pipeline data
         """
-        _update_pipeline_data(app)
+        _run_job(app, 'update_pipeline_data', _update_pipeline_data, app)
 
     @app.cli.command('update_datasets')
     def update_datasets():
         """
         Wrapper to call the updating to the datasets metadata
         """
-        _update_datasets(app)
+        _run_job(app, 'update_datasets', _update_datasets, app)
+
+    @app.cli.command('update_ci_status')
+    def update_ci_status():
+        """
+        Wrapper to call the update of the dataset CI statuses
+        """
+        _run_job(app, 'update_ci_status', _update_ci_status, app)
 
     @app.cli.command('update_analytics')
     def update_analytics():
         """
         Wrapper to call the update of the analytics tables
         """
-        _update_analytics(app)
+        _run_job(app, 'update_analytics', _update_analytics, app)
 
     @app.cli.command('generate_missing_ark_ids')
     def generate_missing_ark_ids():
         """
         Wrapper to generate missing ARK identifiers
         """
-        _generate_missing_ark_ids(app)
+        _run_job(app, 'generate_missing_ark_ids', _generate_and_publish_ark_ids, app)
+
+    @app.cli.command('job_status')
+    @click.argument('name', required=False)
+    def job_status(name):
+        """
+        Shows the status, progress and timing of the refresh jobs
+        """
+        _print_job_status(app, name)
+
+
+def _run_job(app, name, func, *args):
+    """
+    Runs a refresh task as a job, unless another run of it holds its lock
+    """
+    from app.jobs import JobLockedError, run_job
+
+    try:
+        return run_job(app, name, func, *args)
+    except JobLockedError as e:
+        print("\033[91m")
+        print(f"[ERROR  ] {e}, not starting it again.")
+        print("\033[0m")
+
+
+def _print_job_status(app, name=None):
+    """
+    Prints the persisted state of the refresh jobs
+    """
+    from app.jobs import job_status
+
+    states = job_status(app.config['JOBS_STATE_PATH'], name)
+    if not states:
+        print('[INFO   ] No job state found')
+
+    for state in states:
+        print(f"[INFO   ] {state['name']}: {state['status']}"
+              f" (pid {state['pid']} on {state['host']},"
+              f" started {state['started']}, finished {state['finished']})")
+        for stage, info in state['stages'].items():
+            progress = ''
+            if info.get('done') is not None:
+                progress = f", {info['done']}/{info['total'] or '?'}"
+            print(f"[INFO   ]     {stage}: {info['status']}"
+                  f" ({info['seconds'] if info['seconds'] is not None else '-'} s{progress})")
+        if state.get('error'):
+            print(f"[INFO   ]     error: {state['error']}")
 
 
 def _seed_aff_types_db(app):
@@ -142,30 +197,48 @@ def _update_pipeline_data(app):
     """
     Updates from Zenodo the available pipelines
     """
-    t = UpdatePipelineData()
-    t.start()
-    t.join()
+    run_stage('zenodo', UpdatePipelineData().refresh)
+
+    run_stage('ark_ids', _generate_missing_ark_ids, app)
 
+    _bump_catalog_generation(app)
+
+
+def _generate_and_publish_ark_ids(app):
+    """
+    Generates the missing ARK identifiers and invalidates the ETags
+    """
     _generate_missing_ark_ids(app)
+    _bump_catalog_generation(app)
 
 
 def _update_datasets(app):
     """
     Updates from conp-datasets
     """
-    from app import db
-    from app.models import ArkId
-    from app.models import Dataset as DBDataset
-    from app.models import DatasetAncestry as DBDatasetAncestry
-    from sqlalchemy import exc
+    from pathlib import Path
+
+    datasetsdir = Path(app.config['DATA_PATH']) / 'conp-dataset'
+
+    run_stage('conp_dataset', _update_conp_dataset, app, datasetsdir)
+
+    run_stage('subdatasets', _update_subdatasets, app, datasetsdir)
+
+    run_stage('search_index', _update_dataset_search_index, app)
+
+    _bump_catalog_generation(app)
+
+
+def _update_conp_dataset(app, datasetsdir):
+    """
+    Pulls conp-dataset and installs its subdatasets
+
+    Raises RuntimeError if the subdatasets could not be installed
+    """
     from datalad import api
     from datalad.api import Dataset as DataladDataset
-    import fnmatch
-    import json
-    from pathlib import Path
     import git
 
-    datasetsdir = Path(app.config['DATA_PATH']) / 'conp-dataset'
     datasetsdir.mkdir(parents=True, exist_ok=True)
 
     # Initialize the git repository object
@@ -198,96 +271,197 @@ def _update_datasets(app):
         print("[ERROR  ] An exception occurred in datalad update.")
         print(e.args)
         print("\033[0m")
-        return
+        raise RuntimeError(
+            'The conp-dataset subdatasets could not be installed') from e
 
     print('[INFO   ] conp-dataset update complete')
+
+
+def _update_subdatasets(app, datasetsdir):
+    """
+    Updates the datasets table from the DATS.json files of the subdatasets
+
+    The subdatasets are installed and read by a pool of worker processes,
+    then the datasets table is updated in one transaction.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from datalad.api import Dataset as DataladDataset
+
     print('[INFO   ] Updating subdatasets')
 
-    for ds in d.subdatasets():
-        print('[INFO   ] Updating ' + ds['gitmodule_url'])
-        subdataset = DataladDataset(path=ds['path'])
-        if not subdataset.is_installed():
+    d = DataladDataset(path=datasetsdir)
+    subdatasets = [
+        {key: ds[key] for key in ('path', 'gitmodule_url', 'gitmodule_name')}
+        for ds in d.subdatasets()
+    ]
+
+    subdataset_reads = []
+    with ProcessPoolExecutor(max_workers=app.config['DATASET_UPDATE_WORKERS']) as executor:
+        futures = [
+            executor.submit(_read_subdataset, ds, app.config['DATA_PATH'])
+            for ds in subdatasets
+        ]
+        for index, future in enumerate(as_completed(futures)):
+            report_progress(index + 1, len(futures))
             try:
-                api.clone(
-                    source=ds['gitmodule_url'],
-                    path=ds['path']
-                )
-                subdataset = DataladDataset(path=ds['path'])
-                subdataset.install(path='')
+                subdataset_read = future.result()
             except Exception as e:
                 print("\033[91m")
-                print(
-                    "[ERROR  ] An exception occurred in datalad install for " + str(ds) + ".")
+                print("[ERROR  ] An exception occurred while reading a subdataset.")
                 print(e.args)
                 print("\033[0m")
                 continue
+            if subdataset_read is not None:
+                subdataset_reads.append(subdataset_read)
 
-        # The following relates to the DATS.json files
-        # of the projects directory in the conp-dataset repo.
-        # Skip directories that aren't projects.
-        patterns = [app.config['DATA_PATH'] + '/conp-dataset/projects/*']
-        if not any(fnmatch.fnmatch(ds['path'], pattern) for pattern in patterns):
-            continue
+    _save_subdatasets(app, sorted(subdataset_reads, key=lambda r: r['dataset_id']))
 
-        dirs = os.listdir(ds['path'])
-        descriptor = ''
-        for file in dirs:
-            if fnmatch.fnmatch(file.lower(), 'dats.json'):
-                descriptor = file
 
-        if descriptor == '':
-            print("\033[91m")
-            print('[ERROR  ] DATS.json file can`t be found in ' + ds['path'] + ".")
-            print("\033[0m")
-            continue
+def _read_subdataset(ds, data_path):
+    """
+    Installs a subdataset if needed and reads its DATS.json file and the
+    dates and remote URL of its git repository. Runs in a worker process.
+
+    Returns:
+        dict with the dataset_id, path, dats, create_timestamp,
+        update_timestamp and remote_url of the subdataset, None if it is
+        not a project or can't be read
+    """
+    from datalad import api
+    from datalad.api import Dataset as DataladDataset
+    import fnmatch
+    import json
 
+    print('[INFO   ] Updating ' + ds['gitmodule_url'])
+    subdataset = DataladDataset(path=ds['path'])
+    if not subdataset.is_installed():
         try:
-            with open(os.path.join(ds['path'], descriptor), 'r') as f:
-                dats = json.load(f)
+            api.clone(
+                source=ds['gitmodule_url'],
+                path=ds['path']
+            )
+            subdataset = DataladDataset(path=ds['path'])
+            subdataset.install(path='')
         except Exception as e:
             print("\033[91m")
-            print("[ERROR  ] Descriptor file can't be read.")
+            print(
+                "[ERROR  ] An exception occurred in datalad install for " + str(ds) + ".")
             print(e.args)
             print("\033[0m")
-            continue
+            return None
+
+    # The following relates to the DATS.json files
+    # of the projects directory in the conp-dataset repo.
+    # Skip directories that aren't projects.
+    patterns = [data_path + '/conp-dataset/projects/*']
+    if not any(fnmatch.fnmatch(ds['path'], pattern) for pattern in patterns):
+        return None
+
+    dirs = os.listdir(ds['path'])
+    descriptor = ''
+    for file in dirs:
+        if fnmatch.fnmatch(file.lower(), 'dats.json'):
+            descriptor = file
+
+    if descriptor == '':
+        print("\033[91m")
+        print('[ERROR  ] DATS.json file can`t be found in ' + ds['path'] + ".")
+        print("\033[0m")
+        return None
+
+    try:
+        with open(os.path.join(ds['path'], descriptor), 'r') as f:
+            dats = json.load(f)
+    except Exception as e:
+        print("\033[91m")
+        print("[ERROR  ] Descriptor file can't be read.")
+        print(e.args)
+        print("\033[0m")
+        return None
+
+    create_timestamp, update_timestamp, remote_url = _read_git_metadata(ds['path'])
+
+    return {
+        'dataset_id': ds['gitmodule_name'],
+        'path': ds['path'],
+        'dats': dats,
+        'create_timestamp': create_timestamp,
+        'update_timestamp': update_timestamp,
+        'remote_url': remote_url,
+    }
+
+
+def _read_git_metadata(path):
+    """
+    Reads the timestamps of the first and last commits and the remote URL
+    of a git repository with GitPython, in a single pass over the log
+
+    Returns:
+        (first commit timestamp, last commit timestamp, remote URL),
+        None for the values that can't be read
+    """
+    import git
+
+    create_timestamp = update_timestamp = remote_url = None
+    try:
+        repo = git.Repo(path)
+    except Exception:
+        print("[ERROR  ] Git repository couldnt be read.")
+        return create_timestamp, update_timestamp, remote_url
+
+    try:
+        timestamps = repo.git.log('--pretty=format:%ct').split()
+        update_timestamp = int(timestamps[0])
+        create_timestamp = int(timestamps[-1])
+    except Exception:
+        print("[ERROR  ] Create and Update Dates couldnt be read.")
+
+    try:
+        remote_url = repo.remotes.origin.url
+    except Exception:
+        print("[ERROR  ] Remote URL couldnt be read.")
+
+    return create_timestamp, update_timestamp, remote_url
+
+
+def _save_subdatasets(app, subdataset_reads):
+    """
+    Writes the subdatasets read by _read_subdataset to the datasets and
+    dataset_ancestry tables in one transaction, then generates the
+    missing ARK identifiers of the datasets
+    """
+    from app import db
+    from app.models import ArkId
+    from app.models import Dataset as DBDataset
+    from app.models import DatasetAncestry as DBDatasetAncestry
+
+    dataset_ids = [r['dataset_id'] for r in subdataset_reads]
+    datasets = dict(
+        (dataset.dataset_id, dataset) for dataset in
+        DBDataset.query.filter(DBDataset.dataset_id.in_(dataset_ids)).all()
+    ) if dataset_ids else {}
+    ancestries = set(db.session.query(
+        DBDatasetAncestry.parent_dataset_id, DBDatasetAncestry.child_dataset_id).all())
+
+    for subdataset_read in subdataset_reads:
+        dats = subdataset_read['dats']
 
         # use dats.json data to fill the datasets table
         # avoid duplication / REPLACE instead of insert
-        dataset = DBDataset.query.filter_by(
-            dataset_id=ds['gitmodule_name']).first()
-
-        # pull the timestamp of the first commit in the git log for the dataset create date
         createDate = datetime.utcnow()
-        try:
-            createTimeStamp = os.popen(
-                "git -C {} log --pretty=format:%ct --reverse | head -1".format(ds['path'])).read()
-            createDate = datetime.fromtimestamp(int(createTimeStamp))
-        except Exception:
-            print("[ERROR  ] Create Date couldnt be read.")
-
-        # last commit in the git log for the dataset update date
+        if subdataset_read['create_timestamp'] is not None:
+            createDate = datetime.fromtimestamp(subdataset_read['create_timestamp'])
         updateDate = datetime.utcnow()
-        try:
-            createTimeStamp = os.popen(
-                "git -C {} log --pretty=format:%ct | head -1".format(ds['path'])).read()
-            updateDate = datetime.fromtimestamp(int(createTimeStamp))
-        except Exception:
-            print("[ERROR  ] Update Date couldnt be read.")
-
-        # get the remote URL
-        remoteUrl = None
-        try:
-            remoteUrl = os.popen(
-                "git -C {} config --get remote.origin.url".format(ds['path'])).read()
-        except Exception:
-            print("[ERROR  ] Remote URL couldnt be read.")
+        if subdataset_read['update_timestamp'] is not None:
+            updateDate = datetime.fromtimestamp(subdataset_read['update_timestamp'])
 
+        dataset = datasets.get(subdataset_read['dataset_id'])
         if dataset is None:
             dataset = DBDataset()
-            dataset.dataset_id = ds['gitmodule_name']
-            dataset.date_created = createDate
+            dataset.dataset_id = subdataset_read['dataset_id']
+            db.session.add(dataset)
 
-        if(dataset.date_created != createDate):
+        if dataset.date_created != createDate:
             dataset.date_created = createDate
 
         # check for dataset ancestry
@@ -297,21 +471,20 @@ def _update_datasets(app):
                 for x in prop.get('values', []):
                     if x.get('value', None) is None:
                         continue
+                    ancestry = ('projects/' + x.get('value', None), dataset.dataset_id)
+                    if ancestry in ancestries:
+                        # we already have a record of this ancestry
+                        continue
                     datasetAncestry = DBDatasetAncestry()
                     datasetAncestry.id = str(uuid.uuid4())
-                    datasetAncestry.parent_dataset_id = 'projects/' + \
-                        x.get('value', None)
-                    datasetAncestry.child_dataset_id = dataset.dataset_id
-                    try:
-                        db.session.merge(datasetAncestry)
-                        db.session.commit()
-                    except exc.IntegrityError:
-                        # we already have a record of this ancestry
-                        db.session.rollback()
+                    datasetAncestry.parent_dataset_id = ancestry[0]
+                    datasetAncestry.child_dataset_id = ancestry[1]
+                    db.session.add(datasetAncestry)
+                    ancestries.add(ancestry)
 
         dataset.date_updated = updateDate
-        dataset.fspath = ds['path']
-        dataset.remoteUrl = remoteUrl
+        dataset.fspath = subdataset_read['path']
+        dataset.remoteUrl = subdataset_read['remote_url']
         dataset.description = dats.get(
             'description', 'No description in DATS.json')
         dataset.name = dats.get(
@@ -319,15 +492,66 @@ def _update_datasets(app):
             os.path.basename(dataset.dataset_id)
         )
 
-        db.session.merge(dataset)
-        db.session.commit()
+    db.session.commit()
+    print(f'[INFO   ] {len(subdataset_reads)} datasets updated.')
+
+    # if a dataset does not have an ARK identifier yet, generate it
+    dataset_with_ark_id_list = set(row[0] for row in db.session.query(ArkId.dataset_id).all())
+    save_ark_ids_in_database(app, 'dataset', [
+        dataset_id for dataset_id in dataset_ids
+        if dataset_id not in dataset_with_ark_id_list
+    ])
+
+
+def _update_dataset_search_index(app):
+    """
+    Rebuilds the full-text index used by the dataset search
+    from the DATS.json files of the datasets in the database
+    """
+    from app.models import Dataset as DBDataset
+    from app.search.index import dats_search_fields, get_dataset_search_index
+    from app.search.models import DATSDataset
+
+    documents = {}
+    for dataset in DBDataset.query.all():
+        try:
+            datsdataset = DATSDataset(dataset.fspath)
+        except Exception as e:
+            print("[ERROR  ] Can't index " + dataset.dataset_id + ": " + str(e))
+            continue
+        documents[dataset.dataset_id] = dats_search_fields(datsdataset)
+
+    get_dataset_search_index(app).update(documents)
+    print('[INFO   ] Dataset search index updated with {} datasets'.format(len(documents)))
+
+
+def _bump_catalog_generation(app):
+    """
+    Invalidates the ETag of the search and analytics responses
+    """
+    from app.caching import bump_catalog_generation
+
+    generation = bump_catalog_generation(app)
+    print(f'[INFO   ] Catalog generation bumped to {generation}')
 
-        # if the dataset does not have an ARK identifier yet, generate it
-        dataset_with_ark_id_list = [row[0] for row in db.session.query(ArkId.dataset_id).all()]
-        if dataset.dataset_id not in dataset_with_ark_id_list:
-            new_ark_id = ark_id_minter(app, 'dataset')
-            save_ark_id_in_database(app, 'dataset', new_ark_id, dataset.dataset_id)
-        print('[INFO   ] ' + ds['gitmodule_name'] + ' updated.')
+
+def _update_ci_status(app):
+    """
+    Updates the snapshot of the dataset statuses from the latest
+    CircleCI test results of conp-dataset
+    """
+    from app.search.ci_status import get_ci_status_store
+
+    try:
+        count = get_ci_status_store(app).refresh()
+    except Exception as e:
+        print("\033[91m")
+        print("[ERROR  ] CI status update failed, keeping the previous snapshot.")
+        print(e.args)
+        print("\033[0m")
+        return
+
+    print(f'[INFO   ] CI status updated for {count} datasets')
 
 
 def _update_analytics(app):
@@ -335,30 +559,58 @@ def _update_analytics(app):
     Updates analytics table using Matomo API endpoints
     """
 
-    matomo_server_url = app.config['MATOMO_SERVER_URL']
-    matomo_site_id = app.config['MATOMO_SITE_ID']
-    matomo_token_auth = app.config['MATOMO_TOKEN_AUTH']
+    from app.analytics.matomo import MatomoClient
+
+    matomo_client = MatomoClient(
+        f"https://{app.config['MATOMO_SERVER_URL']}/",
+        app.config['MATOMO_SITE_ID'],
+        app.config['MATOMO_TOKEN_AUTH'],
+        bulk=app.config['MATOMO_BULK_INGESTION'],
+        max_workers=app.config['MATOMO_MAX_WORKERS']
+    )
 
-    matomo_api_baseurl = f"https://{matomo_server_url}/?module=API" \
-                         f"&idSite={matomo_site_id}" \
-                         f"&token_auth={matomo_token_auth}" \
-                         f"&format=json" \
-                         f"&filter_limit=-1"
+    run_stage('matomo_visits_summary', _update_analytics_matomo_visits_summary, app, matomo_client)
 
-    _update_analytics_matomo_visits_summary(app, matomo_api_baseurl)
+    run_stage('matomo_page_urls', _update_analytics_matomo_get_page_urls_summary, app, matomo_client)
 
-    _update_analytics_matomo_get_page_urls_summary(app, matomo_api_baseurl)
+    run_stage('matomo_dataset_views', _update_analytics_matomo_get_daily_dataset_views_summary, app, matomo_client)
 
-    _update_analytics_matomo_get_daily_dataset_views_summary(app, matomo_api_baseurl)
+    run_stage('matomo_keyword_searches', _update_analytics_matomo_get_daily_keyword_searches_summary, app, matomo_client)
 
-    _update_analytics_matomo_get_daily_keyword_searches_summary(app, matomo_api_baseurl)
+    run_stage('matomo_portal_downloads', _update_analytics_matomo_get_daily_portal_download_summary, app, matomo_client)
 
-    _update_analytics_matomo_get_daily_portal_download_summary(app, matomo_api_baseurl)
+    run_stage('matomo_rollups', _update_matomo_rollups, app)
+
+    run_stage('dataset_analytics_totals', _update_dataset_analytics_totals, app)
+
+    run_stage('github_traffic', _update_github_traffic_counts, app)
+
+    _bump_catalog_generation(app)
+
+
+def _update_matomo_rollups(app):
+    """
+    Updates the monthly and yearly rollups of the Matomo daily tables
+    for the days inserted since the last update
+    """
+    from app.analytics.rollups import refresh_matomo_rollups
+
+    for report, count in refresh_matomo_rollups().items():
+        print(f'[INFO   ] Matomo {report} rollups updated for {count} periods')
+
+
+def _update_dataset_analytics_totals(app):
+    """
+    Recomputes the all-time view and download totals of the datasets
+    from the Matomo daily tables
+    """
+    from app.analytics.totals import refresh_dataset_analytics_totals
 
-    _update_github_traffic_counts(app)
+    count = refresh_dataset_analytics_totals()
+    print(f'[INFO   ] Analytics totals updated for {count} datasets')
 
 
-def _update_analytics_matomo_visits_summary(app, matomo_api_baseurl):
+def _update_analytics_matomo_visits_summary(app, matomo_client):
     """
     Function to update specifically the Matomo visits summary
     queried from the Matomo API endpoint VisitsSummary.
@@ -369,8 +621,8 @@ def _update_analytics_matomo_visits_summary(app, matomo_api_baseurl):
     """
 
     from app import db
+    from app.bulk import BulkWriter
     from app.models import MatomoDailyVisitsSummary
-    import requests
 
     # grep the dates already inserted into the database
     db_results = db.session.query(MatomoDailyVisitsSummary.date).all()
@@ -379,36 +631,33 @@ def _update_analytics_matomo_visits_summary(app, matomo_api_baseurl):
     # determines which dates are missing from the database and could be queried on Matomo
     dates_to_process = determine_dates_to_query_on_matomo(dates_in_database)
 
-    # for each date to process, query Matomo and insert response into the database
-    for date in dates_to_process:
-        matomo_query = f"{matomo_api_baseurl}" \
-                       f"&method=VisitsSummary.get" \
-                       f"&period=day" \
-                       f"&date={date}"
-        response = requests.get(matomo_query).json()
-
-        if not response:
-            continue
-
-        visits_summary = MatomoDailyVisitsSummary()
-        visits_summary.date = date
-        visits_summary.avg_time_on_site = response['avg_time_on_site']
-        visits_summary.bounce_count = response['bounce_count']
-        visits_summary.max_actions = response['max_actions']
-        visits_summary.nb_actions = response['nb_actions']
-        visits_summary.nb_actions_per_visit = response['nb_actions_per_visit']
-        visits_summary.nb_uniq_visitors = response['nb_uniq_visitors']
-        visits_summary.nb_users = response['nb_users']
-        visits_summary.nb_visits = response['nb_visits']
-        visits_summary.nb_visits_converted = response['nb_visits_converted']
-        visits_summary.sum_visit_length = response['sum_visit_length']
-
-        db.session.merge(visits_summary)
-        db.session.commit()
-        print(f'[INFO   ] Inserted Matomo visits summary for {date}')
+    # query Matomo for the dates to process and insert responses into the database
+    responses = matomo_client.get_days('VisitsSummary.get', dates_to_process)
+    with BulkWriter(MatomoDailyVisitsSummary) as writer:
+        for date in dates_to_process:
+            response = responses.get(date)
 
+            if not response:
+                continue
 
-def _update_analytics_matomo_get_page_urls_summary(app, matomo_api_baseurl):
+            writer.add({
+                'date': date,
+                'day': _day(date),
+                'avg_time_on_site': response['avg_time_on_site'],
+                'bounce_count': response['bounce_count'],
+                'max_actions': response['max_actions'],
+                'nb_actions': response['nb_actions'],
+                'nb_actions_per_visit': response['nb_actions_per_visit'],
+                'nb_uniq_visitors': response['nb_uniq_visitors'],
+                'nb_users': response['nb_users'],
+                'nb_visits': response['nb_visits'],
+                'nb_visits_converted': response['nb_visits_converted'],
+                'sum_visit_length': response['sum_visit_length'],
+            })
+            writer.end_group()
+
+
+def _update_analytics_matomo_get_page_urls_summary(app, matomo_client):
     """
     Function to update specifically the Matomo visited page URLs summary
     queried from the Matomo API endpoint Actions.getPageUrls.
@@ -422,8 +671,8 @@ def _update_analytics_matomo_get_page_urls_summary(app, matomo_api_baseurl):
     """
 
     from app import db
+    from app.bulk import BulkWriter
     from app.models import MatomoDailyGetPageUrlsSummary
-    import requests
 
     # grep the dates already inserted into the database
     date_field = MatomoDailyGetPageUrlsSummary.date
@@ -433,44 +682,36 @@ def _update_analytics_matomo_get_page_urls_summary(app, matomo_api_baseurl):
     # determines which dates are missing from the database and could be queried on Matomo
     dates_to_process = determine_dates_to_query_on_matomo(dates_in_database)
 
-    # for each date to process, query Matomo API and insert response into the database
-    for date in dates_to_process:
-        matomo_query = f"{matomo_api_baseurl}" \
-                       f"&method=Actions.getPageUrls" \
-                       f"&period=day" \
-                       f"&date={date}"
-        response = requests.get(matomo_query).json()
-
-        if not response:
-            # if no response, then there are no stats for that date.
-            # enter the date in the table so that this date is not
-            # reprocessed at the next run of analytics updates
-            page_summary = MatomoDailyGetPageUrlsSummary()
-            page_summary.date = date
-            db.session.merge(page_summary)
-            db.session.commit()
-            continue
-
-        for page in response:
-            url = page['url'] if 'url' in page.keys() else None
-            uniq_visitors = page['nb_uniq_visitors'] if 'nb_uniq_visitors' in page.keys() else None
-            page_summary = MatomoDailyGetPageUrlsSummary()
-            page_summary.date = date
-            page_summary.url = url
-            page_summary.label = page['label']
-            page_summary.nb_hits = page['nb_hits']
-            page_summary.nb_visits = page['nb_visits']
-            page_summary.nb_uniq_visitors = uniq_visitors
-            page_summary.sum_time_spent = page['sum_time_spent']
-            page_summary.avg_time_on_page = page['avg_time_on_page']
-
-            db.session.merge(page_summary)
-            db.session.commit()
-
-        print(f'[INFO   ] Inserted Matomo visits per page URL for {date}')
+    # query Matomo API for the dates to process and insert responses into the database
+    responses = matomo_client.get_days('Actions.getPageUrls', dates_to_process)
+    with BulkWriter(MatomoDailyGetPageUrlsSummary) as writer:
+        for date in dates_to_process:
+            response = responses.get(date)
 
+            if not response:
+                # if no response, then there are no stats for that date.
+                # enter the date in the table so that this date is not
+                # reprocessed at the next run of analytics updates
+                writer.add({'date': date, 'day': _day(date)})
+                writer.end_group()
+                continue
 
-def _update_analytics_matomo_get_daily_dataset_views_summary(app, matomo_api_baseurl):
+            for page in response:
+                writer.add({
+                    'date': date,
+                    'day': _day(date),
+                    'url': page.get('url'),
+                    'label': page['label'],
+                    'nb_hits': page['nb_hits'],
+                    'nb_visits': page['nb_visits'],
+                    'nb_uniq_visitors': page.get('nb_uniq_visitors'),
+                    'sum_time_spent': page['sum_time_spent'],
+                    'avg_time_on_page': page['avg_time_on_page'],
+                })
+            writer.end_group()
+
+
+def _update_analytics_matomo_get_daily_dataset_views_summary(app, matomo_client):
     """
     Function to update specifically the Matomo daily dataset views summary
     queried from the Matomo API endpoint Actions.getPageUrl for each dataset_id.
@@ -480,9 +721,9 @@ def _update_analytics_matomo_get_daily_dataset_views_summary(app, matomo_api_bas
     current day.
     """
     from app import db
+    from app.bulk import BulkWriter
     from app.models import MatomoDailyGetDatasetPageViewsSummary
     from app.models import Dataset as DBDataset
-    import requests
 
     # grep the dates already inserted into the database
     date_field = MatomoDailyGetDatasetPageViewsSummary.date
@@ -495,48 +736,45 @@ def _update_analytics_matomo_get_daily_dataset_views_summary(app, matomo_api_bas
     # get the list of dataset_id_list to process
     dataset_id_list = [row[0] for row in db.session.query(DBDataset.dataset_id).all()]
 
-    # for each date and each dataset, query Matomo for the view stats
-    for date in dates_to_process:
-        date_inserted = False
-        for dataset_id in dataset_id_list:
-            page_url = f"https://portal.conp.ca/dataset?id={dataset_id}"
-            matomo_query = f"{matomo_api_baseurl}" \
-                           f"&method=Actions.getPageUrl" \
-                           f"&period=day" \
-                           f"&date={date}" \
-                           f"&pageUrl={page_url}"
-            response = requests.get(matomo_query).json()
-
-            if not response:
-                continue
-
-            views_summary = MatomoDailyGetDatasetPageViewsSummary()
-            views_summary.date = date
-            views_summary.dataset_id = dataset_id
-            views_summary.url = response[0]['url']
-            views_summary.label = response[0]['label']
-            views_summary.nb_hits = response[0]['nb_hits']
-            views_summary.nb_visits = response[0]['nb_visits']
-            views_summary.nb_uniq_visitors = response[0]['nb_uniq_visitors']
-            views_summary.sum_time_spent = response[0]['sum_time_spent']
-            views_summary.avg_time_on_page = response[0]['avg_time_on_page']
-
-            db.session.merge(views_summary)
-            db.session.commit()
-
-            date_inserted = True
-            print(f'[INFO   ] Inserted Matomo number of views for {dataset_id} on {date}')
+    # query Matomo for the view stats of each dataset on the dates to process
+    dataset_responses = matomo_client.get_days_bulk(
+        'Actions.getPageUrl',
+        dates_to_process,
+        [{'pageUrl': f"https://portal.conp.ca/dataset?id={dataset_id}"}
+         for dataset_id in dataset_id_list]
+    )
 
-        # if no stats existed for that date, then add a row to the table
-        # with empty values so that the script does not reprocess that date
-        if not date_inserted:
-            views_summary = MatomoDailyGetDatasetPageViewsSummary()
-            views_summary.date = date
-            db.session.merge(views_summary)
-            db.session.commit()
+    with BulkWriter(MatomoDailyGetDatasetPageViewsSummary) as writer:
+        for date in dates_to_process:
+            date_inserted = False
+            for dataset_id, responses in zip(dataset_id_list, dataset_responses):
+                response = responses.get(date)
 
+                if not response:
+                    continue
 
-def _update_analytics_matomo_get_daily_portal_download_summary(app, matomo_api_baseurl):
+                writer.add({
+                    'date': date,
+                    'day': _day(date),
+                    'dataset_id': dataset_id,
+                    'url': response[0]['url'],
+                    'label': response[0]['label'],
+                    'nb_hits': response[0]['nb_hits'],
+                    'nb_visits': response[0]['nb_visits'],
+                    'nb_uniq_visitors': response[0]['nb_uniq_visitors'],
+                    'sum_time_spent': response[0]['sum_time_spent'],
+                    'avg_time_on_page': response[0]['avg_time_on_page'],
+                })
+                date_inserted = True
+
+            # if no stats existed for that date, then add a row to the table
+            # with empty values so that the script does not reprocess that date
+            if not date_inserted:
+                writer.add({'date': date, 'day': _day(date)})
+            writer.end_group()
+
+
+def _update_analytics_matomo_get_daily_portal_download_summary(app, matomo_client):
     """
     Function to update specifically the Matomo daily download summary
     queried from the Matomo API endpoint Actions.getDownloads.
@@ -546,8 +784,8 @@ def _update_analytics_matomo_get_daily_portal_download_summary(app, matomo_api_b
     current day.
     """
     from app import db
+    from app.bulk import BulkWriter
     from app.models import MatomoDailyGetPortalDownloadSummary
-    import requests
 
     # grep the dates already inserted into the database
     date_field = MatomoDailyGetPortalDownloadSummary.date
@@ -557,42 +795,35 @@ def _update_analytics_matomo_get_daily_portal_download_summary(app, matomo_api_b
     # determines which dates are missing from the database and could be queried on Matomo
     dates_to_process = determine_dates_to_query_on_matomo(dates_in_database)
 
-    # for each date query Matomo for the download stats
-    for date in dates_to_process:
-        matomo_query = f"{matomo_api_baseurl}" \
-                       f"&method=Actions.getDownloads" \
-                       f"&period=day" \
-                       f"&date={date}" \
-                       f"&expanded=1"
-        response = requests.get(matomo_query).json()
-
-        if not response:
-            download_summary = MatomoDailyGetPortalDownloadSummary()
-            download_summary.date = date
-            db.session.merge(download_summary)
-            db.session.commit()
-            continue
-
-        for category in response:
-            for downloaded_item in category['subtable']:
-                download_summary = MatomoDailyGetPortalDownloadSummary()
-                download_summary.date = date
-                download_summary.url = downloaded_item['url']
-                download_summary.label = downloaded_item['label']
-                download_summary.nb_hits = downloaded_item['nb_hits']
-                download_summary.nb_visits = downloaded_item['nb_visits']
-                download_summary.nb_uniq_visitors = downloaded_item['nb_uniq_visitors']
-                download_summary.sum_time_spent = downloaded_item['sum_time_spent']
-                download_summary.segment = downloaded_item['segment']
-
-                db.session.merge(download_summary)
-                db.session.commit()
-
-                label = downloaded_item['label']
-                print(f'[INFO   ] Inserted Matomo number of portal downloads for {label} on {date}')
+    # query Matomo for the download stats of the dates to process
+    responses = matomo_client.get_days(
+        'Actions.getDownloads', dates_to_process, expanded=1)
+    with BulkWriter(MatomoDailyGetPortalDownloadSummary) as writer:
+        for date in dates_to_process:
+            response = responses.get(date)
 
+            if not response:
+                writer.add({'date': date, 'day': _day(date)})
+                writer.end_group()
+                continue
 
-def _update_analytics_matomo_get_daily_keyword_searches_summary(app, matomo_api_baseurl):
+            for category in response:
+                for downloaded_item in category['subtable']:
+                    writer.add({
+                        'date': date,
+                        'day': _day(date),
+                        'url': downloaded_item['url'],
+                        'label': downloaded_item['label'],
+                        'nb_hits': downloaded_item['nb_hits'],
+                        'nb_visits': downloaded_item['nb_visits'],
+                        'nb_uniq_visitors': downloaded_item['nb_uniq_visitors'],
+                        'sum_time_spent': downloaded_item['sum_time_spent'],
+                        'segment': downloaded_item['segment'],
+                    })
+            writer.end_group()
+
+
+def _update_analytics_matomo_get_daily_keyword_searches_summary(app, matomo_client):
     """
     Function to update specifically the Matomo daily keyword search summary
     queried from the Matomo API endpoint Actions.getSiteSearchKeywords.
@@ -602,8 +833,8 @@ def _update_analytics_matomo_get_daily_keyword_searches_summary(app, matomo_api_
     current day.
     """
     from app import db
+    from app.bulk import BulkWriter
     from app.models import MatomoDailyGetSiteSearchKeywords
-    import requests
 
     # grep the dates already inserted into the database
     date_field = MatomoDailyGetSiteSearchKeywords.date
@@ -613,43 +844,43 @@ def _update_analytics_matomo_get_daily_keyword_searches_summary(app, matomo_api_
     # determines which dates are missing from the database and could be queried on Matomo
     dates_to_process = determine_dates_to_query_on_matomo(dates_in_database)
 
-    # for each date to process, query Matomo API and insert response into the database
-    for date in dates_to_process:
-        matomo_query = f"{matomo_api_baseurl}" \
-                       f"&method=Actions.getSiteSearchKeywords" \
-                       f"&period=day" \
-                       f"&date={date}"
-        response = requests.get(matomo_query).json()
-
-        if not response:
-            # if no response, then there are no stats for that date.
-            # enter the date in the table so that this date is not
-            # reprocessed at the next run of analytics updates
-            keyword_summary = MatomoDailyGetSiteSearchKeywords()
-            keyword_summary.date = date
-            db.session.merge(keyword_summary)
-            db.session.commit()
-
-        for keyword in response:
-            exit_nb_visits = keyword['exit_nb_visits'] \
-                if 'exit_nb_visits' in keyword.keys() else None
-            keyword_summary = MatomoDailyGetSiteSearchKeywords()
-            keyword_summary.date = date
-            keyword_summary.avg_time_on_page = keyword['avg_time_on_page']
-            keyword_summary.bounce_rate = keyword['bounce_rate']
-            keyword_summary.exit_nb_visits = exit_nb_visits
-            keyword_summary.exit_rate = keyword['exit_rate']
-            keyword_summary.label = keyword['label']
-            keyword_summary.nb_hits = keyword['nb_hits']
-            keyword_summary.nb_pages_per_search = keyword['nb_pages_per_search']
-            keyword_summary.nb_visits = keyword['nb_visits']
-            keyword_summary.segment = keyword['segment']
-            keyword_summary.sum_time_spent = keyword['sum_time_spent']
-
-            db.session.merge(keyword_summary)
-            db.session.commit()
-
-        print(f'[INFO   ] Inserted Matomo search keywords summary for {date}')
+    # query Matomo API for the dates to process and insert responses into the database
+    responses = matomo_client.get_days('Actions.getSiteSearchKeywords', dates_to_process)
+    with BulkWriter(MatomoDailyGetSiteSearchKeywords) as writer:
+        for date in dates_to_process:
+            response = responses.get(date)
+
+            if not response:
+                # if no response, then there are no stats for that date.
+                # enter the date in the table so that this date is not
+                # reprocessed at the next run of analytics updates
+                writer.add({'date': date, 'day': _day(date)})
+                writer.end_group()
+                continue
+
+            for keyword in response:
+                writer.add({
+                    'date': date,
+                    'day': _day(date),
+                    'avg_time_on_page': keyword['avg_time_on_page'],
+                    'bounce_rate': keyword['bounce_rate'],
+                    'exit_nb_visits': keyword.get('exit_nb_visits'),
+                    'exit_rate': keyword['exit_rate'],
+                    'label': keyword['label'],
+                    'nb_hits': keyword['nb_hits'],
+                    'nb_pages_per_search': keyword['nb_pages_per_search'],
+                    'nb_visits': keyword['nb_visits'],
+                    'segment': keyword['segment'],
+                    'sum_time_spent': keyword['sum_time_spent'],
+                })
+            writer.end_group()
+
+
+def _day(date):
+    """
+    Returns the date of a YYYY-MM-DD string
+    """
+    return datetime.strptime(date, '%Y-%m-%d').date()
 
 
 def determine_dates_to_query_on_matomo(dates_in_database):
@@ -686,27 +917,29 @@ def _generate_missing_ark_ids(app):
     pipelines = get_pipelines_from_cache()
 
     dataset_id_list = [row[0] for row in db.session.query(DBDataset.dataset_id).all()]
-    dataset_with_ark_id_list = [row[0] for row in db.session.query(ArkId.dataset_id).all()]
+    dataset_with_ark_id_list = set(row[0] for row in db.session.query(ArkId.dataset_id).all())
     pipeline_id_list = [row['ID'] for row in pipelines]
-    pipeline_with_ark_id_list = [row[0] for row in db.session.query(ArkId.pipeline_id).all()]
+    pipeline_with_ark_id_list = set(row[0] for row in db.session.query(ArkId.pipeline_id).all())
 
-    for dataset_id in dataset_id_list:
-        if dataset_id not in dataset_with_ark_id_list:
-            new_ark_id = ark_id_minter(app, 'dataset')
-            save_ark_id_in_database(app, 'dataset', new_ark_id, dataset_id)
+    save_ark_ids_in_database(app, 'dataset', [
+        dataset_id for dataset_id in dataset_id_list
+        if dataset_id not in dataset_with_ark_id_list
+    ])
+    save_ark_ids_in_database(app, 'pipeline', [
+        pipeline_id for pipeline_id in pipeline_id_list
+        if pipeline_id not in pipeline_with_ark_id_list
+    ])
 
-    for pipeline_id in pipeline_id_list:
-        if pipeline_id not in pipeline_with_ark_id_list:
-            new_ark_id = ark_id_minter(app, 'pipeline')
-            save_ark_id_in_database(app, 'pipeline', new_ark_id, pipeline_id)
 
-
-def ark_id_minter(app, ark_id_type):
+def ark_id_minter(app, ark_id_type, already_used_ark_ids=None):
     """
     Generates ARK identifiers for datasets and pipelines that do not have yet an ARK ID.
 
     :param ark_id_type: "dataset" or "pipeline"
      :type ark_id_type: str
+    :param already_used_ark_ids: set of the existing ARK IDs, read from the
+                                 `ark_id` table if not given
+     :type already_used_ark_ids: set
 
     :return: a new minted ARK identifier
     """
@@ -717,39 +950,53 @@ def ark_id_minter(app, ark_id_type):
 
     # arkid shoulder will be d7 for datasets and p7 for pipelines
     template = 'd7.reeeeeeedeeedeeek' if ark_id_type == 'dataset' else 'p7.reeeeeeedeeedeeek'
-    new_ark_id = mint(
-        template=template,
-        scheme='ark:/',
-        naa=app.config["ARK_CONP_NAAN"]
-    )
+
+    if already_used_ark_ids is None:
+        already_used_ark_ids = set(row[0] for row in db.session.query(ArkId.ark_id).all())
 
     # remint ARK ID until we get an ARK ID not already present in `ark_id` table
-    # get the list of existing ARK IDs
-    already_used_ark_id_list = [row[0] for row in db.session.query(ArkId.ark_id).all()]
-    while new_ark_id in already_used_ark_id_list:
-        new_ark_id = ark_id_minter(app, 'dataset')
+    new_ark_id = None
+    while new_ark_id is None or new_ark_id in already_used_ark_ids:
+        new_ark_id = mint(
+            template=template,
+            scheme='ark:/',
+            naa=app.config["ARK_CONP_NAAN"]
+        )
 
     return new_ark_id
 
 
-def save_ark_id_in_database(app, ark_id_type, new_ark_id, source_id):
+def save_ark_ids_in_database(app, ark_id_type, source_ids):
+    """
+    Mints an ARK identifier for each dataset or pipeline and saves them
+    in the `ark_id` table in one transaction.
+
+    :param ark_id_type: "dataset" or "pipeline"
+     :type ark_id_type: str
+    :param source_ids: ids of the datasets or pipelines
+     :type source_ids: list
+    """
 
     from app import db
+    from app.bulk import BulkWriter
     from app.models import ArkId
 
-    # get the list of existing ARK IDs
-    already_used_ark_id_list = [row[0] for row in db.session.query(ArkId.ark_id).all()]
+    if not source_ids:
+        return
 
-    # if the new ARK identifier does not already exist, add an entry in the ark_id table
-    if new_ark_id not in already_used_ark_id_list:
-        ark_id_summary = ArkId()
-        ark_id_summary.ark_id = new_ark_id
-        ark_id_summary.dataset_id = source_id if ark_id_type == "dataset" else None
-        ark_id_summary.pipeline_id = source_id if ark_id_type == "pipeline" else None
+    # get the list of existing ARK IDs once for all the new ones
+    already_used_ark_ids = set(row[0] for row in db.session.query(ArkId.ark_id).all())
 
-        db.session.merge(ark_id_summary)
-        db.session.commit()
-        print(f'[INFO   ] Created ARK ID {new_ark_id} for {ark_id_type} {source_id}')
+    with BulkWriter(ArkId) as writer:
+        for source_id in source_ids:
+            new_ark_id = ark_id_minter(app, ark_id_type, already_used_ark_ids)
+            already_used_ark_ids.add(new_ark_id)
+            writer.add({
+                'ark_id': new_ark_id,
+                'dataset_id': source_id if ark_id_type == "dataset" else None,
+                'pipeline_id': source_id if ark_id_type == "pipeline" else None,
+            })
+            print(f'[INFO   ] Created ARK ID {new_ark_id} for {ark_id_type} {source_id}')
 
 
 def _update_github_traffic_counts(app):
@@ -773,6 +1020,7 @@ def _update_github_traffic_counts(app):
     """
 
     from app import db
+    from app.bulk import BulkWriter
     from app.models import GithubDailyClonesCount, GithubDailyViewsCount
     from pathlib import Path
     import git
@@ -787,54 +1035,57 @@ def _update_github_traffic_counts(app):
             branch='master'
         )
 
-    # loop through the list of submodules present in CONP-PCNO/conp-dataset.git
-    for submodule in repo.submodules:
-        sub_repo = submodule.url.replace('https://github.com/', '').replace('.git', '')
-        if sub_repo.startswith('CONP-PCNO/'):
-            # skip the repos under the CONP-PCNO organization as they are not datasets
-            continue
-
-        # query the GitHub analytics API for number of clones and views
-        daily_stat_dict = _get_repo_analytics(app, sub_repo)
-        if not daily_stat_dict:
-            continue
+    writers = {
+        'clones': BulkWriter(GithubDailyClonesCount),
+        'views': BulkWriter(GithubDailyViewsCount),
+    }
+    with writers['clones'], writers['views']:
+        # loop through the list of submodules present in CONP-PCNO/conp-dataset.git
+        for submodule in repo.submodules:
+            sub_repo = submodule.url.replace('https://github.com/', '').replace('.git', '')
+            if sub_repo.startswith('CONP-PCNO/'):
+                # skip the repos under the CONP-PCNO organization as they are not datasets
+                continue
 
-        # get the list of dates already in the database for this repo
-        dates_in_db_dict = {}
-        db_clones_results = db.session.query(GithubDailyClonesCount.date).filter_by(repo=sub_repo).all()
-        dates_in_db_dict['clones'] = [row[0] for row in db_clones_results]
-        db_views_results = db.session.query(GithubDailyViewsCount.date).filter_by(repo=sub_repo).all()
-        dates_in_db_dict['views'] = [row[0] for row in db_views_results]
-
-        # loop through results returned by GitHub API calls and insert
-        # new data in the proper database table
-        for analytic_type in daily_stat_dict:
-            if not daily_stat_dict[analytic_type]:
+            # query the GitHub analytics API for number of clones and views
+            daily_stat_dict = _get_repo_analytics(app, sub_repo)
+            if not daily_stat_dict:
                 continue
 
-            for date in daily_stat_dict[analytic_type]:
-                if date in dates_in_db_dict[analytic_type]:
-                    # go to next date if there is already an entry for the date
-                    # for that repo in the database table
+            # get the list of dates already in the database for this repo
+            dates_in_db_dict = {}
+            db_clones_results = db.session.query(GithubDailyClonesCount.date).filter_by(repo=sub_repo).all()
+            dates_in_db_dict['clones'] = set(row[0] for row in db_clones_results)
+            db_views_results = db.session.query(GithubDailyViewsCount.date).filter_by(repo=sub_repo).all()
+            dates_in_db_dict['views'] = set(row[0] for row in db_views_results)
+
+            # loop through results returned by GitHub API calls and add
+            # the new data to the writer of the proper database table
+            for analytic_type in daily_stat_dict:
+                if not daily_stat_dict[analytic_type]:
                     continue
 
-                analytics_summary = None
-                if analytic_type == 'clones':
-                    analytics_summary = GithubDailyClonesCount()
-                elif analytic_type == 'views':
-                    analytics_summary = GithubDailyViewsCount()
-                else:
+                if analytic_type not in writers:
                     print("GitHub analytic type is neither 'clones' nor 'views'")
+                    continue
 
-                if analytics_summary:
-                    analytics_summary.date = date
-                    analytics_summary.repo = sub_repo
-                    analytics_summary.timestamp = daily_stat_dict[analytic_type][date]['timestamp']
-                    analytics_summary.count = daily_stat_dict[analytic_type][date]['count']
-                    analytics_summary.unique_count = daily_stat_dict[analytic_type][date]['unique_count']
+                for date in daily_stat_dict[analytic_type]:
+                    if date in dates_in_db_dict[analytic_type]:
+                        # go to next date if there is already an entry for the date
+                        # for that repo in the database table
+                        continue
 
-                    db.session.merge(analytics_summary)
-                    db.session.commit()
+                    writers[analytic_type].add({
+                        'date': date,
+                        'repo': sub_repo,
+                        'timestamp': daily_stat_dict[analytic_type][date]['timestamp'],
+                        'count': daily_stat_dict[analytic_type][date]['count'],
+                        'unique_count': daily_stat_dict[analytic_type][date]['unique_count'],
+                    })
+
+            # the rows of a repo are committed together
+            for writer in writers.values():
+                writer.end_group()
 
 
 def _get_repo_analytics(app, repo):
@@ -7,6 +7,7 @@ import json
 import os
 from flask import render_template, request
 from flask_login import current_user
+from app.caching import conditional_json
 from app.execution_records import execution_records_bp
 import zipfile
 
@@ -45,6 +46,7 @@ def execution_records():
 
 
 @execution_records_bp.route('/execution-records-search', methods=['GET'])
+@conditional_json()
 def execution_records_search():
     authorized = True if current_user.is_authenticated else False
 
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""Jobs Module
+
+Module that runs the long refresh tasks of the command line interface as
+jobs. Each job holds an exclusive file lock while it runs, so overlapping
+cron runs of the same job do not clobber each other, and persists its
+status and the timing and progress of its stages in a small JSON state
+file.
+
+A job whose previous run failed or was interrupted recently resumes from
+there, one stage at a time: the stages completed by that run are skipped.
+Within a stage, the Matomo and ARK id updates already skip what the
+database holds. A run started longer ago than the resume max age is not
+resumed, so the next scheduled run after a failure refreshes every stage.
+"""
+import fcntl
+import json
+import os
+import socket
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+
+class JobLockedError(Exception):
+    """
+        Raised when a job is started while another run of it holds the lock
+    """
+    pass
+
+
+def _now():
+    return datetime.utcnow().isoformat(timespec='seconds')
+
+
+def _read_state(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class Job(object):
+    """
+        One run of a refresh job
+
+        state = dict persisted in <state_dir>/<name>.json:
+            status      = "running", "succeeded" or "failed"
+            pid, host   = process running the job
+            started, finished
+            stages      = dict of stage -> status, started, finished,
+                          seconds, done and total (progress)
+            error       = message of the exception that failed the job
+    """
+
+    def __init__(self, name, state_dir, resume_max_age=None):
+        """
+            Args:
+                name: name of the job, e.g. "update_datasets"
+                state_dir: directory of the state and lock files
+                resume_max_age: seconds since the start of a failed or
+                                interrupted run during which it is resumed,
+                                None to always resume it
+        """
+        self.name = name
+        self.state_dir = state_dir
+        self.resume_max_age = resume_max_age
+        self.state_path = os.path.join(state_dir, name + ".json")
+        self.lock_path = os.path.join(state_dir, name + ".lock")
+        self.state = None
+        self.resumed = False
+        self._lock_file = None
+        self._stage = None
+
+    def __enter__(self):
+        if not os.path.exists(self.state_dir):
+            os.makedirs(self.state_dir, exist_ok=True)
+
+        self._lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            self._lock_file = None
+            raise JobLockedError(
+                "Job {} is already running".format(self.name))
+
+        previous = _read_state(self.state_path)
+        self.resumed = self._resumable(previous)
+        self.state = {
+            "name": self.name,
+            "status": "running",
+            "pid": os.getpid(),
+            "host": socket.gethostname(),
+            "started": _now(),
+            "finished": None,
+            "stages": {},
+            "error": None,
+        }
+        if self.resumed:
+            # keep what the interrupted run completed
+            self.state["stages"] = dict(
+                (stage, info) for stage, info in previous.get("stages", {}).items()
+                if info.get("status") == "succeeded")
+        self._save()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.state["finished"] = _now()
+        if exc_type is None:
+            self.state["status"] = "succeeded"
+        else:
+            self.state["status"] = "failed"
+            self.state["error"] = "{}: {}".format(exc_type.__name__, exc_value)
+        self._save()
+
+        fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        self._lock_file.close()
+        self._lock_file = None
+        return False
+
+    def _resumable(self, previous):
+        if previous is None or previous.get("status") == "succeeded":
+            return False
+        if self.resume_max_age is None:
+            return True
+        try:
+            started = datetime.fromisoformat(previous["started"])
+        except (KeyError, TypeError, ValueError):
+            return False
+        return datetime.utcnow() - started <= timedelta(seconds=self.resume_max_age)
+
+    def _save(self):
+        tmp_path = "{}.{}.tmp".format(self.state_path, os.getpid())
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def stage_completed(self, stage):
+        info = self.state["stages"].get(stage)
+        return info is not None and info.get("status") == "succeeded"
+
+    @contextmanager
+    def stage(self, stage):
+        """
+            Records the status and timing of a stage of the job
+        """
+        info = {"status": "running", "started": _now(), "finished": None,
+                "seconds": None, "done": None, "total": None}
+        self.state["stages"][stage] = info
+        self._stage = stage
+        self._save()
+
+        start = time.monotonic()
+        try:
+            yield info
+        except BaseException:
+            info["status"] = "failed"
+            raise
+        else:
+            info["status"] = "succeeded"
+        finally:
+            info["finished"] = _now()
+            info["seconds"] = round(time.monotonic() - start, 3)
+            self._stage = None
+            self._save()
+
+    def progress(self, done, total=None):
+        """
+            Saves the progress of the current stage
+        """
+        if self._stage is None:
+            return
+        info = self.state["stages"][self._stage]
+        info["done"] = done
+        info["total"] = total
+        self._save()
+
+
+_current_job = None
+
+
+def current_job():
+    """
+        Returns the job running in this process, None outside of a job
+    """
+    return _current_job
+
+
+def run_job(app, name, func, *args, **kwargs):
+    """
+        Runs a function as a job, holding the lock of the job
+
+        Args:
+            app: the Flask app, JOBS_STATE_PATH is the state directory and
+                 JOBS_RESUME_MAX_AGE the resume max age
+            name: name of the job, e.g. "update_datasets"
+            func: function running the job
+
+        Returns:
+            the value returned by the function
+
+        Raises:
+            JobLockedError if the job is already running
+    """
+    global _current_job
+
+    with Job(name, app.config['JOBS_STATE_PATH'],
+             resume_max_age=app.config.get('JOBS_RESUME_MAX_AGE')) as job:
+        previous_job, _current_job = _current_job, job
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current_job = previous_job
+
+
+def run_stage(stage, func, *args, **kwargs):
+    """
+        Runs a stage of the current job, skipping it if the interrupted
+        run being resumed already completed it. Outside of a job, the
+        function is simply called.
+    """
+    job = _current_job
+    if job is None:
+        return func(*args, **kwargs)
+
+    if job.resumed and job.stage_completed(stage):
+        print(f'[INFO   ] Skipping {stage}, completed by the interrupted run')
+        return None
+
+    with job.stage(stage):
+        return func(*args, **kwargs)
+
+
+def report_progress(done, total=None):
+    """
+        Saves the progress of the current stage of the current job, if any
+    """
+    if _current_job is not None:
+        _current_job.progress(done, total)
+
+
+def job_status(state_dir, name=None):
+    """
+        Returns the persisted states of the jobs
+
+        Args:
+            state_dir: directory of the job state files
+            name: only return the state of this job
+
+        Returns:
+            list of job states, a job still marked as running whose lock is
+            free has the status "interrupted"
+    """
+    if not os.path.isdir(state_dir):
+        return []
+
+    names = [name] if name else sorted(
+        f[:-len(".json")] for f in os.listdir(state_dir) if f.endswith(".json"))
+
+    states = []
+    for job_name in names:
+        state = _read_state(os.path.join(state_dir, job_name + ".json"))
+        if state is None:
+            continue
+        if state.get("status") == "running" and not _is_locked(
+                os.path.join(state_dir, job_name + ".lock")):
+            state["status"] = "interrupted"
+        states.append(state)
+    return states
+
+
+def _is_locked(lock_path):
+    """
+        Returns whether a running job holds the lock
+    """
+    try:
+        with open(lock_path, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            return False
+    except OSError:
+        return False
@@ -3,8 +3,6 @@
 
     Currently this module contains all of the routes for the main blueprint
 """
-import os
-import json
 from urllib import request
 
 from flask import render_template, redirect, abort
@@ -12,6 +10,7 @@ from flask import current_app
 from flask_login import current_user
 from app.main import main_bp
 from app.models import Dataset
+from app.pipelines.registry import get_pipeline_registry
 from app.services import github
 
 
@@ -102,22 +101,7 @@ def about():
     countDatasets = len(datasets)
 
     # count number of pipelines
-    cache_dir = os.path.join(os.path.expanduser(
-        '~'), ".cache", "boutiques", "production")
-    all_desc_path = os.path.join(cache_dir, "all_descriptors.json")
-    all_detailed_desc_path = os.path.join(
-        cache_dir, "detailed_all_descriptors.json")
-
-    with open(all_desc_path, "r") as f:
-        all_descriptors = json.load(f)
-
-    with open(all_detailed_desc_path, "r") as f:
-        detailed_all_descriptors = json.load(f)
-
-    elements = [
-        {**descriptor, **detailed_all_descriptors[d_index]}
-        for d_index, descriptor in enumerate(all_descriptors)
-    ]
+    elements = get_pipeline_registry().pipelines
 
     # filter out the deprecated pipelines
     elements = list(filter(lambda e: (not e["DEPRECATED"]), elements))
@@ -182,8 +166,7 @@ def dats_editor():
 def redirect_ark_ids(url_naan, url_ark_id):
 
     from flask import current_app
-    from app import db
-    from app.models import ArkId
+    from app.services.ark_ids import get_ark_id_map
 
     config_naan = current_app.config['ARK_CONP_NAAN']
     if config_naan != url_naan:
@@ -196,16 +179,13 @@ def redirect_ark_ids(url_naan, url_ark_id):
     requested_full_ark_id = f"ark:/{url_naan}/{url_ark_id}"
     redirect_url = None
 
-    if url_ark_id.startswith('d7'):
-        db_entry = db.session.query(ArkId.dataset_id).filter_by(
-            ark_id=requested_full_ark_id
-        ).first()
-        redirect_url = f'/dataset?id={db_entry[0]}'
-    elif url_ark_id.startswith('p7'):
-        db_entry = db.session.query(ArkId.pipeline_id).filter_by(
-            ark_id=requested_full_ark_id
-        ).first()
-        redirect_url = f'/pipeline?id={db_entry[0]}'
+    resolved = get_ark_id_map().resolve(requested_full_ark_id)
+    if resolved is not None:
+        source_type, source_id = resolved
+        if source_type == 'dataset' and url_ark_id.startswith('d7'):
+            redirect_url = f'/dataset?id={source_id}'
+        elif source_type == 'pipeline' and url_ark_id.startswith('p7'):
+            redirect_url = f'/pipeline?id={source_id}'
 
     if not redirect_url:
         abort(
@@ -268,11 +268,13 @@ class MatomoDailyVisitsSummary(db.Model):
     nb_visits            = number of visits (30 min of inactivity considered a new visit)
     nb_visits_converted  = number of visits that converted a goal
     sum_visit_length     = total time spent, in seconds
+    day                  = date of the statistics as a Date
     """
     __tablename__ = 'matomo_daily_visits_summary'
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     date = db.Column(db.String(12), unique=True)
+    day = db.Column(db.Date, index=True)
     avg_time_on_site = db.Column(db.Integer)
     bounce_count = db.Column(db.Integer)
     max_actions = db.Column(db.Integer)
@@ -304,11 +306,14 @@ class MatomoDailyGetPageUrlsSummary(db.Model):
     - nb_uniq_visitors = number of unique visitors
     - sum_time_spent   = total time spent on this page, in seconds
     - avg_time_on_page = average time spent, in seconds, on this page
+
+    day is the date of the statistics as a Date.
     """
     __tablename__ = 'matomo_daily_get_page_urls_summary'
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     date = db.Column(db.String(12))
+    day = db.Column(db.Date, index=True)
     url = db.Column(db.Text)
     label = db.Column(db.String(256))
     nb_hits = db.Column(db.Integer)
@@ -335,12 +340,15 @@ class MatomoDailyGetDatasetPageViewsSummary(db.Model):
     - nb_uniq_visitors = number of unique visitors
     - sum_time_spent   = total time spent on this page, in seconds
     - avg_time_on_page = average time spent, in seconds, on this page
+
+    day is the date of the statistics as a Date.
     """
     __tablename__ = 'matomo_daily_dataset_page_views_summary'
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     dataset_id = db.Column(db.String(256))
     date = db.Column(db.String(12))
+    day = db.Column(db.Date, index=True)
     url = db.Column(db.Text)
     label = db.Column(db.String(256))
     nb_hits = db.Column(db.Integer)
@@ -366,11 +374,14 @@ class MatomoDailyGetPortalDownloadSummary(db.Model):
     - nb_uniq_visitors = number of unique visitors
     - sum_time_spent   = total time spent on this page, in seconds
     - segment          = segment with download URL
+
+    day is the date of the statistics as a Date.
     """
     __tablename__ = 'matomo_daily_portal_download_summary'
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     date = db.Column(db.String(12))
+    day = db.Column(db.Date, index=True)
     url = db.Column(db.Text)
     label = db.Column(db.String(256))
     nb_hits = db.Column(db.Integer)
@@ -398,12 +409,14 @@ class MatomoDailyGetSiteSearchKeywords(db.Model):
     nb_visits           = number of visits (30 min of inactivity considered a new visit)
     segment             = segment with keyword search
     sum_time_spent      = total time spent on this page, in seconds
+    day                 = date of the statistics as a Date
     """
 
     __tablename__ = 'matomo_daily_site_keyword_searches_summary'
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     date = db.Column(db.String(12))
+    day = db.Column(db.Date, index=True)
     avg_time_on_page = db.Column(db.Integer)
     bounce_rate = db.Column(db.String(64))
     exit_nb_visits = db.Column(db.Integer)
@@ -419,6 +432,129 @@ class MatomoDailyGetSiteSearchKeywords(db.Model):
         return '<MatomoDailyGetSiteSearchKeywords {}>'.format(self.id)
 
 
+class MatomoVisitsSummaryRollup(db.Model):
+    """
+    Provides the monthly and yearly sums of matomo_daily_visits_summary,
+    updated by `flask update_analytics` for the periods of the new days
+
+    period           = "month" or "year"
+    period_start     = first day of the month or of the year
+    nb_days          = number of days with statistics in the period
+    max_actions      = maximum number of actions in a visit
+    the other columns are the sums of the daily columns, the unique
+    visitor and user counts of a day cannot be summed and are left out
+    """
+    __tablename__ = 'matomo_visits_summary_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('period', 'period_start',
+                            name='uq_matomo_visits_summary_rollup_period'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    period = db.Column(db.String(8), nullable=False)
+    period_start = db.Column(db.Date, nullable=False, index=True)
+    nb_days = db.Column(db.Integer)
+    bounce_count = db.Column(db.Integer)
+    max_actions = db.Column(db.Integer)
+    nb_actions = db.Column(db.Integer)
+    nb_visits = db.Column(db.Integer)
+    nb_visits_converted = db.Column(db.Integer)
+    sum_visit_length = db.Column(db.Integer)
+
+    def __repr__(self):
+        return '<MatomoVisitsSummaryRollup {} {}>'.format(self.period, self.period_start)
+
+
+class MatomoPageViewsRollup(db.Model):
+    """
+    Provides the monthly and yearly sums of the Matomo daily page views
+    and keyword searches per item, updated by `flask update_analytics`
+    for the periods of the new days
+
+    report           = daily table rolled up:
+                       "dataset_views" (item is the dataset_id),
+                       "page_urls" (item is the page label) or
+                       "keywords" (item is the keyword, only the searches
+                       with at least 2 seconds spent on the results)
+    period           = "month" or "year"
+    period_start     = first day of the month or of the year
+    url, label       = page URL and label of the item
+    nb_hits, nb_visits, nb_uniq_visitors = sums of the daily columns
+    """
+    __tablename__ = 'matomo_page_views_rollup'
+    __table_args__ = (
+        db.Index('ix_matomo_page_views_rollup_report_period',
+                 'report', 'period', 'period_start'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    report = db.Column(db.String(32), nullable=False)
+    period = db.Column(db.String(8), nullable=False)
+    period_start = db.Column(db.Date, nullable=False)
+    item = db.Column(db.String(256))
+    url = db.Column(db.Text)
+    label = db.Column(db.String(256))
+    nb_hits = db.Column(db.Integer)
+    nb_visits = db.Column(db.Integer)
+    nb_uniq_visitors = db.Column(db.Integer)
+
+    def __repr__(self):
+        return '<MatomoPageViewsRollup {} {} {}>'.format(
+            self.report, self.period_start, self.item)
+
+
+class MatomoRollupState(db.Model):
+    """
+    Provides the id of the last daily row included in the rollups of
+    each report, the rollups of the periods of the newer rows are
+    recomputed by `flask update_analytics`
+    """
+    __tablename__ = 'matomo_rollup_state'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    report = db.Column(db.String(32), unique=True, nullable=False)
+    last_id = db.Column(db.Integer, nullable=False)
+    date_updated = db.Column(db.DateTime, nullable=False,
+                             default=datetime.now(tz=eastern))
+
+    def __repr__(self):
+        return '<MatomoRollupState {}>'.format(self.report)
+
+
+class DatasetAnalyticsTotals(db.Model):
+    """
+    Provides the all-time Matomo totals of each dataset, recomputed from
+    the daily summary tables by `flask update_analytics` so that listings
+    do not have to aggregate the daily rows.
+
+    dataset_id                = dataset identifier (projects/<name>)
+    nb_views                  = number of views of the dataset page,
+                                NULL if the page was never viewed
+    nb_view_visits            = number of visits of the dataset page
+    nb_view_uniq_visitors     = number of unique visitors of the dataset page
+    nb_downloads              = number of downloads of the dataset archives,
+                                NULL if the dataset was never downloaded
+    nb_download_visits        = number of visits with a dataset download
+    nb_download_uniq_visitors = number of unique visitors who downloaded the dataset
+    """
+
+    __tablename__ = 'dataset_analytics_totals'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    dataset_id = db.Column(db.String(256), unique=True, index=True)
+    nb_views = db.Column(db.Integer)
+    nb_view_visits = db.Column(db.Integer)
+    nb_view_uniq_visitors = db.Column(db.Integer)
+    nb_downloads = db.Column(db.Integer)
+    nb_download_visits = db.Column(db.Integer)
+    nb_download_uniq_visitors = db.Column(db.Integer)
+    date_updated = db.Column(db.DateTime, nullable=False,
+                             default=datetime.now(tz=eastern))
+
+    def __repr__(self):
+        return '<DatasetAnalyticsTotals {}>'.format(self.dataset_id)
+
+
 class ArkId(db.Model):
 
     __tablename__ = 'ark_id'
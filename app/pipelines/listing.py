@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""Pipeline Listing Module
+
+Listing shown by /pipeline-search, built once per pipeline snapshot. The
+deprecated and blocked pipelines are left out and the listing records are
+annotated with their CBRAIN platform from the static pipeline files, which
+only change between deployments.
+
+The listing also indexes the pipelines of each domain tag, to filter and
+count them as facets, and keeps them presorted on each sort field.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict, defaultdict
+
+from app.pipelines.registry import domain_tags, files_signature
+
+
+CBRAIN_PIPELINES_FILENAME = "cbrain-conp-pipeline.json"
+BLOCK_LIST_FILENAME = "block-list-pipeline.json"
+
+# sort field -> key of a listing record in ascending order
+SORT_FIELDS = OrderedDict([
+    ("downloads", lambda r: (r.get("downloads") is None, r.get("downloads"))),
+    ("title", lambda r: (r.get("title") is None, (r.get("title") or "").lower())),
+    ("id", lambda r: (r.get("id") is None, r.get("id"))),
+])
+
+RELEVANCE = "relevance"
+
+
+def parse_sort_keys(sort_key):
+    """
+        Returns the (field, reverse) pairs of a comma separated sort key,
+        e.g. "downloads-desc,title-asc", or None to sort by relevance
+    """
+    sort_keys = []
+    for key in sort_key.split(","):
+        key = key.strip()
+        if key == RELEVANCE:
+            return None
+        if key == "conpStatus":
+            key = "downloads-desc"
+
+        field, reverse = key, False
+        if key.endswith("-desc"):
+            field, reverse = key[:-5], True
+        elif key.endswith("-asc"):
+            field = key[:-4]
+
+        if field in SORT_FIELDS:
+            sort_keys.append((field, reverse))
+    return sort_keys
+
+
+class PipelineListing(object):
+    """
+        Listing records of the pipelines of one registry
+
+        records            = listing records shown on the pipelines page,
+                             in the order of the registry
+        listing_positions  = dict of registry position -> listing position
+        cbrain_ids         = set of the ids of the pipelines on CBRAIN
+        tags               = dict of lowercase domain tag -> set of listing
+                             positions
+        ranks              = dict of sort field -> rank of each record
+        orderings          = dict of (sort field, reverse) -> listing
+                             positions in that order
+    """
+
+    def __init__(self, signature, registry, cbrain_urls, blocked_ids,
+                 platform_images):
+        """
+            Args:
+                registry: the PipelineRegistry of the listing
+                cbrain_urls: dict of pipeline id -> CBRAIN URL
+                blocked_ids: ids of the pipelines not to list
+                platform_images: (gray, green) URLs of the CBRAIN logo
+        """
+        self.signature = signature
+        self.registry = registry
+        self.cbrain_ids = set(cbrain_urls)
+        blocked_ids = set(blocked_ids)
+
+        self.records = []
+        self.listing_positions = {}
+        for position, record in enumerate(registry.records):
+            if record.get("deprecated") or record["id"] in blocked_ids:
+                continue
+
+            # TODO right now, this handles CBRAIN and one other platform
+            cbrain_url = cbrain_urls.get(record["id"])
+            record = dict(record, platforms=[{
+                "img": platform_images[1 if cbrain_url else 0],
+                "uri": cbrain_url or "",
+            }])
+
+            self.listing_positions[position] = len(self.records)
+            self.records.append(record)
+
+        tags = defaultdict(set)
+        for position, record in enumerate(self.records):
+            for tag in domain_tags(record):
+                tags[tag.lower()].add(position)
+        self.tags = dict(tags)
+
+        self.ranks = {}
+        self.orderings = {}
+        for field, key in SORT_FIELDS.items():
+            ordered = sorted(range(len(self.records)),
+                             key=lambda p: key(self.records[p]))
+            ranks = [0] * len(self.records)
+            rank, previous = 0, None
+            for index, position in enumerate(ordered):
+                value = key(self.records[position])
+                if index > 0 and value != previous:
+                    rank += 1
+                ranks[position], previous = rank, value
+            self.ranks[field] = ranks
+            self.orderings[(field, False)] = ordered
+            self.orderings[(field, True)] = sorted(
+                ordered, key=lambda p: (-ranks[p], p))
+
+    def __len__(self):
+        return len(self.records)
+
+    def positions(self, search_query=None, cbrain=False):
+        """
+            Returns the listing positions of the records matching the search
+            query, best match first, and only those on CBRAIN if cbrain is
+            set
+        """
+        positions = None
+        if search_query:
+            positions = self.registry.search_index.search(search_query)
+
+        if positions is None:
+            positions = range(len(self.records))
+        else:
+            positions = [
+                self.listing_positions[position]
+                for position in positions
+                if position in self.listing_positions
+            ]
+
+        if cbrain:
+            return [p for p in positions
+                    if self.records[p]["id"] in self.cbrain_ids]
+        return list(positions)
+
+    def select_tags(self, positions, tags):
+        """
+            Returns the set of the positions having every domain tag
+        """
+        selected = set(positions)
+        for tag in tags:
+            selected &= self.tags.get(tag.lower(), set())
+        return selected
+
+    def tag_counts(self, positions, selected):
+        """
+            Counts the selected pipelines of each domain tag
+
+            Args:
+                positions: candidate positions, only the tags of those
+                           pipelines are listed
+                selected: set of the positions matching the tag filters
+
+            Returns:
+                OrderedDict of tag -> number of pipelines
+        """
+        positions = set(positions)
+        return OrderedDict(
+            (tag, len(self.tags[tag] & selected))
+            for tag in sorted(self.tags)
+            if not self.tags[tag].isdisjoint(positions)
+        )
+
+    def sort(self, positions, selected, sort_keys):
+        """
+            Returns the selected positions in the order of the sort keys
+
+            Args:
+                positions: candidate positions in relevance order
+                selected: set of the positions to return
+                sort_keys: (field, reverse) pairs returned by
+                           parse_sort_keys, None to keep the relevance order
+        """
+        if not sort_keys:
+            return [p for p in positions if p in selected]
+        if len(sort_keys) == 1:
+            return [p for p in self.orderings[sort_keys[0]] if p in selected]
+
+        def key(position):
+            return tuple(
+                -self.ranks[field][position] if reverse
+                else self.ranks[field][position]
+                for field, reverse in sort_keys
+            ) + (position,)
+        return sorted(selected, key=key)
+
+
+_cbrain_urls = (None, {})
+_listing = None
+_listing_lock = threading.Lock()
+
+
+def get_cbrain_urls(static_dir):
+    """
+        Returns the dict of pipeline id -> CBRAIN URL of the static CBRAIN
+        pipelines file, reloading it only if it changed
+    """
+    global _cbrain_urls
+
+    path = os.path.join(static_dir, CBRAIN_PIPELINES_FILENAME)
+    signature = (path, files_signature((path,)))
+    cbrain_urls = _cbrain_urls
+    if cbrain_urls[0] == signature:
+        return cbrain_urls[1]
+
+    with open(path, "r") as f:
+        cbrain_urls = (signature, json.load(f))
+    _cbrain_urls = cbrain_urls
+    return cbrain_urls[1]
+
+
+def get_pipeline_listing(registry, static_dir, platform_images):
+    """
+        Returns the pipeline listing of the registry, rebuilding it only if
+        the registry or the static pipeline files changed
+
+        Args:
+            registry: the current PipelineRegistry
+            static_dir: directory of the static pipeline files
+            platform_images: (gray, green) URLs of the CBRAIN logo
+
+        Returns:
+            the PipelineListing
+    """
+    global _listing
+
+    paths = (
+        os.path.join(static_dir, CBRAIN_PIPELINES_FILENAME),
+        os.path.join(static_dir, BLOCK_LIST_FILENAME),
+    )
+    signature = (registry.signature, static_dir, files_signature(paths),
+                 tuple(platform_images))
+    listing = _listing
+    if listing is not None and listing.signature == signature:
+        return listing
+
+    with _listing_lock:
+        if _listing is None or _listing.signature != signature:
+            cbrain_urls = get_cbrain_urls(static_dir)
+            with open(paths[1], "r") as f:
+                blocked_ids = json.load(f)
+            _listing = PipelineListing(
+                signature, registry, cbrain_urls, blocked_ids, platform_images)
+        return _listing
@@ -1,51 +1,47 @@
 # -*- coding: utf-8 -*-
-import json
 import os
 
+from app.pipelines import registry as pipeline_registry
+from app.pipelines.registry import get_pipeline_registry
+from app.pipelines.snapshot import (
+    SHARDS_DIRNAME, page_record, read_pipeline_shard)
 
-def get_pipelines_from_cache(search_query=None):
-    cache_dir = os.path.join(os.path.expanduser(
-        '~'), ".cache", "boutiques", "production")
-    all_desc_path = os.path.join(cache_dir, "all_descriptors.json")
-    all_detailed_desc_path = os.path.join(
-        cache_dir, "detailed_all_descriptors.json")
-
-    # fetch data from cache
-    with open(all_desc_path, "r") as f:
-        all_descriptors = json.load(f)
 
-    with open(all_detailed_desc_path, "r") as f:
-        detailed_all_descriptors = json.load(f)
+def get_pipelines_from_cache(search_query=None):
+    registry = get_pipeline_registry()
 
     if search_query not in ("", '', None):
-        pipelines = [
-            {**descriptor, **detailed_all_descriptors[d_index]}
-            for d_index, descriptor in enumerate(all_descriptors)
-            if search_query in (
-                (str(descriptor.values())
-                    + str(detailed_all_descriptors[d_index]["tags"].values())).lower()
-                if "tags" in detailed_all_descriptors[d_index] else
-                str(descriptor.values()).lower()
-            )
-        ]
+        pipelines = registry.search(search_query)
     else:
-        pipelines = [
-            {**descriptor, **detailed_all_descriptors[d_index]}
-            for d_index, descriptor in enumerate(all_descriptors)
-        ]
+        pipelines = registry.pipelines
 
-    return pipelines
+    # the descriptors are shared by the whole process,
+    # callers get copies they can annotate
+    return [dict(pipeline) for pipeline in pipelines]
 
 
 def get_title_from_id(pipeline_id):
-    pipelines = get_pipelines_from_cache()
-
-    filtered_pipelines = list(
-        filter(lambda e: e['ID'] == pipeline_id, pipelines))
+    summary = get_pipeline_registry().summary(pipeline_id)
 
     title = None
-    if len(filtered_pipelines) > 0:
-        pipeline = filtered_pipelines[0]
-        title = pipeline.get("TITLE", None)
+    if summary is not None:
+        title = summary.title
 
     return title
+
+
+def get_pipeline_record(pipeline_id):
+    """
+        Returns the page record of a pipeline, read from its shard file,
+        or None if there is no such pipeline
+    """
+    shard_dir = os.path.join(
+        pipeline_registry.BOUTIQUES_CACHE_DIR, SHARDS_DIRNAME)
+    if os.path.isdir(shard_dir):
+        return read_pipeline_shard(shard_dir, pipeline_id)
+
+    # no pipeline refresh wrote the shards yet
+    pipeline = get_pipeline_registry().get(pipeline_id)
+    if pipeline is None:
+        return None
+    return page_record(pipeline)
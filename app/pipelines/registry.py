@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""Pipeline Registry Module
+
+Module that keeps the Boutiques descriptors written by UpdatePipelineData
+in memory. The pipeline snapshot is loaded once, and only reloaded when it
+is replaced on disk. The summary and detailed descriptor files written
+before the snapshot existed are still read when there is no snapshot.
+"""
+import json
+import os
+import threading
+from collections import namedtuple
+
+from app.pipelines.search_index import PipelineSearchIndex
+from app.pipelines.snapshot import (
+    SNAPSHOT_FILENAME, listing_record, merge_descriptors, read_pipeline_snapshot)
+
+
+BOUTIQUES_CACHE_DIR = os.path.join(
+    os.path.expanduser('~'), ".cache", "boutiques", "production")
+
+
+PipelineSummary = namedtuple(
+    'PipelineSummary', ['id', 'title', 'tags', 'downloads', 'deprecated'])
+
+
+class PipelineRegistry(object):
+    """
+        Merged Boutiques descriptors for one version of the cache files
+
+        pipelines    = list of merged descriptors, in the order of the
+                       Zenodo search results
+        records      = listing records of the descriptors, in the same order
+        by_id        = dict of Zenodo id (e.g. "zenodo.1234") -> descriptor
+        summaries    = dict of Zenodo id -> PipelineSummary
+        search_index = PipelineSearchIndex of the descriptors
+    """
+
+    def __init__(self, signature, pipelines, records=None):
+        self.signature = signature
+        self.pipelines = pipelines
+        if records is None:
+            records = [listing_record(p) for p in pipelines]
+        self.records = records
+        self.by_id = dict((p["ID"], p) for p in self.pipelines)
+        self.summaries = dict(
+            (p["ID"], PipelineSummary(
+                id=p["ID"],
+                title=p.get("TITLE"),
+                tags=domain_tags(p),
+                downloads=p.get("DOWNLOADS"),
+                deprecated=bool(p.get("DEPRECATED")),
+            ))
+            for p in self.pipelines
+        )
+        self.search_index = PipelineSearchIndex(self.pipelines)
+
+    def __len__(self):
+        return len(self.pipelines)
+
+    def get(self, pipeline_id):
+        return self.by_id.get(pipeline_id)
+
+    def summary(self, pipeline_id):
+        return self.summaries.get(pipeline_id)
+
+    def search(self, search_query, records=False):
+        """
+            Returns the descriptors (or their listing records) matching the
+            search query, best match first, or all of them if the query has
+            no searchable word
+        """
+        entries = self.records if records else self.pipelines
+        positions = self.search_index.search(search_query)
+        if positions is None:
+            return list(entries)
+        return [entries[position] for position in positions]
+
+
+def domain_tags(descriptor):
+    """
+        Returns the domain tags of a descriptor as a tuple
+    """
+    domain = descriptor.get("tags", {}).get("domain", [])
+    if isinstance(domain, str):
+        return (domain,)
+    return tuple(domain)
+
+
+def files_signature(paths):
+    """
+        Returns the modification time and size of the files
+    """
+    signature = []
+    for path in paths:
+        stat = os.stat(path)
+        signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def _load_legacy_descriptors(paths):
+    """
+        Returns the merged descriptors of the summary and detailed
+        descriptor files
+    """
+    with open(paths[0], "r") as f:
+        all_descriptors = json.load(f)
+    with open(paths[1], "r") as f:
+        detailed_all_descriptors = json.load(f)
+    return merge_descriptors(all_descriptors, detailed_all_descriptors)
+
+
+def get_pipeline_registry(cache_dir=None):
+    """
+        Returns the pipeline registry of this process, reloading the
+        descriptors only if the cache files changed since the last load.
+    """
+    global _registry
+
+    cache_dir = cache_dir or BOUTIQUES_CACHE_DIR
+    snapshot_path = os.path.join(cache_dir, SNAPSHOT_FILENAME)
+    if os.path.exists(snapshot_path):
+        paths = (snapshot_path,)
+    else:
+        paths = (
+            os.path.join(cache_dir, "all_descriptors.json"),
+            os.path.join(cache_dir, "detailed_all_descriptors.json"),
+        )
+
+    signature = (cache_dir, files_signature(paths))
+    registry = _registry
+    if registry is not None and registry.signature == signature:
+        return registry
+
+    with _registry_lock:
+        if _registry is None or _registry.signature != signature:
+            if paths[0] == snapshot_path:
+                pipelines, records = read_pipeline_snapshot(snapshot_path)
+            else:
+                pipelines, records = _load_legacy_descriptors(paths), None
+            _registry = PipelineRegistry(signature, pipelines, records)
+        return _registry
@@ -5,10 +5,14 @@
 """
 import json
 import os
-from flask import render_template, request, url_for
+from flask import abort, current_app, render_template, request, url_for
 from flask_login import current_user
+from app.caching import conditional_json
 from app.pipelines import pipelines_bp, pipelines as pipelines_utils
-from app.models import ArkId
+from app.pipelines.listing import (
+    get_cbrain_urls, get_pipeline_listing, parse_sort_keys)
+from app.pipelines.registry import get_pipeline_registry
+from app.services.ark_ids import get_ark_id_map
 
 
 @pipelines_bp.route('/pipelines', methods=['GET'])
@@ -49,7 +53,20 @@ def pipelines():
                            filters=filters)
 
 
+def _pipeline_listing():
+    """
+        Returns the listing of the current pipeline snapshot
+    """
+    return get_pipeline_listing(
+        get_pipeline_registry(),
+        os.path.join(current_app.static_folder, "pipelines"),
+        (url_for('static', filename="img/run_on_cbrain_gray.png"),
+         url_for('static', filename="img/run_on_cbrain_green.png")),
+    )
+
+
 @pipelines_bp.route('/pipeline-search', methods=['GET'])
+@conditional_json()
 def pipeline_search():
     """ Pipeline Search Route
 
@@ -77,105 +94,44 @@ def pipeline_search():
 
     page = int(request.args.get("page") or 1)
 
-    elements = pipelines_utils.get_pipelines_from_cache(search_query)
-
-    # filter out the deprecated pipelines
-    elements = list(
-        filter(lambda e: (not e.get("DEPRECATED", None)), elements))
-
-    if request.args.get('cbrain'):
-        with open(os.path.join(os.getcwd(), "app/static/pipelines/cbrain-conp-pipeline.json"), "r") as f:
-            zenodo_urls = json.load(f)
-        print(zenodo_urls.keys())
-        elements = list(
-            filter(lambda e: e["ID"] in zenodo_urls.keys(), elements)
-        )
-
-    blocked_pipelines_ids = list()
-    with open(os.path.join(os.getcwd(), "app/static/pipelines/block-list-pipeline.json"), "r") as f:
-        blocked_pipelines_ids = json.load(f)
-    blocked_pipelines_indexes = list()
-    for index, element in enumerate(elements):
-        if element['ID'] in blocked_pipelines_ids:
-            blocked_pipelines_indexes += [index]
-        ark_id_row = ArkId.query.filter_by(pipeline_id=element['ID']).first()
-        element['ark_id'] = 'https://n2t.net/' + ark_id_row.ark_id
-    for index in reversed(blocked_pipelines_indexes):
-        elements.pop(index)
+    # listing records, keys are lowercase and without hyphens or spaces
+    listing = _pipeline_listing()
+    positions = listing.positions(
+        search_query, cbrain=bool(request.args.get('cbrain')))
 
     # filter by tags
-    if len(tags) > 0:
-        elements = list(
-            filter(lambda e: ("tags" in e and "domain" in e["tags"]), elements))
-        elements = list(filter(lambda e: all(
-            t in e["tags"]["domain"] for t in tags), elements))
-
-    # sort, make all keys lowercase and without hyphens or spaces
-    elements = [{k.lower().replace("-", "").replace(" ", ""): v for k, v in element.items()}
-                for element in elements]
-
-    if sort_key == 'conpStatus':
-        sort_key = 'downloads-desc'
-
-    real_key = sort_key
-    if sort_key.endswith("-desc"):
-        real_key = sort_key[:-5]
-    elif sort_key.endswith("-asc"):
-        real_key = sort_key[:-4]
-    reverse = sort_key.endswith("-desc")
-
-    if real_key == 'title':
-        elements.sort(
-            key=lambda x: (x[real_key] is None, x[real_key].lower()),
-            reverse=reverse
-        )
-    else:
-        elements.sort(
-            key=lambda x: (x[real_key] is None, x[real_key]),
-            reverse=reverse
-        )
+    selected = listing.select_tags(positions, tags)
+    tag_counts = listing.tag_counts(positions, selected)
 
-    # extract the appropriate page
-    elements_on_page = elements
-    if max_per_page is not None:
-        if len(elements) > max_per_page:
-            start_index = (page - 1) * max_per_page
-            end_index = start_index + max_per_page
-            if end_index > len(elements):
-                end_index = len(elements)
-            elements_on_page = elements[start_index:end_index]
-
-    # if element has online platform url, retrieve the cbrain one,
-    # else take the first one and set logo
-    # TODO right now, this handles CBRAIN and one other platform
-
-    with open(os.path.join(os.getcwd(), "app/static/pipelines/cbrain-conp-pipeline.json"), "r") as f:
-        zenodo_urls = json.load(f)
-
-    for element in elements_on_page:
-        element["platforms"] = [{} for x in range(0, 1)]
-        element["platforms"][0]["img"] = url_for(
-            'static', filename="img/run_on_cbrain_gray.png")
-        element["platforms"][0]["uri"] = ""
+    ordered_positions = listing.sort(
+        positions, selected, parse_sort_keys(sort_key))
 
-        if element["id"] in zenodo_urls.keys():
-            element["platforms"][0]["img"] = url_for(
-                'static', filename="img/run_on_cbrain_green.png")
-            element["platforms"][0]["uri"] = zenodo_urls[element["id"]]
-        else:
-            element["platforms"][0]["img"] = url_for(
-                'static', filename="img/run_on_cbrain_gray.png")
-            element["platforms"][0]["uri"] = ""
+    # extract the appropriate page
+    positions_on_page = ordered_positions
+    if max_per_page is not None and len(ordered_positions) > max_per_page:
+        start_index = (page - 1) * max_per_page
+        positions_on_page = ordered_positions[start_index:start_index + max_per_page]
+    elements_on_page = [listing.records[p] for p in positions_on_page]
+
+    ark_id_map = get_ark_id_map()
+    elements_on_page = [
+        dict(element, ark_id=ark_id_map.pipeline_ark_url(element['id']))
+        for element in elements_on_page
+    ]
 
     # construct payload
     payload = {
         "authorized": authorized,
-        "total": len(elements),
+        "total": len(ordered_positions),
         "sortKeys": [
             {
                 "key": "downloads-desc",
                 "label": "Downloads (High to Low)"
             },
+            {
+                "key": "relevance",
+                "label": "Search Relevance"
+            },
             {
                 "key": "downloads-asc",
                 "label": "Downloads (Low to High)"
@@ -197,6 +153,13 @@ def pipeline_search():
                 "label": "Pipeline ID (Descending)"
             }
         ],
+        "filterKeys": [
+            {
+                "key": "tags",
+                "values": list(tag_counts),
+                "counts": tag_counts
+            }
+        ],
         "elements": elements_on_page
     }
 
@@ -234,36 +197,21 @@ def pipeline_info():
 
     pipeline_id = request.args.get('id')
 
-    pipelines = pipelines_utils.get_pipelines_from_cache()
-
-    element = list(filter(lambda e: e['ID'] == pipeline_id, pipelines))[0]
+    element = pipelines_utils.get_pipeline_record(pipeline_id)
+    if element is None:
+        abort(404)
 
-    # make all keys lowercase
-    element = {k.lower(): v for k, v in element.items()}
-
-    element["platforms"] = [{} for x in range(0, 1)]
-    element["platforms"][0]["img"] = url_for(
-        'static', filename="img/run_on_cbrain_gray.png")
-    element["platforms"][0]["uri"] = ""
-
-    with open(os.path.join(os.getcwd(), "app/static/pipelines/cbrain-conp-pipeline.json"), "r") as f:
-        zenodo_urls = json.load(f)
-
-    if element["id"] in zenodo_urls.keys():
-        element["platforms"][0]["img"] = url_for(
-            'static', filename="img/run_on_cbrain_green.png")
-        element["platforms"][0]["uri"] = zenodo_urls[element["id"]]
-    else:
-        element["platforms"][0]["img"] = url_for(
-            'static', filename="img/run_on_cbrain_gray.png")
-        element["platforms"][0]["uri"] = ""
+    # TODO right now, this handles CBRAIN and one other platform
+    cbrain_url = get_cbrain_urls(
+        os.path.join(current_app.static_folder, "pipelines")).get(element["id"])
+    element["platforms"] = [{
+        "img": url_for('static', filename="img/run_on_cbrain_green.png"
+                       if cbrain_url else "img/run_on_cbrain_gray.png"),
+        "uri": cbrain_url or "",
+    }]
 
     # get pipeline ARK ID
-    ark_id_row = ArkId.query.filter_by(pipeline_id=element['id']).first()
-    element['ark_id'] = 'https://n2t.net/' + ark_id_row.ark_id
-
-    # make all keys lowercase and without spaces
-    element = {k.lower().replace(" ", ""): v for k, v in element.items()}
+    element['ark_id'] = get_ark_id_map().pipeline_ark_url(element['id'])
 
     return render_template(
         'pipeline.html',
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""Pipeline Search Index Module
+
+Inverted index of the pipeline descriptors used by /pipeline-search.
+The text of the title, tool name, tags, container image and description
+of each descriptor is normalized into lowercase alphanumeric tokens.
+Every word of a query has to match a token or the beginning of one, and
+the pipelines are ranked by the weight of the fields they matched in.
+"""
+import re
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict
+
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# field -> weight in the ranking
+SEARCH_FIELDS = OrderedDict([
+    ("title", 4.0),
+    ("name", 3.0),
+    ("tags", 2.0),
+    ("container", 1.5),
+    ("description", 1.0),
+])
+
+# matching only the beginning of a token counts for less than a full match
+PREFIX_MATCH_FACTOR = 0.5
+
+
+def tokenize(text):
+    """
+        Returns the normalized tokens of a text
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def _flatten(value):
+    """
+        Returns the text of a descriptor value (string, list or dict)
+    """
+    if value is None or isinstance(value, bool):
+        return ""
+    if isinstance(value, dict):
+        return " ".join(
+            "{} {}".format(k, _flatten(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return " ".join(_flatten(v) for v in value)
+    return str(value)
+
+
+def pipeline_search_fields(pipeline):
+    """
+        Returns the text of each search field of a merged descriptor
+    """
+    return {
+        "title": _flatten(pipeline.get("TITLE")),
+        "name": _flatten(pipeline.get("name")),
+        "tags": _flatten(pipeline.get("tags")),
+        "container": _flatten(pipeline.get("container-image")),
+        "description": " ".join([
+            _flatten(pipeline.get("DESCRIPTION")),
+            _flatten(pipeline.get("description")),
+        ]),
+    }
+
+
+class PipelineSearchIndex(object):
+    """
+        Token -> {pipeline position: weight} for a list of descriptors
+    """
+
+    def __init__(self, pipelines):
+        postings = defaultdict(lambda: defaultdict(float))
+        for position, pipeline in enumerate(pipelines):
+            for field, text in pipeline_search_fields(pipeline).items():
+                for token in set(tokenize(text)):
+                    postings[token][position] += SEARCH_FIELDS[field]
+
+        self.postings = dict((t, dict(p)) for t, p in postings.items())
+        self.tokens = sorted(self.postings)
+
+    def _match(self, word):
+        """
+            Returns the weight of each pipeline matching a query word
+        """
+        scores = defaultdict(float)
+        start = bisect_left(self.tokens, word)
+        for token in self.tokens[start:]:
+            if not token.startswith(word):
+                break
+            factor = 1.0 if token == word else PREFIX_MATCH_FACTOR
+            for position, weight in self.postings[token].items():
+                scores[position] = max(scores[position], weight * factor)
+        return scores
+
+    def search(self, query):
+        """
+            Returns the positions of the pipelines matching every word of
+            the query, best match first, or None if the query has no word
+        """
+        words = tokenize(query)
+        if not words:
+            return None
+
+        scores = None
+        for word in words:
+            word_scores = self._match(word)
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = dict(
+                    (position, score + word_scores[position])
+                    for position, score in scores.items()
+                    if position in word_scores
+                )
+            if not scores:
+                return []
+
+        # ties keep the order of the registry (most downloaded first)
+        return sorted(scores, key=lambda position: (-scores[position], position))
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""Pipeline Snapshot Module
+
+Module that stores the result of a pipeline refresh in a single versioned
+msgpack file. The snapshot is written to a temporary file that is moved
+over the previous one with os.replace, so readers never see a partially
+written snapshot.
+
+The snapshot contains the merged descriptors (Zenodo summary and Boutiques
+descriptor) and their listing records, whose keys are lowercase without
+hyphens or spaces as expected by the pipelines page.
+
+Each pipeline is also written to its own small shard file, keyed by its
+Zenodo id, holding the record shown on the page of the pipeline.
+"""
+import os
+import re
+from datetime import datetime
+
+import msgpack
+
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_FILENAME = "pipelines.msgpack"
+SHARDS_DIRNAME = "pipelines"
+SHARD_EXTENSION = ".msgpack"
+
+PIPELINE_ID_PATTERN = re.compile(r"zenodo\.[0-9]+")
+
+
+def listing_key(key):
+    """
+        Returns the key of a descriptor field in the listing records
+    """
+    return key.lower().replace("-", "").replace(" ", "")
+
+
+def listing_record(pipeline):
+    """
+        Returns the listing record of a merged descriptor
+    """
+    return dict((listing_key(k), v) for k, v in pipeline.items())
+
+
+def page_record(pipeline):
+    """
+        Returns the record of a merged descriptor shown on its page, keys
+        are lowercase without spaces
+    """
+    return dict((k.lower().replace(" ", ""), v) for k, v in pipeline.items())
+
+
+def merge_descriptors(all_descriptors, detailed_all_descriptors):
+    """
+        Returns the Zenodo summaries merged with their Boutiques descriptor
+    """
+    return [
+        {**descriptor, **detailed_all_descriptors[d_index]}
+        for d_index, descriptor in enumerate(all_descriptors)
+    ]
+
+
+def write_pipeline_snapshot(path, pipelines):
+    """
+        Atomically replaces the pipeline snapshot
+
+        Args:
+            path: path of the snapshot file
+            pipelines: list of merged descriptors
+
+        Returns:
+            the number of pipelines in the snapshot
+    """
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "generated": datetime.utcnow().isoformat(),
+        "pipelines": pipelines,
+        "records": [listing_record(p) for p in pipelines],
+    }
+
+    snapshot_dir = os.path.dirname(path)
+    if snapshot_dir and not os.path.exists(snapshot_dir):
+        os.makedirs(snapshot_dir)
+
+    _write_atomically(path, snapshot)
+
+    return len(pipelines)
+
+
+def _write_atomically(path, content):
+    """
+        Writes the msgpack encoding of the content to a temporary file
+        and moves it to the path
+    """
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, "wb") as f:
+        f.write(msgpack.packb(content, use_bin_type=True))
+    os.replace(tmp_path, path)
+
+
+def read_pipeline_snapshot(path):
+    """
+        Reads the pipeline snapshot
+
+        Args:
+            path: path of the snapshot file
+
+        Returns:
+            (merged descriptors, listing records)
+    """
+    with open(path, "rb") as f:
+        snapshot = msgpack.unpackb(f.read(), raw=False)
+
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        raise ValueError("Unsupported pipeline snapshot version {} in {}".format(
+            snapshot.get("version"), path))
+
+    return snapshot["pipelines"], snapshot["records"]
+
+
+def _shard_path(shard_dir, pipeline_id):
+    return os.path.join(shard_dir, pipeline_id + SHARD_EXTENSION)
+
+
+def write_pipeline_shards(shard_dir, pipelines):
+    """
+        Writes the page record of every pipeline to its shard file and
+        removes the shards of the pipelines no longer in the snapshot
+
+        Args:
+            shard_dir: directory of the shard files
+            pipelines: list of merged descriptors
+
+        Returns:
+            the number of shards written
+    """
+    if not os.path.exists(shard_dir):
+        os.makedirs(shard_dir)
+
+    shard_names = set()
+    for pipeline in pipelines:
+        if not PIPELINE_ID_PATTERN.fullmatch(pipeline["ID"]):
+            continue
+        _write_atomically(_shard_path(shard_dir, pipeline["ID"]),
+                          page_record(pipeline))
+        shard_names.add(pipeline["ID"] + SHARD_EXTENSION)
+
+    for name in os.listdir(shard_dir):
+        if name.endswith(SHARD_EXTENSION) and name not in shard_names:
+            os.remove(os.path.join(shard_dir, name))
+
+    return len(shard_names)
+
+
+def read_pipeline_shard(shard_dir, pipeline_id):
+    """
+        Reads the page record of a pipeline
+
+        Args:
+            shard_dir: directory of the shard files
+            pipeline_id: Zenodo id of the pipeline, e.g. "zenodo.1234"
+
+        Returns:
+            the page record, None if there is no such pipeline
+    """
+    if not pipeline_id or not PIPELINE_ID_PATTERN.fullmatch(pipeline_id):
+        return None
+
+    try:
+        with open(_shard_path(shard_dir, pipeline_id), "rb") as f:
+            return msgpack.unpackb(f.read(), raw=False)
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""Zenodo Pipeline Refresh Module
+
+Functions used by UpdatePipelineData to refresh the Boutiques descriptors
+published on Zenodo. The search results are paginated instead of being
+capped, and only the descriptors whose Zenodo id or version changed since
+the previous refresh are pulled, with a bounded pool of worker threads.
+"""
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+
+import requests
+from boutiques.puller import Puller
+from boutiques.searcher import Searcher
+
+
+ZENODO_SEARCH_URL = "https://zenodo.org/api/records/"
+ZENODO_SEARCH_QUERY = (
+    "keywords:(/Boutiques/) AND "
+    "keywords:(/schema.*/) AND keywords:(/version.*/)"
+)
+ZENODO_PAGE_SIZE = 100
+PULL_MAX_WORKERS = 8
+
+# fields of the descriptor summaries, merged with the Boutiques descriptors
+SUMMARY_FIELDS = (
+    "ID", "TITLE", "DESCRIPTION", "PUBLICATION DATE", "DEPRECATED",
+    "DOWNLOADS", "AUTHOR", "VERSION", "DOI", "SCHEMA VERSION", "CONTAINER",
+    "TAGS",
+)
+
+
+def _descriptor_summary(searcher, hit):
+    """
+        Returns the summary of a Zenodo hit, with the fields of the
+        verbose Boutiques search results
+    """
+    (zid, title, description, downloads) = searcher.parse_basic_info(hit)
+    keyword_data = searcher.get_keyword_data(hit["metadata"]["keywords"])
+    return {
+        "ID": zid,
+        "TITLE": title,
+        "DESCRIPTION": description,
+        "PUBLICATION DATE": hit["metadata"]["publication_date"],
+        "DEPRECATED": "deprecated" in keyword_data["other"],
+        "DOWNLOADS": downloads,
+        "AUTHOR": hit["metadata"]["creators"][0]["name"],
+        "VERSION": hit["metadata"].get("version", "unknown"),
+        "DOI": hit["doi"],
+        "SCHEMA VERSION": keyword_data.get("schema-version"),
+        "CONTAINER": keyword_data["container-type"],
+        "TAGS": ",".join(keyword_data["other"]),
+    }
+
+
+def search_descriptors(page_size=ZENODO_PAGE_SIZE, session=None):
+    """
+        Searches Zenodo for every Boutiques descriptor, one page at a time
+
+        Args:
+            page_size: number of records requested per page
+            session: requests session to reuse, a new one by default
+
+        Returns:
+            list of descriptor summaries, most downloaded first
+    """
+    session = session or requests.Session()
+    searcher = Searcher(query=None, no_trunc=True)
+
+    summaries = []
+    page = 1
+    while True:
+        r = session.get(ZENODO_SEARCH_URL, params={
+            "q": ZENODO_SEARCH_QUERY,
+            "file_type": "json",
+            "type": "software",
+            "page": page,
+            "size": page_size,
+        })
+        r.raise_for_status()
+        hits = r.json()["hits"]
+        summaries.extend(_descriptor_summary(searcher, h) for h in hits["hits"])
+
+        total = hits["total"]
+        if isinstance(total, dict):
+            total = total.get("value", 0)
+        if not hits["hits"] or page * page_size >= total:
+            break
+        page += 1
+
+    return sorted(summaries, key=itemgetter("DOWNLOADS"), reverse=True)
+
+
+def _version_key(summary):
+    return summary["ID"], summary.get("VERSION"), summary.get("DOI")
+
+
+def previous_descriptors(pipelines):
+    """
+        Returns the Boutiques descriptors of the previous refresh, keyed on
+        the Zenodo id, version and DOI of their summary
+
+        Args:
+            pipelines: merged descriptors of the previous pipeline snapshot
+    """
+    return dict(
+        (_version_key(pipeline), dict(
+            (k, v) for k, v in pipeline.items() if k not in SUMMARY_FIELDS))
+        for pipeline in pipelines
+    )
+
+
+def _pull_descriptor(zid):
+    """
+        Downloads a descriptor from Zenodo (or the Boutiques cache) and
+        returns its content
+    """
+    files = Puller([zid]).pull()
+    with open(files[0], "r") as f:
+        return json.load(f)
+
+
+def _pull_new_version(zid, cached_file):
+    """
+        Pulls the new version of a descriptor pulled before, the cached
+        file of the previous version is only deleted once the pull succeeds
+    """
+    # the Puller returns its cached file whenever one exists
+    previous_file = cached_file + ".previous"
+    if os.path.exists(cached_file):
+        os.replace(cached_file, previous_file)
+    try:
+        descriptor = _pull_descriptor(zid)
+    except Exception:
+        if os.path.exists(previous_file):
+            os.replace(previous_file, cached_file)
+        raise
+    if os.path.exists(previous_file):
+        os.remove(previous_file)
+    return descriptor
+
+
+def pull_descriptors(summaries, previous, cache_dir,
+                     max_workers=PULL_MAX_WORKERS):
+    """
+        Returns the detailed descriptor of every summary, reusing those of
+        the previous refresh and pulling the others concurrently
+
+        A descriptor whose new version cannot be pulled keeps its previous
+        version, with the version and DOI of the previous summary so the
+        next refresh tries again. A new descriptor that cannot be pulled is
+        left out.
+
+        Args:
+            summaries: descriptor summaries returned by search_descriptors
+            previous: detailed descriptors returned by previous_descriptors
+            cache_dir: Boutiques cache directory used by the Puller
+            max_workers: maximum number of concurrent pulls
+
+        Returns:
+            (summaries, detailed descriptors) of the descriptors available,
+            in the same order
+    """
+    changed = [s["ID"] for s in summaries if _version_key(s) not in previous]
+    previous_by_id = dict((key[0], key) for key in previous)
+
+    pulled = {}
+    if changed:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            for zid in changed:
+                if zid in previous_by_id:
+                    cached_file = os.path.join(
+                        cache_dir, "zenodo-{}.json".format(zid.split(".", 1)[1]))
+                    futures[zid] = executor.submit(
+                        _pull_new_version, zid, cached_file)
+                else:
+                    futures[zid] = executor.submit(_pull_descriptor, zid)
+        for zid, future in futures.items():
+            try:
+                pulled[zid] = future.result()
+            except Exception as e:
+                logging.exception(
+                    "Could not pull the descriptor {0}: {1}".format(zid, e))
+
+    available_summaries = []
+    detailed_descriptors = []
+    for summary in summaries:
+        key = _version_key(summary)
+        descriptor = previous.get(key, pulled.get(summary["ID"]))
+        if descriptor is None and summary["ID"] in previous_by_id:
+            key = previous_by_id[summary["ID"]]
+            summary = dict(summary, VERSION=key[1], DOI=key[2])
+            descriptor = previous[key]
+        if descriptor is None:
+            continue
+        available_summaries.append(summary)
+        detailed_descriptors.append(descriptor)
+
+    return available_summaries, detailed_descriptors
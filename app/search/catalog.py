@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""Dataset Catalog Module
+
+Module that keeps an in-memory catalog of the dataset records served by
+the /dataset-search endpoint so that search requests do not have to
+re-parse every DATS.json file.
+"""
+import json
+import os
+import threading
+from collections import namedtuple
+
+from sqlalchemy import func
+
+from app import db
+from app.models import Dataset
+from app.search.facets import DatasetFacetIndex
+from app.search.models import DATSDataset
+from app.search.planner import build_projection, build_sort_ranks
+from app.services.ark_ids import get_ark_id_map
+
+
+CBRAIN_DATASET_IDS_PATH = "app/static/datasets/dataset-cbrain-ids.json"
+
+
+DatasetEntry = namedtuple(
+    'DatasetEntry', ['record', 'projection', 'name', 'search_text'])
+
+
+class DatasetCatalog(object):
+    """
+        Precomputed dataset records for one state of the datasets table.
+
+        The catalog is identified by a signature derived from the datasets
+        and ARK identifiers tables. It only needs to be rebuilt when
+        `flask update_datasets` (or `generate_missing_ark_ids`) changes one
+        of those tables.
+    """
+
+    def __init__(self, signature, entries):
+        self.signature = signature
+        self.entries = entries
+        self.by_id = dict((e.record["id"], e) for e in entries)
+        self.facets = DatasetFacetIndex(e.record for e in entries)
+        self.sort_ranks = build_sort_ranks(entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, dataset_id):
+        return self.by_id.get(dataset_id)
+
+    def search(self, search_term, search_index=None):
+        """
+            Returns the entries matching the search term, best match first
+
+            Args:
+                search_term: the raw search term
+                search_index: the DatasetSearchIndex to query, if any
+
+            Returns:
+                list of DatasetEntry
+        """
+        scores = None
+        if search_index is not None and search_index.exists():
+            scores = search_index.search(search_term)
+
+        search_term = search_term.lower()
+        if scores is None:
+            return [e for e in self.entries if search_term in e.search_text]
+
+        matches = [self.by_id[i] for i in scores if i in self.by_id]
+
+        # datasets added since the index was last written are not lost,
+        # they are matched on their DATS.json content instead
+        indexed_ids = search_index.indexed_ids()
+        matches += [
+            e for e in self.entries
+            if e.record["id"] not in indexed_ids and search_term in e.search_text
+        ]
+
+        return matches
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_dataset_catalog():
+    """
+        Returns the dataset catalog of this process, rebuilding it
+        only if the datasets table changed since it was last built.
+    """
+    global _catalog
+
+    signature = _catalog_signature()
+    catalog = _catalog
+    if catalog is not None and catalog.signature == signature:
+        return catalog
+
+    with _catalog_lock:
+        if _catalog is None or _catalog.signature != signature:
+            _catalog = build_dataset_catalog(signature)
+        return _catalog
+
+
+def invalidate_dataset_catalog():
+    """
+        Drops the catalog of this process so that it is rebuilt on next use
+    """
+    global _catalog
+    with _catalog_lock:
+        _catalog = None
+
+
+def _catalog_signature():
+    """
+        Cheap fingerprint of the tables the catalog is built from
+    """
+    count, max_id, last_update = db.session.query(
+        func.count(Dataset.id),
+        func.max(Dataset.id),
+        func.max(Dataset.date_updated)
+    ).one()
+
+    return (count, max_id, str(last_update)) + get_ark_id_map().signature
+
+
+def build_dataset_catalog(signature=None):
+    """
+        Builds the catalog entries for every dataset of the database
+
+        Args:
+            signature: signature of the database state the catalog is built from
+
+        Returns:
+            a DatasetCatalog
+    """
+    if signature is None:
+        signature = _catalog_signature()
+
+    with open(os.path.join(os.getcwd(), CBRAIN_DATASET_IDS_PATH), "r") as f:
+        cbrain_dataset_ids = json.load(f)
+
+    ark_id_map = get_ark_id_map()
+
+    entries = []
+    for d in Dataset.query.order_by(Dataset.id).all():
+        try:
+            datsdataset = DATSDataset(d.fspath)
+            with open(datsdataset.DatsFilepath, 'r') as dats:
+                search_text = dats.read().lower()
+        except Exception:
+            # If the DATS file can't be laoded, skip this dataset.
+            # There should be an error message in the logs/update_datsets.log
+            continue
+
+        record = _build_record(d, datsdataset, cbrain_dataset_ids, ark_id_map)
+        entries.append(DatasetEntry(
+            record=record,
+            projection=build_projection(record, datsdataset.sizeInBytes),
+            name=datsdataset.name,
+            search_text=search_text
+        ))
+
+    return DatasetCatalog(signature, entries)
+
+
+def _build_record(d, datsdataset, cbrain_dataset_ids, ark_id_map):
+    """
+        Builds the part of a /dataset-search element that only changes
+        when the dataset is updated.
+    """
+    datasetTitle = d.name.replace("'", "")
+    dataset_cbrain_id = cbrain_dataset_ids.get(datasetTitle, "")
+
+    return {
+        # datasets without ARK identifier yet get one with
+        # `flask generate_missing_ark_ids`, do not fail the whole catalog
+        "ark_id": ark_id_map.dataset_ark_url(d.dataset_id),
+        "id": d.dataset_id,
+        "title": d.name.replace("'", "\'"),
+        "remoteUrl": d.remoteUrl,
+        "isPrivate": d.is_private,
+        "thumbnailURL": "/dataset_logo?id={}".format(d.dataset_id),
+        "downloadPath": d.dataset_id,
+        "URL": '?',
+        "dateAdded": str(d.date_created.date()),
+        "dateUpdated": str(d.date_updated.date()),
+        "creators": datsdataset.creators,
+        "origin": datsdataset.origin,
+        "size": datsdataset.size,
+        "files": datsdataset.fileCount,
+        "subjects": datsdataset.subjectCount,
+        "formats": datsdataset.formats,
+        "modalities": datsdataset.modalities,
+        "licenses": datsdataset.licenses,
+        "version": datsdataset.version,
+        "sources": datsdataset.sources,
+        "conpStatus": datsdataset.conpStatus,
+        "authorizations": datsdataset.authorizations,
+        "principalInvestigators": datsdataset.principalInvestigators,
+        "primaryPublications": datsdataset.primaryPublications,
+        "logoFilepath": datsdataset.LogoFilepath,
+        "cbrain_id": dataset_cbrain_id,
+    }
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""CI Status Module
+
+Module that keeps the snapshot of the conp-dataset CircleCI test results
+used for the status of the datasets. The snapshot is filled by
+`flask update_ci_status` or by a background refresh, web requests only
+ever read it.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+
+CIRCLECI_ARTIFACTS_URL = "https://circleci.com/api/v1.1/" \
+    + "project/github/CONP-PCNO/conp-dataset/" \
+    + "latest/artifacts" \
+    + "?branch=master&filter=completed"
+
+
+def fetch_latest_test_results():
+    """
+        Downloads the results of the latest conp-dataset test run
+
+        Returns:
+            dict of test name -> test results
+    """
+    response = requests.get(CIRCLECI_ARTIFACTS_URL, timeout=30)
+    response.raise_for_status()
+
+    previous_test_results = {}
+    for artifact in response.json():
+        artifact_response = requests.get(artifact["url"], timeout=30)
+        artifact_response.raise_for_status()
+        # Merge dictionnaries together.
+        previous_test_results = {
+            **previous_test_results,
+            **artifact_response.json(),
+        }
+
+    return previous_test_results
+
+
+def compute_dataset_statuses(test_results):
+    """
+        Summarizes test results into one status per dataset
+
+        Args:
+            test_results: dict of "<dataset name>:<test>" -> test results
+
+        Returns:
+            dict of dataset name (with "/" replaced by "_") -> status
+    """
+    tests_by_dataset = defaultdict(list)
+    for test, results in test_results.items():
+        tests_by_dataset[test.split(":", 1)[0]].append(results["status"])
+
+    statuses = {}
+    for dataset, tests_status in tests_by_dataset.items():
+        if any(map(lambda x: x == "Failure", tests_status)):
+            statuses[dataset] = "Broken"
+        elif all(map(lambda x: x == "Success", tests_status)):
+            statuses[dataset] = "Working"
+        else:
+            statuses[dataset] = "Unknown"
+
+    return statuses
+
+
+class CIStatusStore(object):
+    """
+        Snapshot of the dataset statuses stored in a JSON file
+
+        The file is replaced atomically by refresh() and only re-read by
+        get_statuses() when it changed, so every worker of the portal
+        shares the last good snapshot.
+
+        Background refreshes are attempted at most once per retry interval,
+        so a CircleCI outage is not hit by every request of a stale snapshot.
+    """
+
+    def __init__(self, snapshot_path, max_age=4 * 3600, retry_interval=15 * 60):
+        self.snapshot_path = snapshot_path
+        self.max_age = max_age
+        self.retry_interval = retry_interval
+        self._snapshot = (None, {})
+        self._refresh_thread = None
+        self._last_attempt = None
+        self._lock = threading.Lock()
+
+    def get_statuses(self):
+        """
+            Returns the dict of dataset name -> status of the snapshot
+        """
+        try:
+            mtime = os.stat(self.snapshot_path).st_mtime_ns
+        except OSError:
+            return {}
+
+        if self._snapshot[0] != mtime:
+            try:
+                with open(self.snapshot_path, "r") as f:
+                    statuses = json.load(f)["statuses"]
+            except Exception:
+                # keep serving the snapshot previously read
+                logging.exception("Can't read CI status snapshot")
+                return self._snapshot[1]
+            self._snapshot = (mtime, statuses)
+
+        return self._snapshot[1]
+
+    def get_status(self, name):
+        """
+            Returns the status of a dataset from its name
+            (path relative to the conp-dataset projects directory)
+        """
+        return self.get_statuses().get(name.replace("/", "_"), "Unknown")
+
+    def version(self):
+        """
+            Returns a value changing with every refresh of the snapshot
+        """
+        try:
+            return os.stat(self.snapshot_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def is_stale(self):
+        try:
+            age = time.time() - os.stat(self.snapshot_path).st_mtime
+        except OSError:
+            return True
+        return age > self.max_age
+
+    def refresh(self):
+        """
+            Fetches the latest test results and replaces the snapshot.
+            On failure the previous snapshot is left untouched.
+
+            Returns:
+                the number of datasets in the new snapshot
+        """
+        statuses = compute_dataset_statuses(fetch_latest_test_results())
+
+        snapshot_dir = os.path.dirname(self.snapshot_path)
+        if snapshot_dir and not os.path.exists(snapshot_dir):
+            os.makedirs(snapshot_dir)
+
+        tmp_path = "{}.{}.tmp".format(self.snapshot_path, os.getpid())
+        with open(tmp_path, "w") as f:
+            json.dump({"updated": time.time(), "statuses": statuses}, f)
+        os.replace(tmp_path, self.snapshot_path)
+
+        return len(statuses)
+
+    def refresh_in_background(self):
+        """
+            Starts a refresh in a background thread unless one is running
+            or the last one, successful or not, started less than the retry
+            interval ago
+        """
+        from app.threads import UpdateCIStatus
+
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            now = time.monotonic()
+            if self._last_attempt is not None \
+                    and now - self._last_attempt < self.retry_interval:
+                return
+            self._last_attempt = now
+            self._refresh_thread = UpdateCIStatus(self)
+            self._refresh_thread.start()
+
+
+_stores = {}
+
+
+def get_ci_status_store(app):
+    """
+        Returns the CI status store configured for the app
+    """
+    snapshot_path = app.config['CI_STATUS_PATH']
+    if snapshot_path not in _stores:
+        _stores[snapshot_path] = CIStatusStore(
+            snapshot_path, app.config['CI_STATUS_MAX_AGE'],
+            app.config['CI_STATUS_RETRY_INTERVAL'])
+    return _stores[snapshot_path]
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""Dataset Facets Module
+
+Inverted index of the /dataset-search facets (modalities, formats,
+authorizations and CBRAIN availability) built with the dataset catalog.
+Filters are applied as intersections of the sets of dataset ids of the
+selected facet values, and the number of datasets of each value is
+counted under the current selection.
+"""
+from collections import OrderedDict, defaultdict
+
+
+PROTECTED_AUTHORIZATIONS = ['private', 'registered']
+
+AUTHORIZATION_VALUES = ['Yes', 'No']
+
+
+def display_format(file_format):
+    """
+        Returns the label of a file format in the format facet, upper case
+        except for NIfTI, GIfTI, bigWig and RNA-Seq
+    """
+    lowered = file_format.lower()
+    if lowered in ['nifti', 'nii', 'niigz']:
+        return 'NIfTI'
+    elif lowered in ['gifti', 'gii']:
+        return 'GIfTI'
+    elif lowered == 'bigwig':
+        return 'bigWig'
+    elif lowered == 'rna-seq':
+        return 'RNA-Seq'
+    return file_format.upper()
+
+
+class DatasetFacetIndex(object):
+    """
+        Facet value -> set of dataset ids, for each facet of the search
+    """
+
+    def __init__(self, records):
+        self.modalities = defaultdict(set)
+        self.formats = defaultdict(set)
+        self.authorizations = dict((v, set()) for v in AUTHORIZATION_VALUES)
+        self.cbrain = set()
+
+        for record in records:
+            dataset_id = record["id"]
+            for m in record["modalities"] or []:
+                self.modalities[m.lower()].add(dataset_id)
+            for f in record["formats"] or []:
+                self.formats[display_format(f)].add(dataset_id)
+            if record["authorizations"] is not None:
+                if record["authorizations"] in PROTECTED_AUTHORIZATIONS:
+                    self.authorizations['Yes'].add(dataset_id)
+                else:
+                    self.authorizations['No'].add(dataset_id)
+            if record["cbrain_id"] != '':
+                self.cbrain.add(dataset_id)
+
+    def select(self, dataset_ids, modalities=None, formats=None,
+               authorizations=None, cbrain=False):
+        """
+            Returns the dataset ids having every selected facet value
+
+            Args:
+                dataset_ids: set of candidate dataset ids
+                modalities: list of selected modalities
+                formats: list of selected formats
+                authorizations: list of selected authorizations (Yes/No)
+                cbrain: only keep datasets available in CBRAIN
+
+            Returns:
+                set of dataset ids
+        """
+        selected = set(dataset_ids)
+        for m in modalities or []:
+            selected &= self.modalities.get(m.lower(), set())
+        for f in formats or []:
+            selected &= self.formats.get(display_format(f), set())
+        for a in authorizations or []:
+            selected &= self.authorizations.get(a, set())
+        if cbrain:
+            selected &= self.cbrain
+        return selected
+
+    def counts(self, dataset_ids, selected_ids):
+        """
+            Counts the selected datasets of each facet value
+
+            Args:
+                dataset_ids: set of candidate dataset ids, only the values
+                             of those datasets are listed
+                selected_ids: set of dataset ids matching the current filters
+
+            Returns:
+                dict of facet -> OrderedDict of value -> number of datasets
+        """
+        def facet_counts(index, values):
+            return OrderedDict(
+                (v, len(index[v] & selected_ids)) for v in values)
+
+        def present_values(index):
+            return [v for v, ids in index.items() if not ids.isdisjoint(dataset_ids)]
+
+        return {
+            "modalities": facet_counts(
+                self.modalities, sorted(present_values(self.modalities))),
+            "formats": facet_counts(
+                self.formats, sorted(present_values(self.formats), key=str.casefold)),
+            "authorizations": facet_counts(
+                self.authorizations, AUTHORIZATION_VALUES),
+        }
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""Dataset Search Index Module
+
+Module that maintains the on-disk Whoosh inverted index over the DATS
+fields of the datasets. The index is written by `flask update_datasets`
+and queried by the `search` parameter of /dataset-search.
+"""
+import os
+from collections import OrderedDict
+
+from whoosh import index as whoosh_index
+from whoosh import query as whoosh_query
+from whoosh.analysis import StandardAnalyzer
+from whoosh.fields import ID, TEXT, Schema
+from whoosh.scoring import BM25F
+
+
+ANALYZER = StandardAnalyzer()
+
+# field name -> boost applied to the matches in that field
+SEARCH_FIELDS = OrderedDict([
+    ("title", 4.0),
+    ("keywords", 3.0),
+    ("modalities", 2.0),
+    ("formats", 2.0),
+    ("isAbout", 2.0),
+    ("creators", 1.5),
+    ("description", 1.0),
+])
+
+SCHEMA = Schema(
+    dataset_id=ID(stored=True, unique=True),
+    **dict(
+        (field, TEXT(analyzer=ANALYZER, field_boost=boost))
+        for field, boost in SEARCH_FIELDS.items()
+    )
+)
+
+
+def dats_search_fields(datsdataset):
+    """
+        Extracts the text of the indexed fields from a DATSDataset
+
+        Args:
+            datsdataset: the DATSDataset to index
+
+        Returns:
+            dict of field name -> text
+    """
+    def join(values):
+        if not values:
+            return u""
+        if isinstance(values, str):
+            return values
+        return u" ".join(str(v) for v in values if v)
+
+    return {
+        "title": datsdataset.title or u"",
+        "description": datsdataset.description or u"",
+        "keywords": join(datsdataset.keywords),
+        "creators": join(datsdataset.creators),
+        "isAbout": join(datsdataset.isAbout),
+        "formats": join(datsdataset.formats),
+        "modalities": join(datsdataset.modalities),
+    }
+
+
+class DatasetSearchIndex(object):
+    """
+        Thin wrapper around the Whoosh index of the datasets
+    """
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        self._indexed_ids = (None, set())
+
+    def exists(self):
+        return whoosh_index.exists_in(self.index_dir)
+
+    def open(self):
+        return whoosh_index.open_dir(self.index_dir)
+
+    def update(self, documents):
+        """
+            Replaces the content of the index with the given documents
+
+            Args:
+                documents: dict of dataset_id -> dict of field name -> text
+        """
+        if not os.path.exists(self.index_dir):
+            os.makedirs(self.index_dir)
+
+        if self.exists():
+            ix = self.open()
+        else:
+            ix = whoosh_index.create_in(self.index_dir, SCHEMA)
+
+        writer = ix.writer()
+        try:
+            with ix.searcher() as searcher:
+                indexed_ids = set(
+                    fields['dataset_id'] for fields in searcher.all_stored_fields())
+            for dataset_id in indexed_ids - set(documents.keys()):
+                writer.delete_by_term('dataset_id', dataset_id)
+            for dataset_id, fields in documents.items():
+                writer.update_document(dataset_id=dataset_id, **fields)
+        except Exception:
+            writer.cancel()
+            raise
+        writer.commit()
+        ix.close()
+
+    def indexed_ids(self):
+        """
+            Returns the set of dataset ids present in the index, only
+            re-reading it when a new generation of the index was committed
+        """
+        if not self.exists():
+            return set()
+
+        ix = self.open()
+        try:
+            generation = ix.latest_generation()
+            if self._indexed_ids[0] != generation:
+                with ix.searcher() as searcher:
+                    self._indexed_ids = (generation, set(
+                        fields['dataset_id'] for fields in searcher.all_stored_fields()
+                    ))
+            return self._indexed_ids[1]
+        finally:
+            ix.close()
+
+    def search(self, search_term):
+        """
+            Searches the index, the last word of the search term being
+            matched as a prefix since the term comes from a search box.
+
+            Args:
+                search_term: the raw search term
+
+            Returns:
+                OrderedDict of dataset_id -> score, best match first,
+                or None if the search term has no indexable word.
+        """
+        tokens = [t.text for t in ANALYZER(search_term)]
+        if not tokens:
+            return None
+
+        clauses = []
+        for position, token in enumerate(tokens):
+            if position == len(tokens) - 1:
+                field_queries = [
+                    whoosh_query.Prefix(field, token, constantscore=False)
+                    for field in SEARCH_FIELDS
+                ]
+            else:
+                field_queries = [
+                    whoosh_query.Term(field, token) for field in SEARCH_FIELDS
+                ]
+            clauses.append(whoosh_query.Or(field_queries))
+
+        ix = self.open()
+        try:
+            with ix.searcher(weighting=BM25F()) as searcher:
+                results = searcher.search(whoosh_query.And(clauses), limit=None)
+                return OrderedDict(
+                    (hit['dataset_id'], hit.score) for hit in results
+                )
+        finally:
+            ix.close()
+
+
+_search_indexes = {}
+
+
+def get_dataset_search_index(app):
+    """
+        Returns the dataset search index configured for the app
+    """
+    index_dir = app.config['DATASET_SEARCH_INDEX_PATH']
+    if index_dir not in _search_indexes:
+        _search_indexes[index_dir] = DatasetSearchIndex(index_dir)
+    return _search_indexes[index_dir]
@@ -1,47 +1,33 @@
-import datetime as dt
-from functools import lru_cache
+import copy
+from collections import OrderedDict
 import os
 import json
-import re
+import threading
 
 import fnmatch
 from typing import Optional
 
-import dateutil
-import requests
+from flask import current_app
 
+from app.search.ci_status import get_ci_status_store
 
-@lru_cache(maxsize=1)
-def _get_latest_test_results(date):
-    url = "https://circleci.com/api/v1.1/" \
-        + "project/github/CONP-PCNO/conp-dataset/" \
-        + "latest/artifacts" \
-        + "?branch=master&filter=completed"
 
-    artifacts = requests.get(url).json()
+SIZE_UNITS = ['B', 'KB', 'MB', 'GB', 'TB', 'PB', 'EB']
 
-    previous_test_results = {}
-    for artifact in artifacts:
-        # Merge dictionnaries together.
-        previous_test_results = {
-            **previous_test_results,
-            **requests.get(artifact["url"]).json(),
-        }
 
-    return previous_test_results
+def get_dataset_status(name):
+    """
+      Returns the CI status of a dataset from its name
+      (path relative to the conp-dataset projects directory)
 
+      The status comes from the snapshot filled by `flask update_ci_status`,
+      a stale snapshot is refreshed in the background while still served.
+    """
+    store = get_ci_status_store(current_app)
+    if current_app.config['CI_STATUS_AUTO_REFRESH'] and store.is_stale():
+        store.refresh_in_background()
 
-def get_latest_test_results():
-    current_date = dt.datetime.now().astimezone(tz=dateutil.tz.UTC)
-    normalized_date = current_date.replace(
-        # Round the date to the lowest 4hour
-        hour=(current_date.hour // 4 * 4 + 1),
-        minute=0,                               # range and give an extra hour gap
-        second=0,                               # for tests execution.
-        microsecond=0
-    )
-
-    return _get_latest_test_results(normalized_date)
+    return store.get_status(name)
 
 
 class DatasetCache(object):
@@ -76,6 +62,108 @@ class DatasetCache(object):
         return cached.path if cached is not None else None
 
 
+def _first_distribution(descriptor):
+    """
+      Returns the distribution of a DATS descriptor used for its size
+    """
+    dists = descriptor.get('distributions', None)
+    if dists is None:
+        return None
+
+    if not type(dists) == list:
+        if dists.get('@type', '') == 'DatasetDistribution':
+            return dists
+        return {}
+
+    # Taking the first distribution size. (arbitrary choice)
+    return dists[0]
+
+
+def _find_dats_filepath(datasetpath):
+    dirs = os.listdir(datasetpath)
+    descriptor: Optional[str] = None
+    for file in dirs:
+        if fnmatch.fnmatch(file.lower(), 'dats.json'):
+            descriptor = os.path.join(datasetpath, file)
+            break
+
+    if not descriptor:
+        raise RuntimeError('No DATS descriptor found')
+
+    return descriptor
+
+
+class _FrozenDict(dict):
+    """
+      Read-only dict of a shared dats_field value, still a dict for the
+      JSON encoders and the templates
+    """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('DATS field values are shared and read-only')
+
+    __setitem__ = __delitem__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return _FrozenDict, (dict(self),)
+
+
+def _freeze(value):
+    """
+      Returns an immutable copy of a value derived from a DATS descriptor,
+      lists become tuples and dicts _FrozenDict
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return _FrozenDict((k, _freeze(v)) for k, v in value.items())
+    return value
+
+
+class dats_field(object):
+    """
+      Property derived from the DATS descriptor only, computed once per
+      version of the DATS.json file and shared by every DATSDataset of it.
+      The values are built immutable, lists as tuples and dicts as
+      _FrozenDict, so they are returned without being copied.
+    """
+
+    def __init__(self, fget):
+        self.fget = fget
+        self.name = fget.__name__
+        self.__doc__ = fget.__doc__
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+
+        if obj._descriptor is not None:
+            # the descriptor of this instance may have been modified
+            return self.build(obj)
+
+        return self.shared(obj._parsed.get(self.name, self.build))
+
+    def build(self, dataset):
+        return _freeze(self.fget(dataset))
+
+    def shared(self, value):
+        return value
+
+
+class dats_document(dats_field):
+    """
+      dats_field whose value is a JSON document handed out as a plain,
+      modifiable dict: the shared value is copied on every read
+    """
+
+    def build(self, dataset):
+        return self.fget(dataset)
+
+    def shared(self, value):
+        return copy.deepcopy(value)
+
+
 class DATSDataset(object):
     def __init__(self, datasetpath):
         """
@@ -85,12 +173,21 @@ class DATSDataset(object):
             raise RuntimeError('No dataset found at {}'.format(datasetpath))
 
         self.datasetpath = datasetpath
+        self._parsed = parsed_dats_registry.get(datasetpath)
+        self._descriptor = None
 
-        with open(self.DatsFilepath, 'r') as f:
-            try:
-                self.descriptor = json.load(f)
-            except Exception:
-                raise RuntimeError('Can`t parse {}'.format(self.DatsFilepath))
+    @property
+    def descriptor(self):
+        """
+          Copy of the DATS content owned by this instance, safe to modify
+        """
+        if self._descriptor is None:
+            self._descriptor = copy.deepcopy(self._parsed.descriptor)
+        return self._descriptor
+
+    @descriptor.setter
+    def descriptor(self, descriptor):
+        self._descriptor = descriptor
 
     @property
     def name(self):
@@ -98,25 +195,19 @@ class DATSDataset(object):
 
     @property
     def DatsFilepath(self):
-        dirs = os.listdir(self.datasetpath)
-        descriptor: Optional[str] = None
-        for file in dirs:
-            if fnmatch.fnmatch(file.lower(), 'dats.json'):
-                descriptor = os.path.join(self.datasetpath, file)
-                break
-
-        if not descriptor:
-            raise RuntimeError('No DATS descriptor found')
+        return self._parsed.DatsFilepath
 
-        return descriptor
+    @dats_field
+    def title(self):
+        return self.descriptor.get('title', None)
 
-    @property
+    @dats_field
     def LogoFilepath(self):
         logopath = "app/static/img/default_dataset.jpeg"
         extraprops = self.descriptor.get('extraProperties', {})
         for prop in extraprops:
             if prop.get('category') == 'logo':
-                logofilename = prop.get('values').pop().get('value', '')
+                logofilename = prop.get('values')[-1].get('value', '')
                 if not logofilename.lower().startswith("http"):
                     logofilepath = os.path.join(
                         self.datasetpath,
@@ -142,7 +233,7 @@ class DATSDataset(object):
 
         return readme
 
-    @property
+    @dats_field
     def creators(self):
         creators = []
         c = self.descriptor.get('creators', '')
@@ -162,7 +253,7 @@ class DATSDataset(object):
 
         return None
 
-    @property
+    @dats_field
     def principalInvestigators(self):
         principalInvestigators = []
         creators = self.descriptor.get('creators', '')
@@ -178,14 +269,14 @@ class DATSDataset(object):
         elif 'roles' in creators:
             for role in creators['roles']:
                 if role['value'] == 'Principal Investigator':
-                    if 'name' in x:
-                        principalInvestigators.append(x['name'])
-                    elif 'fullName' in x:
-                        principalInvestigators.append(x['fullName'])
+                    if 'name' in creators:
+                        principalInvestigators.append(creators['name'])
+                    elif 'fullName' in creators:
+                        principalInvestigators.append(creators['fullName'])
 
         return principalInvestigators if len(principalInvestigators) > 0 else None
 
-    @property
+    @dats_field
     def primaryPublications(self):
         primaryPublications = []
         publications = self.descriptor.get('primaryPublications', {})
@@ -229,7 +320,7 @@ class DATSDataset(object):
 
         return primaryPublications if len(primaryPublications) > 0 else None
 
-    @property
+    @dats_field
     def authorizations(self):
         dists = self.descriptor.get('distributions', None)
         if dists is None:
@@ -246,13 +337,13 @@ class DATSDataset(object):
         authorizations = dist.get('access', {}).get('authorizations', '')
 
         if type(authorizations) == list:
-            auth = authorizations.pop().get('value', None)
+            auth = authorizations[-1].get('value', None)
         else:
             auth = None
 
         return "{}".format(auth)
 
-    @property
+    @dats_field
     def origin(self):
         origin = None
         extraprops = self.descriptor.get('extraProperties', {})
@@ -263,7 +354,7 @@ class DATSDataset(object):
 
         return origin
 
-    @property
+    @dats_field
     def contacts(self):
         contacts = None
         extraprops = self.descriptor.get('extraProperties', {})
@@ -273,7 +364,7 @@ class DATSDataset(object):
 
         return contacts
 
-    @property
+    @dats_field
     def conpStatus(self):
         conpStatus = 'external'
         extraprops = self.descriptor.get('extraProperties', {})
@@ -283,11 +374,11 @@ class DATSDataset(object):
 
         return conpStatus
 
-    @property
+    @dats_field
     def description(self):
         return self.descriptor.get('description', None)
 
-    @property
+    @dats_field
     def fileCount(self):
         count = 0
         extraprops = self.descriptor.get('extraProperties', {})
@@ -301,7 +392,7 @@ class DATSDataset(object):
 
         return count if count > 0 else None
 
-    @property
+    @dats_field
     def formats(self):
         formats = []
         dists = self.descriptor.get('distributions', None)
@@ -313,7 +404,7 @@ class DATSDataset(object):
 
         return formats
 
-    @ property
+    @dats_field
     def licenses(self):
         licenses = []
         lics = self.descriptor.get('licenses', None)
@@ -332,7 +423,7 @@ class DATSDataset(object):
 
         return licenses
 
-    @ property
+    @dats_field
     def modalities(self):
         modalities = []
         for t in self.descriptor.get('types', []):
@@ -343,7 +434,7 @@ class DATSDataset(object):
 
         return modalities if len(modalities) > 0 else None
 
-    @ property
+    @dats_field
     def keywords(self):
         keywords = []
         for t in self.descriptor.get('keywords', []):
@@ -353,27 +444,18 @@ class DATSDataset(object):
 
         return keywords if len(keywords) > 0 else None
 
-    @ property
+    @dats_field
     def size(self):
-        dists = self.descriptor.get('distributions', None)
-        if dists is None:
+        dist = _first_distribution(self.descriptor)
+        if dist is None:
             return None
 
-        if not type(dists) == list:
-            if dists.get('@type', '') == 'DatasetDistribution':
-                dist = dists
-            else:
-                dist = {}
-        else:
-            # Taking the first distribution size. (arbitrary choice)
-            dist = dists[0]
-
         size = float(dist.get('size', 0))
         unit = dist.get('unit', {}).get('value', '')
 
         # Some data values from the DATS are not user friendly so
         # If size > 1000, divide n times until it is < 1000 and increment the units from the array
-        units = ['B', 'KB', 'MB', 'GB', 'TB', 'PB', 'EB']
+        units = SIZE_UNITS
         count = 0
 
         while size > 1000:
@@ -385,7 +467,25 @@ class DATSDataset(object):
 
         return "{} {}".format(size, unit)
 
-    @ property
+    @dats_field
+    def sizeInBytes(self):
+        """
+          Size of the first distribution in bytes, used to sort datasets
+        """
+        dist = _first_distribution(self.descriptor)
+        if dist is None:
+            return None
+
+        unit = dist.get('unit', {}).get('value', '')
+        if unit not in SIZE_UNITS:
+            return None
+
+        try:
+            return float(dist.get('size', 0)) * 1000 ** SIZE_UNITS.index(unit)
+        except (TypeError, ValueError):
+            return None
+
+    @dats_field
     def sources(self):
         dists = self.descriptor.get('distributions', None)
         if dists is None:
@@ -403,7 +503,7 @@ class DATSDataset(object):
 
         return "{}".format(sources)
 
-    @ property
+    @dats_field
     def dimensions(self):
         dimensions = []
         for t in self.descriptor.get('dimensions', []):
@@ -414,7 +514,7 @@ class DATSDataset(object):
 
         return dimensions if len(dimensions) > 0 else None
 
-    @ property
+    @dats_field
     def isAbout(self):
         isAbout = []
         for t in self.descriptor.get('isAbout', []):
@@ -424,7 +524,7 @@ class DATSDataset(object):
 
         return isAbout if len(isAbout) > 0 else None
 
-    @ property
+    @dats_field
     def spatialCoverage(self):
         spatialCoverage = []
         for t in self.descriptor.get('spatialCoverage', []):
@@ -434,7 +534,7 @@ class DATSDataset(object):
 
         return spatialCoverage if len(spatialCoverage) > 0 else None
 
-    @ property
+    @dats_field
     def acknowledges(self):
         acknowledges = []
         for t in self.descriptor.get('acknowledges', []):
@@ -446,7 +546,7 @@ class DATSDataset(object):
 
         return acknowledges if len(acknowledges) > 0 else None
 
-    @ property
+    @dats_field
     def producedBy(self):
         producedBy = []
         field_data = self.descriptor.get('producedBy', None)
@@ -461,7 +561,7 @@ class DATSDataset(object):
 
         return producedBy if len(producedBy) > 0 else None
 
-    @ property
+    @dats_field
     def subjectCount(self):
         count = 0
         extraprops = self.descriptor.get('extraProperties', {})
@@ -475,7 +575,7 @@ class DATSDataset(object):
 
         return count if count > 0 else None
 
-    @ property
+    @dats_field
     def derivedFrom(self):
         derivedFrom = []
         extraprops = self.descriptor.get('extraProperties', {})
@@ -486,7 +586,7 @@ class DATSDataset(object):
 
         return derivedFrom if len(derivedFrom) > 0 else None
 
-    @ property
+    @dats_field
     def parentDatasetId(self):
         parentDatasetId = []
         extraprops = self.descriptor.get('extraProperties', {})
@@ -498,11 +598,11 @@ class DATSDataset(object):
 
         return parentDatasetId if len(parentDatasetId) > 0 else None
 
-    @ property
+    @dats_field
     def version(self):
         return self.descriptor.get('version', None)
 
-    @property
+    @dats_field
     def dates(self):
         dates = {}
         for prop in self.descriptor.get('dates', {}):
@@ -512,7 +612,7 @@ class DATSDataset(object):
 
         return dates if len(dates) > 0 else None
 
-    @ property
+    @dats_document
     def schema_org_metadata(self):
         """ Returns json-ld metadata snippet for Google dataset search. """
         try:
@@ -582,20 +682,97 @@ class DATSDataset(object):
 
     @ property
     def status(self):
+        return get_dataset_status(self.name)
+
+
+class ParsedDATS(object):
+    """
+      Parsed content of one version of a DATS.json file along with the
+      values of the DATSDataset fields derived from it. Fields are
+      computed on first use and never change afterwards.
+    """
+    __slots__ = ('DatsFilepath', 'descriptor') + tuple(
+        name for name, attr in vars(DATSDataset).items()
+        if isinstance(attr, dats_field)
+    )
+
+    def __init__(self, dats_filepath):
+        self.DatsFilepath = dats_filepath
+        with open(dats_filepath, 'r') as f:
+            try:
+                self.descriptor = json.load(f)
+            except Exception:
+                raise RuntimeError('Can`t parse {}'.format(dats_filepath))
+
+    def get(self, name, compute):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            value = compute(_ParsedDATSView(self))
+            setattr(self, name, value)
+            return value
+
+
+class _ParsedDATSView(object):
+    """
+      Minimal DATSDataset stand-in used to compute the dats_field
+      values from the shared, read-only descriptor.
+    """
+    __slots__ = ('descriptor', 'datasetpath')
+
+    def __init__(self, parsed):
+        self.descriptor = parsed.descriptor
+        self.datasetpath = os.path.dirname(parsed.DatsFilepath)
+
+
+class ParsedDATSRegistry(object):
+    """
+      Process-wide LRU registry of ParsedDATS keyed by
+      (DATS.json path, mtime, size) so that a DATS.json file is
+      parsed once per version no matter how many DATSDataset use it.
+    """
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._parsed = OrderedDict()
+        self._dats_filepaths = {}
+        self._lock = threading.Lock()
+
+    def get(self, datasetpath):
+        dats_filepath = self._dats_filepaths.get(datasetpath)
+        try:
+            stat = os.stat(dats_filepath) if dats_filepath else None
+        except OSError:
+            stat = None
+
+        if stat is None:
+            dats_filepath = _find_dats_filepath(datasetpath)
+            stat = os.stat(dats_filepath)
+            self._dats_filepaths[datasetpath] = dats_filepath
+
+        key = (dats_filepath, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            parsed = self._parsed.get(key)
+            if parsed is not None:
+                self._parsed.move_to_end(key)
+                return parsed
+
+        parsed = ParsedDATS(dats_filepath)
+
+        with self._lock:
+            # forget the previous versions of the file
+            for old_key in [k for k in self._parsed if k[0] == dats_filepath]:
+                del self._parsed[old_key]
+            self._parsed[key] = parsed
+            while len(self._parsed) > self.maxsize:
+                self._parsed.popitem(last=False)
+
+        return parsed
+
+    def clear(self):
+        with self._lock:
+            self._parsed.clear()
+            self._dats_filepaths.clear()
+
 
-        test_results = get_latest_test_results()
-        tests_status = [
-            results["status"]
-            for test, results in test_results.items()
-            if test.startswith(re.sub("/", "_", self.name) + ":")
-        ]
-
-        if tests_status == []:
-            # Problem occured during the test suite.
-            return "Unknown"
-        if any(map(lambda x: x == "Failure", tests_status)):
-            return "Broken"
-        if all(map(lambda x: x == "Success", tests_status)):
-            return "Working"
-
-        return "Unknown"
+parsed_dats_registry = ParsedDATSRegistry()
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""Dataset Search Planner Module
+
+Module that evaluates the filters, sort order and pagination of a
+/dataset-search request on the facet index and a lightweight projection
+of the catalog entries, so that full elements are only built for the
+returned page.
+"""
+from collections import namedtuple
+from datetime import date
+
+
+DatasetProjection = namedtuple('DatasetProjection', [
+    'conp_rank',
+    'title',
+    'size_in_bytes',
+    'files',
+    'subjects',
+    'date_added',
+    'date_updated',
+])
+
+
+DatasetSearchQuery = namedtuple('DatasetSearchQuery', [
+    'query_all',
+    'modalities',
+    'formats',
+    'authorizations',
+    'cbrain',
+    'sort_key',
+    'cursor',
+    'limit',
+])
+
+
+DatasetSearchPlan = namedtuple('DatasetSearchPlan', [
+    'total',
+    'page',
+    'facet_counts',
+])
+
+
+CONP_STATUS_ORDER = {'conp': 0, 'canadian': 1, 'external': 2}
+
+# datasets without date are listed after the dated ones
+MISSING_DATE = date.max.toordinal() + 1
+
+# sort key -> (DatasetProjection field, reverse)
+SORT_FIELDS = {
+    "conpStatus": ("conp_rank", False),
+    "title": ("title", False),
+    "dateAddedAsc": ("date_added", True),
+    "dateAddedDesc": ("date_added", False),
+    "dateUpdatedAsc": ("date_updated", True),
+    "dateUpdatedDesc": ("date_updated", False),
+    "sizeDes": ("size_in_bytes", True),
+    "sizeAsc": ("size_in_bytes", False),
+    "filesDes": ("files", True),
+    "filesAsc": ("files", False),
+    "subjectsDes": ("subjects", True),
+    "subjectsAsc": ("subjects", False),
+}
+
+
+def _date_ordinal(value):
+    if not value:
+        return MISSING_DATE
+    return date.fromisoformat(value).toordinal()
+
+
+def build_projection(record, size_in_bytes=None):
+    """
+        Extracts the typed values used to sort a dataset record
+
+        Args:
+            record: the precomputed /dataset-search element of a dataset
+            size_in_bytes: size of the dataset as given by its DATS.json
+
+        Returns:
+            a DatasetProjection
+    """
+    conp_status = (record["conpStatus"] or "").lower()
+
+    return DatasetProjection(
+        conp_rank=CONP_STATUS_ORDER.get(conp_status, len(CONP_STATUS_ORDER)),
+        title=record["title"].lower(),
+        size_in_bytes=size_in_bytes or 0.0,
+        files=int(record["files"] or 0),
+        subjects=int(record["subjects"] or 0),
+        date_added=_date_ordinal(record["dateAdded"]),
+        date_updated=_date_ordinal(record["dateUpdated"]),
+    )
+
+
+def build_sort_ranks(entries):
+    """
+        Precomputes the position of every entry in each sort order, equal
+        values sharing the same rank so that sorting stays stable
+
+        Args:
+            entries: list of DatasetEntry of the catalog
+
+        Returns:
+            dict of DatasetProjection field -> dict of dataset_id -> rank
+    """
+    sort_ranks = {}
+    for field in DatasetProjection._fields:
+        values = sorted(set(getattr(e.projection, field) for e in entries))
+        position = dict((value, rank) for rank, value in enumerate(values))
+        sort_ranks[field] = dict(
+            (e.record["id"], position[getattr(e.projection, field)])
+            for e in entries
+        )
+    return sort_ranks
+
+
+def parse_dataset_search_args(args):
+    """
+        Reads the filters, sort order and pagination of a search request
+
+        Args:
+            args: the query string arguments of the request
+
+        Returns:
+            a DatasetSearchQuery
+    """
+    def split_arg(name, sep=","):
+        value = args.get(name)
+        return value.split(sep) if value else None
+
+    cursor = None
+    limit = None
+    if args.get('max_per_page') != 'All':
+        delta = int(args.get('max_per_page', 10)) * \
+            (int(args.get('page', 1)) - 1)
+        cursor = max(
+            min(int(args.get('cursor') or 0), 0), 0) + delta
+        limit = int(args.get('limit') or 10)
+
+    return DatasetSearchQuery(
+        query_all=bool(args.get('elements') == 'all'),
+        modalities=split_arg('modalities'),
+        formats=split_arg('formats'),
+        authorizations=split_arg('authorizations'),
+        cbrain=bool(args.get('cbrain')),
+        sort_key=args.get('sortKey') or "conpStatus",
+        cursor=cursor,
+        limit=limit,
+    )
+
+
+def sort_entries(entries, sort_key, analytics_totals, sort_ranks):
+    """
+        Sorts the entries in place on a key of the sortKeys list
+
+        Args:
+            entries: list of DatasetEntry
+            sort_key: key of the sort order
+            analytics_totals: dict of dataset_id -> (nb_views, nb_downloads)
+            sort_ranks: the precomputed ranks of the catalog entries
+    """
+    def count(entry, index):
+        value = analytics_totals.get(entry.record["id"], (None, None))[index]
+        # datasets never viewed or downloaded come before the others
+        return value if value is not None else -1
+
+    if sort_key in SORT_FIELDS:
+        field, reverse = SORT_FIELDS[sort_key]
+        ranks = sort_ranks[field]
+        entries.sort(key=lambda e: ranks[e.record["id"]], reverse=reverse)
+
+    elif sort_key == "relevance":
+        # entries are already in relevance order when searching
+        pass
+
+    elif sort_key == "viewsDes" or sort_key == "viewsAsc":
+        entries.sort(key=lambda e: count(e, 0),
+                     reverse=(sort_key == "viewsDes"))
+
+    elif sort_key == "downloadsDes" or sort_key == "downloadsAsc":
+        entries.sort(key=lambda e: count(e, 1),
+                     reverse=(sort_key == "downloadsDes"))
+
+    else:
+        entries.sort(key=lambda e: (
+            e.record.get(sort_key) is None, e.record.get(sort_key)))
+
+
+def plan_dataset_search(catalog, entries, query, analytics_totals):
+    """
+        Selects the entries of the page requested by a search query
+
+        Args:
+            catalog: the DatasetCatalog the entries come from
+            entries: list of DatasetEntry matching the search term
+            query: a DatasetSearchQuery
+            analytics_totals: dict of dataset_id -> (nb_views, nb_downloads)
+
+        Returns:
+            a DatasetSearchPlan
+    """
+    facet_index = catalog.facets
+    dataset_ids = set(e.record["id"] for e in entries)
+
+    if query.query_all:
+        return DatasetSearchPlan(
+            total=len(entries),
+            page=list(entries),
+            facet_counts=facet_index.counts(dataset_ids, dataset_ids),
+        )
+
+    selected_ids = facet_index.select(
+        dataset_ids,
+        modalities=query.modalities,
+        formats=query.formats,
+        authorizations=query.authorizations,
+        cbrain=query.cbrain,
+    )
+    matching = [e for e in entries if e.record["id"] in selected_ids]
+    sort_entries(matching, query.sort_key, analytics_totals, catalog.sort_ranks)
+
+    page = matching
+    if query.cursor is not None and query.limit is not None:
+        page = matching[query.cursor:(query.cursor + query.limit)]
+
+    return DatasetSearchPlan(
+        total=len(matching),
+        page=page,
+        facet_counts=facet_index.counts(dataset_ids, selected_ids),
+    )
@@ -10,15 +10,20 @@ import re
 from flask import render_template, request, current_app, send_from_directory
 from flask_login import current_user
 
-from app.models import ArkId
+from app.caching import conditional_json
 from app.models import Dataset, DatasetAncestry
 from app.search import search_bp
-from app.search.models import DATSDataset, DatasetCache
+from app.search.catalog import get_dataset_catalog
+from app.search.ci_status import get_ci_status_store
+from app.search.index import get_dataset_search_index
+from app.search.models import DATSDataset, DatasetCache, get_dataset_status
+from app.search.planner import parse_dataset_search_args, plan_dataset_search
 from app.search.queries import (
     example_query_1, example_query_2, example_query_3, example_query_4, example_query_5
 )
-from app.analytics.routes import datasets_views, datasets_downloads
+from app.analytics.totals import get_dataset_analytics_totals
 from app.services import github
+from app.services.ark_ids import get_ark_id_map
 from config import Config
 
 
@@ -101,7 +106,12 @@ def get_dataset_logo():
         return logofile.read()
 
 
+def _ci_status_version():
+    return get_ci_status_store(current_app).version()
+
+
 @search_bp.route('/dataset-search', methods=['GET'])
+@conditional_json(_ci_status_version)
 def dataset_search():
     """ Dataset Search Route
 
@@ -113,265 +123,51 @@ def dataset_search():
         Retuns:
             JSON containing the matching datasets
     """
-    datasets = []
-
     if current_user.is_authenticated:
         authorized = True
     else:
         authorized = False
 
-    if request.args.get('id'):
-        # Query datasets
-        datasets = Dataset.query.filter_by(
-            dataset_id=request.args.get('id')).all()
+    catalog = get_dataset_catalog()
 
+    # If search term exists filter results here, ranked by relevance
+    if request.args.get('search'):
+        entries = catalog.search(
+            request.args.get('search'),
+            get_dataset_search_index(current_app)
+        )
     else:
-        # Query datasets
-        datasets = Dataset.query.order_by(Dataset.id).all()
-
-    # Element input for payload
-    elements = []
-
-    with open(os.path.join(os.getcwd(), "app/static/datasets/dataset-cbrain-ids.json"), "r") as f:
-        cbrain_dataset_ids = json.load(f)
-        f.close()
-
-    # Get the number of views of datasets
-    views = json.loads(datasets_views())
-    downloads = json.loads(datasets_downloads())
-
-    # Build dataset response
-    for d in datasets:
-        try:
-            datsdataset = DATSDataset(d.fspath)
-        except Exception:
-            # If the DATS file can't be laoded, skip this dataset.
-            # There should be an error message in the logs/update_datsets.log
-            continue
-
-        # If search term exists filter results here
-        if request.args.get('search'):
-            search_term = request.args.get('search')
-            with open(datsdataset.DatsFilepath, 'r') as dats:
-                match = False
-                for line in dats.readlines():
-                    if search_term.lower() in line.lower():
-                        match = True
-                        break
-                if not match:
-                    continue
-
-        datasetTitle = d.name.replace("'", "")
-        if datasetTitle in cbrain_dataset_ids.keys():
-            dataset_cbrain_id = cbrain_dataset_ids[datasetTitle]
-        else:
-            dataset_cbrain_id = ""
-
-        views_nb = [v["nb_hits"] for v in views if v["dataset_id"] == d.dataset_id]
-        download_id = os.path.basename(d.fspath) + "_version"
-        downloads_nb = [
-            e["nb_hits"] for e in downloads if e["dataset_id"].startswith(download_id)
-        ]
-
-        ark_id_row = ArkId.query.filter_by(dataset_id=d.dataset_id).first()
-        dataset = {
-            "authorized": authorized,
-            "ark_id": 'https://n2t.net/' + ark_id_row.ark_id,
-            "id": d.dataset_id,
-            "title": d.name.replace("'", "\'"),
-            "remoteUrl": d.remoteUrl,
-            "isPrivate": d.is_private,
-            "thumbnailURL": "/dataset_logo?id={}".format(d.dataset_id),
-            "downloadPath": d.dataset_id,
-            "URL": '?',
-            "downloads": downloads_nb,
-            "views": views_nb,
-            "dateAdded": str(d.date_created.date()),
-            "dateUpdated": str(d.date_updated.date()),
-            "creators": datsdataset.creators,
-            "origin": datsdataset.origin,
-            "size": datsdataset.size,
-            "files": datsdataset.fileCount,
-            "subjects": datsdataset.subjectCount,
-            "formats": datsdataset.formats,
-            "modalities": datsdataset.modalities,
-            "licenses": datsdataset.licenses,
-            "version": datsdataset.version,
-            "sources": datsdataset.sources,
-            "conpStatus": datsdataset.conpStatus,
-            "authorizations": datsdataset.authorizations,
-            "principalInvestigators": datsdataset.principalInvestigators,
-            "primaryPublications": datsdataset.primaryPublications,
-            "logoFilepath": datsdataset.LogoFilepath,
-            "status": datsdataset.status,
-            "cbrain_id": dataset_cbrain_id,
-        }
-
-        elements.append(dataset)
-
-    modalities = []
-    for e in elements:
-        if e['modalities'] is None or e['modalities'] == '':
-            continue
-        for m in e['modalities']:
-            modalities.append(m.lower())
-    modalities = sorted(list(set(modalities)))
-
-    formats = []
-    # by default, formats should be represented in upper case
-    # except for NIfTI, bigWig and RNA-Seq
-    for e in elements:
-        if e['formats'] is None or e['formats'] == []:
-            continue
-        for m in e['formats']:
-            if m.lower() in ['nifti', 'nii', 'niigz']:
-                formats.append('NIfTI')
-            elif m.lower() in ['gifti', 'gii']:
-                formats.append('GIfTI')
-            elif m.lower() == 'bigwig':
-                formats.append('bigWig')
-            elif m.lower() == 'rna-seq':
-                formats.append('RNA-Seq')
-            else:
-                formats.append(m.upper())
-    formats = sorted(list(set(formats)), key=str.casefold)
-
-    authorizations = ['Yes', 'No']
-
-    query_all = bool(request.args.get('elements') == 'all')
-    if not query_all:
-
-        if request.args.get('modalities'):
-            filter_modalities = request.args.get('modalities').split(",")
-            elements = list(
-                filter(lambda e: e['modalities'] is not None, elements))
-            elements = list(filter(lambda e: all(item in (m.lower(
-            ) for m in e['modalities']) for item in filter_modalities), elements))
-        if request.args.get('formats'):
-            filter_formats = request.args.get('formats').split(",")
-            elements = list(
-                filter(lambda e: e['formats'] is not None, elements)
-            )
-            elements = list(filter(lambda e: all(item.lower() in (
-                f.lower() for f in e['formats']) for item in filter_formats), elements)
-            )
-        if request.args.get('authorizations'):
-            filter_auth = request.args.get('authorizations').split(',')
-            elements = list(filter(lambda e: e['authorizations'] is not None, elements))
-            for item in filter_auth:
-                if item == "Yes":
-                    elements = list(filter(lambda e: e['authorizations'] in ['private', 'registered'], elements))
-                if item == "No":
-                    elements = list(filter(lambda e: e['authorizations'] not in ['private', 'registered'], elements))
-
-        if request.args.get('cbrain'):
-            elements = list(
-                filter(lambda e: e['cbrain_id'] != '', elements)
-            )
-
-        cursor = None
-        limit = None
-        if request.args.get('max_per_page') != 'All':
-            delta = int(request.args.get('max_per_page', 10)) * \
-                (int(request.args.get('page', 1)) - 1)
-            cursor = max(
-                min(int(request.args.get('cursor') or 0), 0), 0) + delta
-            limit = int(request.args.get('limit') or 10)
-
-        sort_key = request.args.get('sortKey') or "conpStatus"
-        paginated = elements
-
-        if sort_key == "conpStatus":
-            order = {'conp': 0, 'canadian': 1, 'external': 2}
-            paginated.sort(key=lambda o: (
-                o[sort_key].lower() not in order, order.get(o[sort_key].lower(), None)))
-
-        elif sort_key == "title":
-            paginated.sort(key=lambda o: o[sort_key].lower())
-
-        elif sort_key == "sizeDes" or sort_key == "sizeAsc":
-
-            def get_absolute_size(o):
-                if not o["size"]:
-                    return 0.0
-
-                units = ["KB", "MB", "GB", "TB"]
-                unit_scales = [1000, 1000**2, 1000**3, 1000**4]
-                size = o["size"].split(" ")
-                absolute_size = size[0]
-                if size[1] in units:
-                    absolute_size = float(size[0]) * \
-                        unit_scales[units.index(size[1])]
-                return absolute_size
-
-            reverse = (sort_key == 'sizeDes')
-            paginated.sort(key=lambda o: get_absolute_size(o), reverse=reverse)
-
-        elif sort_key == "filesDes" or sort_key == "filesAsc":
-
-            def get_number_of_files(o):
-                if not o["files"]:
-                    return 0
-
-                return int(o["files"])
+        entries = catalog.entries
 
-            reverse = (sort_key == 'filesDes')
-            paginated.sort(key=lambda o: get_number_of_files(o),
-                           reverse=reverse)
-
-        elif sort_key == "subjectsDes" or sort_key == "subjectsAsc":
-
-            def get_number_of_subjects(o):
-                if not o["subjects"]:
-                    return 0
-
-                return int(o["subjects"])
-
-            reverse = (sort_key == 'subjectsDes')
-            paginated.sort(key=lambda o: get_number_of_subjects(o),
-                           reverse=reverse)
-
-        elif sort_key == "dateAddedDesc" or sort_key == "dateAddedAsc":
-
-            reverse = (sort_key == 'dateAddedAsc')
-            paginated.sort(key=lambda o: (
-                o["dateAdded"] is None, o["dateAdded"]), reverse=reverse)
-
-        elif sort_key == "dateUpdatedDesc" or sort_key == "dateUpdatedAsc":
-
-            reverse = (sort_key == 'dateUpdatedAsc')
-            paginated.sort(key=lambda o: (
-                o["dateUpdated"] is None, o["dateUpdated"]), reverse=reverse)
-
-        elif sort_key == "viewsDes" or sort_key == "viewsAsc":
-
-            reverse = (sort_key == "viewsDes")
-            paginated.sort(key=lambda o: (
-                o["views"] is None, o["views"]), reverse=reverse)
-
-        elif sort_key == "downloadsDes" or sort_key == "downloadsAsc":
+    if request.args.get('id'):
+        entries = [e for e in entries if e.record["id"] == request.args.get('id')]
 
-            reverse = (sort_key == "downloadsDes")
-            paginated.sort(key=lambda o: (
-                o["downloads"] is None, o["downloads"]), reverse=reverse)
+    # Get the number of views and downloads of datasets
+    analytics_totals = get_dataset_analytics_totals()
 
-        else:
-            paginated.sort(key=lambda o: (o[sort_key] is None, o[sort_key]))
+    # Filter on the facet index and sort on the lightweight projections,
+    # full elements are only built for the page that is returned
+    query = parse_dataset_search_args(request.args)
+    plan = plan_dataset_search(catalog, entries, query, analytics_totals)
 
-        if cursor is not None and limit is not None:
-            paginated = paginated[cursor:(cursor + limit)]
-    else:
-        paginated = elements
+    paginated = [
+        _dataset_search_element(entry, authorized, analytics_totals)
+        for entry in plan.page
+    ]
 
     # Construct payload
     payload = {
         "authorized": authorized,
-        "total": len(elements),
+        "total": plan.total,
         "sortKeys": [
             {
                 "key": "conpStatus",
                 "label": "Origin"
             },
+            {
+                "key": "relevance",
+                "label": "Search Relevance"
+            },
             {
                 "key": "title",
                 "label": "Dataset Name"
@@ -435,17 +231,15 @@ def dataset_search():
         ],
         "filterKeys": [
             {
-                "key": "modalities",
-                "values": modalities
-            },
-            {
-                "key": "formats",
-                "values": formats
-            },
-            {
-                "key": "authorizations",
-                "values": authorizations
+                "key": key,
+                "values": list(counts.keys()),
+                "counts": counts
             }
+            for key, counts in (
+                ("modalities", plan.facet_counts["modalities"]),
+                ("formats", plan.facet_counts["formats"]),
+                ("authorizations", plan.facet_counts["authorizations"]),
+            )
         ],
         "elements": paginated
     }
@@ -453,6 +247,20 @@ def dataset_search():
     return json.dumps(payload)
 
 
+def _dataset_search_element(entry, authorized, analytics_totals):
+    """
+        Builds a /dataset-search element from a catalog entry, adding the
+        values that change independently of the datasets
+    """
+    dataset = dict(entry.record)
+    dataset["authorized"] = authorized
+    nb_views, nb_downloads = analytics_totals.get(dataset["id"], (None, None))
+    dataset["views"] = [nb_views] if nb_views is not None else []
+    dataset["downloads"] = [nb_downloads] if nb_downloads is not None else []
+    dataset["status"] = get_dataset_status(entry.name)
+    return dataset
+
+
 @search_bp.route('/dataset', methods=['GET'])
 def dataset_info():
     """ Dataset Route
@@ -488,10 +296,9 @@ def dataset_info():
     else:
         dataset_cbrain_id = ""
 
-    ark_id_row = ArkId.query.filter_by(dataset_id=d.dataset_id).first()
     dataset = {
         "authorized": authorized,
-        "ark_id": 'https://n2t.net/' + ark_id_row.ark_id,
+        "ark_id": get_ark_id_map().dataset_ark_url(d.dataset_id),
         "name": datsdataset.name,
         "id": d.dataset_id,
         "title": d.name.replace("'", "\'"),
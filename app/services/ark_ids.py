@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""ARK Identifiers Service
+
+Bulk resolution of the ARK identifiers of the datasets and pipelines.
+The whole ark_id table is loaded with one query and kept in memory
+until rows are added to it, so listings do not query it per element.
+"""
+import threading
+
+from sqlalchemy import func
+
+from app import db
+from app.models import ArkId
+
+
+ARK_RESOLVER_URL = 'https://n2t.net/'
+
+
+class ArkIdMap(object):
+    """
+        In-memory copy of the ark_id table
+    """
+
+    def __init__(self, signature, rows):
+        self.signature = signature
+        self.datasets = {}
+        self.pipelines = {}
+        self.ark_ids = {}
+        for ark_id, dataset_id, pipeline_id in rows:
+            if dataset_id is not None:
+                self.datasets.setdefault(dataset_id, ark_id)
+                self.ark_ids[ark_id] = ('dataset', dataset_id)
+            elif pipeline_id is not None:
+                self.pipelines.setdefault(pipeline_id, ark_id)
+                self.ark_ids[ark_id] = ('pipeline', pipeline_id)
+
+    def dataset_ark_id(self, dataset_id):
+        return self.datasets.get(dataset_id)
+
+    def pipeline_ark_id(self, pipeline_id):
+        return self.pipelines.get(pipeline_id)
+
+    def dataset_ark_url(self, dataset_id):
+        return ark_id_url(self.datasets.get(dataset_id))
+
+    def pipeline_ark_url(self, pipeline_id):
+        return ark_id_url(self.pipelines.get(pipeline_id))
+
+    def resolve(self, ark_id):
+        """
+            Returns ("dataset", dataset_id) or ("pipeline", pipeline_id)
+            for an ARK identifier, None if it is unknown
+        """
+        return self.ark_ids.get(ark_id)
+
+
+def ark_id_url(ark_id):
+    """
+        Returns the resolver URL of an ARK identifier
+    """
+    return ARK_RESOLVER_URL + ark_id if ark_id else None
+
+
+_ark_id_map = None
+_ark_id_map_lock = threading.Lock()
+
+
+def get_ark_id_map():
+    """
+        Returns the ARK identifiers of the datasets and pipelines,
+        reloading them only if rows were added to the ark_id table
+    """
+    global _ark_id_map
+
+    # ARK identifiers are only ever inserted
+    signature = tuple(db.session.query(
+        func.count(ArkId.id), func.max(ArkId.id)).one())
+    ark_id_map = _ark_id_map
+    if ark_id_map is not None and ark_id_map.signature == signature:
+        return ark_id_map
+
+    rows = db.session.query(ArkId.ark_id, ArkId.dataset_id, ArkId.pipeline_id) \
+        .order_by(ArkId.id).all()
+    with _ark_id_map_lock:
+        _ark_id_map = ArkIdMap(signature, rows)
+        return _ark_id_map
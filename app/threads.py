@@ -3,10 +3,13 @@
 
 Module that contains the threaded pipeline searching functions
 """
-from boutiques.searcher import Searcher
-from boutiques.puller import Puller
+from app.pipelines.registry import BOUTIQUES_CACHE_DIR
+from app.pipelines.zenodo import (
+    PULL_MAX_WORKERS, previous_descriptors, pull_descriptors, search_descriptors)
+from app.pipelines.snapshot import (
+    SHARDS_DIRNAME, SNAPSHOT_FILENAME, merge_descriptors, read_pipeline_snapshot,
+    write_pipeline_shards, write_pipeline_snapshot)
 import threading
-import json
 import os
 import logging
 
@@ -16,36 +19,54 @@ class UpdatePipelineData(threading.Thread):
         Class that handles the threaded updating of the Pipeline
         registrty from Zenodo
     """
-    def __init__(self):
+    def __init__(self, max_workers=PULL_MAX_WORKERS):
         super(UpdatePipelineData, self).__init__()
+        self.max_workers = max_workers
         if not os.path.exists('logs'):
             os.makedirs('logs')
         logging.basicConfig(filename='logs/update_pipeline_thread.log', level=logging.INFO)
 
     def run(self):
         try:
-            boutique_cache_dir = os.path.join(
-                os.path.expanduser('~'),
-                ".cache",
-                "boutiques",
-                "production"
-            )
-            # first search for all descriptors
-            searcher = Searcher(query=None, max_results=100, no_trunc=True, verbose=True)
-            all_descriptors = searcher.search()
-            # then pull every single descriptor
-            all_descriptor_ids = list(map(lambda x: x["ID"], all_descriptors))
-            files = Puller(all_descriptor_ids).pull()
-
-            # fetch every single descriptor into one file
-            detailed_all_descriptors = list(map(lambda f: json.load(open(f, 'r')), files))
-
-            # store data in cache
-            with open(os.path.join(boutique_cache_dir, "all_descriptors.json"), "w") as f:
-                json.dump(all_descriptors, f, indent=4)
-
-            with open(os.path.join(boutique_cache_dir, "detailed_all_descriptors.json"), "w") as f:
-                json.dump(detailed_all_descriptors, f, indent=4)
+            self.refresh()
+        except Exception as e:
+            logging.exception("An exception occurred in the thread:{0}.".format(e))
+
+    def refresh(self):
+        """
+            Refreshes the pipeline snapshot and shards, raising the errors
+        """
+        snapshot_path = os.path.join(BOUTIQUES_CACHE_DIR, SNAPSHOT_FILENAME)
+
+        # descriptors of the previous refresh, reused when unchanged
+        previous = {}
+        if os.path.exists(snapshot_path):
+            previous = previous_descriptors(read_pipeline_snapshot(snapshot_path)[0])
+
+        # search for all descriptors, then pull the new or updated ones
+        summaries = search_descriptors()
+        all_descriptors, detailed_all_descriptors = pull_descriptors(
+            summaries, previous, BOUTIQUES_CACHE_DIR, max_workers=self.max_workers)
+
+        # replace the snapshot and the shards read by the web workers
+        pipelines = merge_descriptors(all_descriptors, detailed_all_descriptors)
+        nb_pipelines = write_pipeline_snapshot(snapshot_path, pipelines)
+        write_pipeline_shards(
+            os.path.join(BOUTIQUES_CACHE_DIR, SHARDS_DIRNAME), pipelines)
+        logging.info("Refreshed {0} descriptors.".format(nb_pipelines))
 
+
+class UpdateCIStatus(threading.Thread):
+    """
+        Class that handles the threaded refresh of the dataset
+        CI status snapshot
+    """
+    def __init__(self, store):
+        super(UpdateCIStatus, self).__init__(daemon=True)
+        self.store = store
+
+    def run(self):
+        try:
+            self.store.refresh()
         except Exception as e:
             logging.exception("An exception occurred in the thread:{0}.".format(e))
@@ -4,6 +4,7 @@
     Currently this module contains all of the routes in webhooks blueprint
 """
 from app.webhooks import webhooks_bp
+from app.caching import bump_catalog_generation
 from flask import request, abort, current_app
 import git
 import hmac
@@ -48,4 +49,7 @@ def webhooks():
     origin = repo.remotes.origin
     origin.pull('master')
 
+    # the static files used by the search endpoints may have changed
+    bump_catalog_generation(current_app)
+
     return 'OK'
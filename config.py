@@ -76,6 +76,9 @@ class Config(object):
     MATOMO_SERVER_URL = os.environ.get("MATOMO_SERVER_URL")
     MATOMO_SITE_ID = os.environ.get("MATOMO_SITE_ID", "2")
     MATOMO_TOKEN_AUTH = os.environ.get("MATOMO_TOKEN_AUTH")
+    # request the missing days as ranges grouped in API.getBulkRequest calls
+    MATOMO_BULK_INGESTION = os.environ.get("MATOMO_BULK_INGESTION", "true").lower() != "false"
+    MATOMO_MAX_WORKERS = int(os.environ.get("MATOMO_MAX_WORKERS") or 4)
 
     # ARK identifier NAAN for CONP
     ARK_CONP_NAAN = os.environ.get("ARK_CONP_NAAN") or "99999"
@@ -90,6 +93,33 @@ class Config(object):
     # Dataset cache
     DATASET_CACHE_PATH = os.environ.get("DATASET_CACHE_PATH")
 
+    # Snapshot of the dataset CI statuses, see `flask update_ci_status`
+    CI_STATUS_PATH = os.environ.get("CI_STATUS_PATH") or os.path.join(
+        DATA_PATH, ".cache", "ci_status.json")
+    CI_STATUS_MAX_AGE = int(os.environ.get("CI_STATUS_MAX_AGE") or 4 * 3600)
+    # Seconds between two background refreshes of a stale snapshot
+    CI_STATUS_RETRY_INTERVAL = int(os.environ.get("CI_STATUS_RETRY_INTERVAL") or 15 * 60)
+    CI_STATUS_AUTO_REFRESH = True
+
+    # Generation number of the catalogs, bumped by the update commands
+    # and used for the ETag of the JSON search and analytics endpoints
+    CATALOG_GENERATION_PATH = os.environ.get("CATALOG_GENERATION_PATH") or os.path.join(
+        DATA_PATH, ".cache", "catalog_generation")
+
+    # Number of worker processes installing and reading the subdatasets
+    DATASET_UPDATE_WORKERS = int(os.environ.get("DATASET_UPDATE_WORKERS") or 4)
+
+    # Locks and progress of the CLI refresh jobs, see `flask job_status`
+    JOBS_STATE_PATH = os.environ.get("JOBS_STATE_PATH") or os.path.join(
+        DATA_PATH, ".cache", "jobs")
+    # Seconds after its start during which a failed run of a job is resumed,
+    # older failures are refreshed from scratch by the next run
+    JOBS_RESUME_MAX_AGE = int(os.environ.get("JOBS_RESUME_MAX_AGE") or 6 * 3600)
+
+    # Full-text index of the dataset DATS fields, written by `flask update_datasets`
+    DATASET_SEARCH_INDEX_PATH = os.environ.get("DATASET_SEARCH_INDEX_PATH") or os.path.join(
+        basedir, "dataset_search_index")
+
 
 class DevelopmentConfig(Config):
     """This is the config for Development"""
@@ -104,6 +134,7 @@ class TestingConfig(Config):
     SQLALCHEMY_DATABASE_URI = "sqlite:///{}".format(
         os.path.join(basedir, "test.db"))
     TESTING = True
+    CI_STATUS_AUTO_REFRESH = False
 
 
 class ProductionConfig(Config):
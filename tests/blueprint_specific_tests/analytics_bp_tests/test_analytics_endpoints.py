@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for endpoints in the analytics blueprint
+"""
+import pytest
+from datetime import date
+from app.models import (
+    Dataset, MatomoDailyGetDatasetPageViewsSummary,
+    MatomoDailyGetPortalDownloadSummary, MatomoDailyGetSiteSearchKeywords,
+    MatomoDailyVisitsSummary)
+
+
+@pytest.fixture
+def dataset_analytics(session):
+    for dataset_id, name in (("projects/views-a", "Views A"), ("projects/views-b", "Views B")):
+        session.add(Dataset(dataset_id=dataset_id, name=name, version="1.0",
+                            is_private=False, fspath="./test/" + dataset_id))
+    for day, dataset_id, nb_hits in (("2021-01-01", "projects/views-a", 2),
+                                      ("2021-01-02", "projects/views-a", 3),
+                                      ("2021-01-02", "projects/views-b", 4),
+                                      ("2021-01-03", "projects/removed", 9),
+                                      ("2021-01-04", None, None)):
+        session.add(MatomoDailyGetDatasetPageViewsSummary(
+            date=day, day=date.fromisoformat(day), dataset_id=dataset_id, nb_hits=nb_hits, nb_visits=nb_hits,
+            url="https://portal.conp.ca/dataset?id={}".format(dataset_id),
+            label="dataset?id={}".format(dataset_id)))
+    for day, url, nb_hits in (("2021-01-01", "https://portal.conp.ca/data/views-a_version-1.0.tar.gz", 1),
+                               ("2021-01-02", "https://portal.conp.ca/data/views-a_version-1.0.tar.gz", 5),
+                               ("2021-01-02", "https://portal.conp.ca/static/logo.png", 7)):
+        session.add(MatomoDailyGetPortalDownloadSummary(
+            date=day, day=date.fromisoformat(day), url=url, label=url.split("/")[-1], nb_hits=nb_hits,
+            nb_visits=1, nb_uniq_visitors=None))
+    session.commit()
+
+    yield
+
+    # committed rows are not rolled back by the session fixture
+    Dataset.query.filter(Dataset.dataset_id.in_(
+        ["projects/views-a", "projects/views-b"])).delete(synchronize_session=False)
+    MatomoDailyGetDatasetPageViewsSummary.query.delete()
+    MatomoDailyGetPortalDownloadSummary.query.delete()
+    session.commit()
+
+
+def test_datasets_views_route(dataset_analytics, test_client):
+    """
+    GIVEN daily page views of datasets
+    WHEN calling the route "/analytics/datasets/views"
+    THEN the views of each dataset in the database are summed by descending hits
+    AND the views can be limited to a date range or a dataset
+    """
+    res = test_client.get("/analytics/datasets/views")
+    assert res.status_code == 200
+    body = res.get_json(force=True)
+    assert [(e["dataset_id"], e["dataset_name"], e["nb_hits"]) for e in body] == [
+        ("projects/views-a", "Views A", 5), ("projects/views-b", "Views B", 4)]
+    assert body[0]["url"] == "https://portal.conp.ca/dataset?id=projects/views-a"
+    assert body[0]["nb_uniq_visitors"] == 0
+
+    body = test_client.get("/analytics/datasets/views?from=2021-01-02&to=2021-01-02").get_json(force=True)
+    assert [(e["dataset_id"], e["nb_hits"]) for e in body] == [
+        ("projects/views-b", 4), ("projects/views-a", 3)]
+
+    body = test_client.get("/analytics/datasets/views?id=projects/views-b").get_json(force=True)
+    assert [e["dataset_id"] for e in body] == ["projects/views-b"]
+
+    assert test_client.get("/analytics/datasets/views?from=yesterday").status_code == 400
+
+
+def test_datasets_downloads_route(dataset_analytics, test_client):
+    """
+    GIVEN daily portal downloads
+    WHEN calling the route "/analytics/datasets/downloads"
+    THEN the downloads of dataset archives are summed per archive
+    """
+    body = test_client.get("/analytics/datasets/downloads").get_json(force=True)
+    assert [(e["dataset_id"], e["nb_hits"], e["nb_uniq_visitors"]) for e in body] == [
+        ("views-a_version-1.0.tar.gz", 6, 0)]
+
+    body = test_client.get("/analytics/datasets/downloads?to=2021-01-01").get_json(force=True)
+    assert body[0]["nb_hits"] == 1
+
+
+def test_datasets_views_route_granularity(dataset_analytics, test_client):
+    """
+    GIVEN daily page views of datasets
+    WHEN calling the route "/analytics/datasets/views" with a granularity
+    THEN the views of each dataset are summed per bucket
+    """
+    body = test_client.get("/analytics/datasets/views?granularity=day").get_json(force=True)
+    assert [(e["date"], e["dataset_id"], e["nb_hits"]) for e in body] == [
+        ("2021-01-01", "projects/views-a", 2),
+        ("2021-01-02", "projects/views-b", 4),
+        ("2021-01-02", "projects/views-a", 3)]
+
+    body = test_client.get("/analytics/datasets/views?granularity=month").get_json(force=True)
+    assert [(e["date"], e["dataset_id"], e["nb_hits"]) for e in body] == [
+        ("2021-01-01", "projects/views-a", 5), ("2021-01-01", "projects/views-b", 4)]
+
+    assert test_client.get("/analytics/datasets/views?granularity=quarter").status_code == 400
+
+
+def test_visitors_route_granularity(session, test_client):
+    """
+    GIVEN daily visits summaries
+    WHEN calling the route "/analytics/visitors" with a granularity
+    THEN the visits are summed per week or month
+    AND the unique visitors are only given for days
+    """
+    for day, nb_visits in (("2021-03-06", 1), ("2021-03-07", 2), ("2021-03-08", 4), ("2021-04-01", 8)):
+        session.add(MatomoDailyVisitsSummary(
+            date=day, day=date.fromisoformat(day), nb_visits=nb_visits, nb_uniq_visitors=nb_visits, nb_actions=2 * nb_visits,
+            sum_visit_length=10 * nb_visits, max_actions=nb_visits))
+    session.commit()
+
+    body = test_client.get("/analytics/visitors").get_json(force=True)
+    assert [e["date"] for e in body] == ["2021-03-06", "2021-03-07", "2021-03-08", "2021-04-01"]
+
+    body = test_client.get("/analytics/visitors?granularity=month").get_json(force=True)
+    assert [(e["date"], e["nb_visits"], e["max_actions"]) for e in body] == [
+        ("2021-03-01", 7, 4), ("2021-04-01", 8, 8)]
+    assert body[0]["avg_time_on_site"] == 10
+    assert body[0]["nb_actions_per_visit"] == 2.0
+    assert body[0]["nb_uniq_visitors"] is None
+    assert body[0]["nb_users"] is None
+
+    body = test_client.get("/analytics/visitors?granularity=day").get_json(force=True)
+    assert [(e["date"], e["nb_uniq_visitors"]) for e in body] == [
+        ("2021-03-06", 1), ("2021-03-07", 2), ("2021-03-08", 4), ("2021-04-01", 8)]
+
+    # weeks start on Monday, 2021-03-08 is a Monday
+    body = test_client.get("/analytics/visitors?granularity=week&to=2021-03-31").get_json(force=True)
+    assert [(e["date"], e["nb_visits"]) for e in body] == [("2021-03-01", 3), ("2021-03-08", 4)]
+
+    # committed rows are not rolled back by the session fixture
+    MatomoDailyVisitsSummary.query.delete()
+    session.commit()
+
+
+def test_keywords_route(session, test_client):
+    """
+    GIVEN daily keyword searches
+    WHEN calling the route "/analytics/keywords"
+    THEN the hits of each keyword are summed, skipping short searches and keywords
+    """
+    for day, label, nb_hits, sum_time_spent in (("2021-01-01", "mri", 2, 10),
+                                                ("2021-01-02", "mri", 3, 10),
+                                                ("2021-01-02", "eeg", 4, 10),
+                                                ("2021-01-02", "typing", 9, 1),
+                                                ("2021-01-02", "ab", 9, 10),
+                                                ("2021-01-03", None, None, None)):
+        session.add(MatomoDailyGetSiteSearchKeywords(
+            date=day, day=date.fromisoformat(day), label=label, nb_hits=nb_hits, sum_time_spent=sum_time_spent))
+    session.commit()
+
+    body = test_client.get("/analytics/keywords").get_json(force=True)
+    assert [(e["label"], e["nb_hits"]) for e in body] == [("mri", 5), ("eeg", 4)]
+
+    body = test_client.get("/analytics/keywords?from=2021-01-02&granularity=day").get_json(force=True)
+    assert [(e["date"], e["label"], e["nb_hits"]) for e in body] == [
+        ("2021-01-02", "eeg", 4), ("2021-01-02", "mri", 3)]
+
+    # committed rows are not rolled back by the session fixture
+    MatomoDailyGetSiteSearchKeywords.query.delete()
+    session.commit()
@@ -19,7 +19,8 @@ def test_pipelines_route(test_client):
     assert res.status_code == 200
 
 
-def test_pipeline_search_route(session, new_pipeline, test_client, app, runner):
+def test_pipeline_search_route(session, new_pipeline, test_client, app, runner,
+                               tmpdir, monkeypatch):
     """
     GIVEN calling the route "/pipeline-search"
     WHEN no user is logged in
@@ -30,6 +31,10 @@ def test_pipeline_search_route(session, new_pipeline, test_client, app, runner):
     session.add(new_pipeline)
     session.commit()
 
+    monkeypatch.setitem(app.config, "JOBS_STATE_PATH", str(tmpdir.join("jobs")))
+    monkeypatch.setitem(
+        app.config, "CATALOG_GENERATION_PATH", str(tmpdir.join("catalog_generation")))
+
     cli.register(app)
     result = runner.invoke(args=["update_pipeline_data"])
 
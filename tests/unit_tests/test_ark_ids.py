@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import pytest
+from app.models import ArkId
+from app.services.ark_ids import get_ark_id_map
+
+
+def test_ark_id_map(session):
+    """
+    GIVEN ARK identifiers for a dataset and a pipeline
+    WHEN the ARK identifier map is loaded
+    THEN both can be looked up by source id and resolved by ARK id
+    """
+    session.add(ArkId(ark_id="ark:/99999/d7map", dataset_id="projects/ark-map"))
+    session.add(ArkId(ark_id="ark:/99999/p7map", pipeline_id="zenodo.0000001"))
+    session.commit()
+
+    ark_id_map = get_ark_id_map()
+    assert ark_id_map.dataset_ark_url("projects/ark-map") == "https://n2t.net/ark:/99999/d7map"
+    assert ark_id_map.pipeline_ark_id("zenodo.0000001") == "ark:/99999/p7map"
+    assert ark_id_map.dataset_ark_url("projects/unknown") is None
+    assert ark_id_map.resolve("ark:/99999/p7map") == ("pipeline", "zenodo.0000001")
+    assert get_ark_id_map() is ark_id_map
+
+
+def test_redirect_ark_ids(session, test_client):
+    """
+    GIVEN an ARK identifier of a dataset
+    WHEN its URL is requested
+    THEN the dataset page is the redirect target
+    AND unknown ARK identifiers return not found
+    """
+    session.add(ArkId(ark_id="ark:/99999/d7redirect", dataset_id="projects/ark-redirect"))
+    session.commit()
+
+    res = test_client.get("/ark:/99999/d7redirect")
+    assert res.status_code == 302
+    assert res.headers["Location"].endswith("/dataset?id=projects/ark-redirect")
+
+    res = test_client.get("/ark:/99999/d7unknown")
+    assert res.status_code == 404
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import pytest
+from app.bulk import BulkWriter
+from app.cli import save_ark_ids_in_database
+from app.models import ArkId, MatomoDailyGetPageUrlsSummary, MatomoDailyVisitsSummary
+
+
+def test_bulk_writer_commits_chunks_of_groups(session):
+    """
+    GIVEN rows added in groups
+    WHEN the writer exits
+    THEN the rows are inserted in chunks committed at the end of a group
+    AND rows violating a unique constraint are skipped
+    """
+    with BulkWriter(MatomoDailyVisitsSummary, chunk_size=2) as writer:
+        for day in range(1, 6):
+            writer.add({"date": "2021-01-0{}".format(day), "nb_visits": day})
+            writer.end_group()
+        writer.add({"date": "2021-01-01", "nb_visits": 100})
+
+    assert writer.added == 6
+    assert writer.inserted == 5
+    assert writer.commits == 3
+    assert MatomoDailyVisitsSummary.query.filter_by(date="2021-01-01").one().nb_visits == 1
+
+    with BulkWriter(MatomoDailyGetPageUrlsSummary) as writer:
+        writer.add({"date": "2021-01-01", "url": "https://portal.conp.ca/", "nb_hits": 3})
+        writer.add({"date": "2021-01-02"})
+    rows = MatomoDailyGetPageUrlsSummary.query.order_by(MatomoDailyGetPageUrlsSummary.date).all()
+    assert [(row.date, row.url) for row in rows] == [
+        ("2021-01-01", "https://portal.conp.ca/"), ("2021-01-02", None)]
+
+    # committed rows are not rolled back by the session fixture
+    MatomoDailyVisitsSummary.query.delete()
+    MatomoDailyGetPageUrlsSummary.query.delete()
+    session.commit()
+
+
+def test_bulk_writer_rolls_back_unfinished_group(session):
+    """
+    GIVEN a writer interrupted in the middle of a group
+    WHEN the error leaves the writer
+    THEN only the groups committed before are stored
+    """
+    with pytest.raises(KeyError):
+        with BulkWriter(MatomoDailyVisitsSummary, chunk_size=1) as writer:
+            writer.add({"date": "2021-02-01"})
+            writer.end_group()
+            writer.add({"date": "2021-02-02"})
+            raise KeyError("nb_visits")
+
+    assert [row.date for row in MatomoDailyVisitsSummary.query.all()] == ["2021-02-01"]
+
+    # committed rows are not rolled back by the session fixture
+    MatomoDailyVisitsSummary.query.delete()
+    session.commit()
+
+
+def test_save_ark_ids_in_database(session, app):
+    """
+    GIVEN datasets without an ARK identifier
+    WHEN their ARK identifiers are saved
+    THEN every dataset gets a distinct ARK identifier
+    """
+    dataset_ids = ["projects/ark-{}".format(n) for n in range(3)]
+    with app.app_context():
+        save_ark_ids_in_database(app, "dataset", dataset_ids)
+
+    ark_ids = ArkId.query.filter(ArkId.dataset_id.in_(dataset_ids)).all()
+    assert sorted(ark_id.dataset_id for ark_id in ark_ids) == dataset_ids
+    assert len(set(ark_id.ark_id for ark_id in ark_ids)) == 3
+    assert all(ark_id.ark_id.startswith("ark:/") for ark_id in ark_ids)
+
+    # committed rows are not rolled back by the session fixture
+    ArkId.query.filter(ArkId.dataset_id.in_(dataset_ids)).delete(synchronize_session=False)
+    session.commit()
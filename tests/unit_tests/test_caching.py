@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import pytest
+import app.caching as caching
+from app.caching import CatalogGeneration
+
+
+def test_catalog_generation_bump(tmpdir):
+    """
+    GIVEN a catalog generation file that does not exist yet
+    WHEN the generation is bumped
+    THEN the generation number increases from 0
+    """
+    generation = CatalogGeneration(str(tmpdir.join("cache", "catalog_generation")))
+    assert generation.get() == (0, None)
+    assert generation.bump() == 1
+    assert generation.bump() == 2
+    assert generation.get()[0] == 2
+
+
+def test_search_etag_until_generation_bump(session, app, test_client, tmpdir, monkeypatch):
+    """
+    GIVEN a response of the execution records search with its ETag
+    WHEN the same request is sent with If-None-Match
+    THEN 304 Not Modified is returned until the catalog generation or the
+    payload version is bumped
+    """
+    monkeypatch.setitem(
+        app.config, "CATALOG_GENERATION_PATH", str(tmpdir.join("catalog_generation")))
+
+    res = test_client.get("/execution-records-search?max_per_page=1")
+    assert res.status_code == 200
+    etag = res.headers["ETag"]
+
+    res = test_client.get("/execution-records-search?max_per_page=1",
+                          headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.data == b""
+
+    res = test_client.get("/execution-records-search?max_per_page=2",
+                          headers={"If-None-Match": etag})
+    assert res.status_code == 200
+
+    CatalogGeneration(app.config["CATALOG_GENERATION_PATH"]).bump()
+    res = test_client.get("/execution-records-search?max_per_page=1",
+                          headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.headers["ETag"] != etag
+    etag = res.headers["ETag"]
+
+    monkeypatch.setattr(caching, "PAYLOAD_VERSION", caching.PAYLOAD_VERSION + 1)
+    res = test_client.get("/execution-records-search?max_per_page=1",
+                          headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.headers["ETag"] != etag
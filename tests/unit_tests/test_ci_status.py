@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import time
+
+import pytest
+import app.search.ci_status as ci_status
+from app.search.ci_status import CIStatusStore, compute_dataset_statuses
+
+
+TEST_RESULTS = {
+    "preventad-open:test_download": {"status": "Success"},
+    "preventad-open:test_files": {"status": "Success"},
+    "multicenter-phantom:test_download": {"status": "Failure"},
+    "multicenter-phantom:test_files": {"status": "Success"},
+    "sub_dataset:test_download": {"status": "Skipped"},
+}
+
+
+def test_compute_dataset_statuses():
+    """
+    GIVEN the test results of a CI run
+    WHEN they are summarized per dataset
+    THEN failing datasets are broken and fully passing ones working
+    """
+    assert compute_dataset_statuses(TEST_RESULTS) == {
+        "preventad-open": "Working",
+        "multicenter-phantom": "Broken",
+        "sub_dataset": "Unknown",
+    }
+
+
+def test_store_keeps_last_good_snapshot(tmpdir, monkeypatch):
+    """
+    GIVEN a CI status snapshot
+    WHEN a refresh fails
+    THEN the previous statuses are still served
+    """
+    store = CIStatusStore(str(tmpdir.join("ci_status.json")))
+    assert store.is_stale()
+    assert store.get_status("preventad-open") == "Unknown"
+
+    monkeypatch.setattr(ci_status, "fetch_latest_test_results", lambda: TEST_RESULTS)
+    assert store.refresh() == 3
+    assert not store.is_stale()
+    assert store.get_status("preventad-open") == "Working"
+    assert store.get_status("sub/dataset") == "Unknown"
+
+    def failing_fetch():
+        raise IOError("CircleCI is down")
+
+    monkeypatch.setattr(ci_status, "fetch_latest_test_results", failing_fetch)
+    with pytest.raises(IOError):
+        store.refresh()
+    assert store.get_status("multicenter-phantom") == "Broken"
+
+
+def test_background_refresh_backs_off(tmpdir, monkeypatch):
+    """
+    GIVEN a stale CI status snapshot
+    WHEN background refreshes are requested repeatedly
+    THEN a new refresh is only started once the retry interval has passed
+    """
+    import app.threads
+
+    started = []
+
+    class _Refresh(object):
+        def __init__(self, store):
+            pass
+
+        def start(self):
+            started.append(time.monotonic())
+
+        def is_alive(self):
+            return False
+
+    monkeypatch.setattr(app.threads, "UpdateCIStatus", _Refresh)
+
+    store = CIStatusStore(str(tmpdir.join("ci_status.json")), retry_interval=60)
+    store.refresh_in_background()
+    store.refresh_in_background()
+    assert len(started) == 1
+
+    store._last_attempt -= 61
+    store.refresh_in_background()
+    assert len(started) == 2
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import pytest
+from app.models import (
+    Dataset, DatasetAnalyticsTotals, MatomoDailyGetDatasetPageViewsSummary,
+    MatomoDailyGetPortalDownloadSummary)
+from app.analytics.totals import (
+    get_dataset_analytics_totals, refresh_dataset_analytics_totals)
+
+
+def test_refresh_dataset_analytics_totals(session):
+    """
+    GIVEN daily Matomo views and downloads of datasets
+    WHEN the analytics totals are refreshed
+    THEN each dataset has the sum of its daily views and downloads
+    AND datasets without downloads have no download count
+    """
+    session.add(Dataset(
+        dataset_id="projects/totals-test",
+        name="Totals Test",
+        version="1.0",
+        is_private=False,
+        fspath="./test/totals-test"
+    ))
+    for date, nb_hits in (("2022-01-01", 3), ("2022-01-02", 4)):
+        session.add(MatomoDailyGetDatasetPageViewsSummary(
+            dataset_id="projects/totals-test", date=date,
+            nb_hits=nb_hits, nb_visits=1, nb_uniq_visitors=None))
+    session.add(MatomoDailyGetDatasetPageViewsSummary(
+        dataset_id="projects/totals-other", date="2022-01-01",
+        nb_hits=2, nb_visits=2, nb_uniq_visitors=2))
+    for url, nb_hits in (
+            ("https://portal.conp.ca/data/totals-test_version-1.0.tar.gz", 5),
+            ("https://portal.conp.ca/data/totals-test_version-1.1.tar.gz", 1),
+            ("https://portal.conp.ca/data/totals-testing_version-1.0.tar.gz", 9)):
+        session.add(MatomoDailyGetPortalDownloadSummary(
+            date="2022-01-01", url=url, nb_hits=nb_hits, nb_visits=1, nb_uniq_visitors=1))
+    session.commit()
+
+    assert refresh_dataset_analytics_totals() == 2
+
+    totals = get_dataset_analytics_totals()
+    assert totals["projects/totals-test"] == (7, 6)
+    assert totals["projects/totals-other"] == (2, None)
+
+    # refreshing replaces the previous totals
+    assert refresh_dataset_analytics_totals() == 2
+    assert get_dataset_analytics_totals() == totals
+
+    # committed rows are not rolled back by the session fixture
+    Dataset.query.filter_by(dataset_id="projects/totals-test").delete()
+    MatomoDailyGetDatasetPageViewsSummary.query.delete()
+    MatomoDailyGetPortalDownloadSummary.query.delete()
+    DatasetAnalyticsTotals.query.delete()
+    session.commit()
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import pytest
+from app.models import ArkId, Dataset
+from app.search.catalog import get_dataset_catalog, invalidate_dataset_catalog
+
+
+def _add_dataset(session, dataset_id, ark_id):
+    dataset = Dataset(
+        dataset_id=dataset_id,
+        name="Multicenter Single Subject Human MRI Phantom",
+        version="1.0",
+        is_private=False,
+        fspath='./test/test_dataset'
+    )
+    session.add(dataset)
+    session.add(ArkId(ark_id=ark_id, dataset_id=dataset_id))
+    session.commit()
+    return dataset
+
+
+def test_catalog_is_reused_until_datasets_change(session):
+    """
+    GIVEN a dataset in the database
+    WHEN the dataset catalog is requested twice
+    THEN the same catalog is returned
+    AND it is rebuilt once a new dataset is added
+    """
+    invalidate_dataset_catalog()
+    _add_dataset(session, "projects/catalog-test-1", "ark:/99999/d7catalog1")
+
+    catalog = get_dataset_catalog()
+    assert len(catalog) == 1
+    assert get_dataset_catalog() is catalog
+
+    record = catalog.get("projects/catalog-test-1").record
+    assert record["ark_id"] == "https://n2t.net/ark:/99999/d7catalog1"
+    assert record["modalities"] == ("MRI", "Quality Control Subject")
+
+    _add_dataset(session, "projects/catalog-test-2", "ark:/99999/d7catalog2")
+
+    rebuilt_catalog = get_dataset_catalog()
+    assert rebuilt_catalog is not catalog
+    assert len(rebuilt_catalog) == 2
+
+    # committed rows are not rolled back by the session fixture
+    for dataset_id in ("projects/catalog-test-1", "projects/catalog-test-2"):
+        Dataset.query.filter_by(dataset_id=dataset_id).delete()
+        ArkId.query.filter_by(dataset_id=dataset_id).delete()
+    session.commit()
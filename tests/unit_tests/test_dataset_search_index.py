@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import pytest
+from app.search.index import DatasetSearchIndex, dats_search_fields
+from app.search.models import DATSDataset
+
+
+@pytest.fixture()
+def search_index(tmpdir):
+    search_index = DatasetSearchIndex(str(tmpdir.join("index")))
+    search_index.update({
+        "projects/phantom": dats_search_fields(DATSDataset('./test/test_dataset')),
+        "projects/other": {"title": u"Resting state EEG", "description": u"phantom"},
+    })
+    return search_index
+
+
+def test_search_index_matches_dats_fields(search_index):
+    """
+    GIVEN an index built from a DATS.json
+    WHEN searching words of its title and modalities
+    THEN the dataset is found
+    """
+    assert search_index.indexed_ids() == {"projects/phantom", "projects/other"}
+    assert list(search_index.search("MRI phantom").keys()) == ["projects/phantom"]
+    assert list(search_index.search("RandomSearchTerm").keys()) == []
+
+
+def test_search_index_ranks_and_matches_prefixes(search_index):
+    """
+    GIVEN two datasets mentioning a word in different fields
+    WHEN searching the beginning of the word
+    THEN the dataset with the word in its title ranks first
+    """
+    results = search_index.search("phant")
+    assert list(results.keys()) == ["projects/phantom", "projects/other"]
+
+
+def test_search_index_removes_deleted_datasets(search_index):
+    """
+    GIVEN an existing index
+    WHEN it is updated without one of its datasets
+    THEN the dataset is no longer found
+    """
+    search_index.update({"projects/other": {"title": u"Resting state EEG"}})
+    assert search_index.indexed_ids() == {"projects/other"}
+    assert list(search_index.search("phantom").keys()) == []
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import pytest
+from werkzeug.datastructures import MultiDict
+from app.search.catalog import DatasetCatalog, DatasetEntry
+from app.search.planner import (
+    build_projection, parse_dataset_search_args, plan_dataset_search)
+
+
+def _entry(dataset_id, title, modalities, authorizations, size, size_in_bytes):
+    record = {
+        "id": dataset_id,
+        "title": title,
+        "modalities": modalities,
+        "formats": ["NIfTI"],
+        "authorizations": authorizations,
+        "cbrain_id": "",
+        "conpStatus": "conp",
+        "size": size,
+        "files": 10,
+        "subjects": 1,
+        "dateAdded": "2020-01-01",
+        "dateUpdated": "2020-01-01",
+    }
+    return DatasetEntry(
+        record=record, projection=build_projection(record, size_in_bytes),
+        name=dataset_id, search_text="")
+
+
+ENTRIES = [
+    _entry("projects/a", "Alpha", ["MRI"], "public", "1.5 GB", 1.5e9),
+    _entry("projects/b", "Beta", ["MRI", "EEG"], "private", "20.0 MB", 2e7),
+    _entry("projects/c", "Gamma", ["EEG"], "public", "3.0 TB", 3e12),
+    _entry("projects/d", "Delta", None, "public", "512.0 B", 512.0),
+]
+
+CATALOG = DatasetCatalog(None, ENTRIES)
+
+
+def test_plan_filters_and_sorts_projections():
+    """
+    GIVEN catalog entries
+    WHEN a search query with filters and a sort key is planned
+    THEN only the matching entries are returned in the requested order
+    """
+    query = parse_dataset_search_args(MultiDict({
+        "modalities": "mri", "sortKey": "sizeDes", "max_per_page": "All"}))
+    total, page, _ = plan_dataset_search(CATALOG, ENTRIES, query, {})
+    assert total == 2
+    assert [e.record["id"] for e in page] == ["projects/a", "projects/b"]
+
+    query = parse_dataset_search_args(MultiDict({
+        "authorizations": "No", "sortKey": "title", "max_per_page": "All"}))
+    total, page, _ = plan_dataset_search(CATALOG, ENTRIES, query, {})
+    assert [e.record["id"] for e in page] == ["projects/a", "projects/d", "projects/c"]
+
+
+def test_plan_sorts_on_typed_values():
+    """
+    GIVEN catalog entries with sizes in different units
+    WHEN they are sorted by size
+    THEN the sizes are compared in bytes
+    """
+    query = parse_dataset_search_args(MultiDict({
+        "sortKey": "sizeAsc", "max_per_page": "All"}))
+    total, page, _ = plan_dataset_search(CATALOG, ENTRIES, query, {})
+    assert [e.record["id"] for e in page] == [
+        "projects/d", "projects/b", "projects/a", "projects/c"]
+
+
+def test_plan_returns_only_requested_page():
+    """
+    GIVEN catalog entries and analytics totals
+    WHEN a page of results sorted by views is requested
+    THEN the total counts every match but only the page entries are returned
+    """
+    analytics_totals = {"projects/c": (12, None), "projects/a": (3, 1)}
+    query = parse_dataset_search_args(MultiDict({
+        "sortKey": "viewsDes", "max_per_page": "2", "page": "1", "limit": "2"}))
+    total, page, _ = plan_dataset_search(CATALOG, ENTRIES, query, analytics_totals)
+    assert total == 4
+    assert [e.record["id"] for e in page] == ["projects/c", "projects/a"]
+
+
+def test_plan_counts_facet_values_under_selection():
+    """
+    GIVEN catalog entries
+    WHEN a modality is selected
+    THEN every facet value reports the number of matching datasets
+    AND the values listed are those of all the candidate datasets
+    """
+    query = parse_dataset_search_args(MultiDict({
+        "modalities": "eeg", "formats": "nii", "max_per_page": "All"}))
+    plan = plan_dataset_search(CATALOG, ENTRIES, query, {})
+    assert plan.total == 2
+    assert plan.facet_counts["modalities"] == {"eeg": 2, "mri": 1}
+    assert plan.facet_counts["formats"] == {"NIfTI": 2}
+    assert plan.facet_counts["authorizations"] == {"Yes": 1, "No": 1}
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import copy
+import json
+import os
+import shutil
+import pytest
+from app.search.models import DATSDataset, ParsedDATSRegistry
+
+
+def test_datsdataset_parses_each_file_once():
+    """
+    GIVEN a dataset directory
+    WHEN several DATSDataset are created for it
+    THEN the DATS.json is parsed once and the derived fields are shared
+    """
+    first = DATSDataset('./test/test_dataset')
+    second = DATSDataset('./test/test_dataset')
+    assert first._parsed is second._parsed
+    assert first.modalities == ("MRI", "Quality Control Subject")
+    assert second.modalities is first.modalities
+
+
+def test_datsdataset_descriptor_changes_stay_local():
+    """
+    GIVEN a DATSDataset whose descriptor is modified
+    WHEN another DATSDataset is created for the same dataset
+    THEN it still sees the content of the DATS.json file
+    """
+    modified = DATSDataset('./test/test_dataset')
+    modified.descriptor["title"] = "Modified"
+    modified.descriptor["types"] = []
+    assert modified.title == "Modified"
+    assert modified.modalities is None
+
+    fresh = DATSDataset('./test/test_dataset')
+    assert fresh.title == "Multicenter Single Subject Human MRI Phantom"
+    assert fresh.modalities == ("MRI", "Quality Control Subject")
+
+
+def test_registry_reparses_modified_files(tmpdir):
+    """
+    GIVEN a DATS.json already parsed by the registry
+    WHEN the file is modified
+    THEN the next lookup returns the new content
+    """
+    datasetpath = str(tmpdir.join("dataset"))
+    shutil.copytree('./test/test_dataset', datasetpath)
+    registry = ParsedDATSRegistry(maxsize=2)
+
+    parsed = registry.get(datasetpath)
+    assert registry.get(datasetpath) is parsed
+
+    dats_filepath = os.path.join(datasetpath, "DATS.json")
+    with open(dats_filepath, "r") as f:
+        content = f.read()
+    with open(dats_filepath, "w") as f:
+        f.write(content.replace("Multicenter", "Single center"))
+
+    reparsed = registry.get(datasetpath)
+    assert reparsed is not parsed
+    assert reparsed.descriptor["title"].startswith("Single center")
+
+
+def test_datsdataset_fields_are_read_only():
+    """
+    GIVEN the fields of a DATSDataset, shared by every instance
+    WHEN they are read
+    THEN they are immutable but still serialized as JSON lists and objects
+    """
+    dataset = DATSDataset('./test/test_dataset')
+    assert isinstance(dataset.formats, tuple)
+    with pytest.raises(TypeError):
+        dataset.dates["Modified"] = "2021-01-01"
+    assert json.loads(json.dumps({"formats": dataset.formats})) == {
+        "formats": list(dataset.formats)}
+    assert json.loads(json.dumps(dataset.dates)) == dict(dataset.dates)
+    assert copy.deepcopy(dataset.dates) == dataset.dates
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+from app.jobs import (
+    Job, JobLockedError, current_job, job_status, report_progress, run_job,
+    run_stage)
+
+
+def test_job_lock(tmpdir):
+    """
+    GIVEN a running job
+    WHEN the same job is started again
+    THEN the second run is refused until the first one finishes
+    """
+    state_dir = str(tmpdir)
+    with Job("update_datasets", state_dir):
+        with pytest.raises(JobLockedError):
+            with Job("update_datasets", state_dir):
+                pass
+        with Job("update_analytics", state_dir):
+            pass
+        assert job_status(state_dir, "update_datasets")[0]["status"] == "running"
+
+    with Job("update_datasets", state_dir):
+        pass
+    assert job_status(state_dir, "update_datasets")[0]["status"] == "succeeded"
+
+
+def test_job_resumes_failed_run(app, tmpdir, monkeypatch):
+    """
+    GIVEN a job that failed in its second stage
+    WHEN the job is run again
+    THEN the completed stage is skipped
+    AND the stages, progress and timing are persisted
+    """
+    monkeypatch.setitem(app.config, "JOBS_STATE_PATH", str(tmpdir))
+    calls = []
+
+    def first_stage():
+        calls.append("first")
+
+    def second_stage(fail):
+        calls.append("second")
+        report_progress(1, 2)
+        if fail:
+            raise ValueError("Matomo is down")
+
+    def job(fail):
+        run_stage("first", first_stage)
+        run_stage("second", second_stage, fail)
+
+    with pytest.raises(ValueError):
+        run_job(app, "update_analytics", job, True)
+    state = job_status(str(tmpdir), "update_analytics")[0]
+    assert state["status"] == "failed"
+    assert state["error"] == "ValueError: Matomo is down"
+    assert state["stages"]["second"]["done"] == 1
+    assert state["stages"]["second"]["total"] == 2
+
+    run_job(app, "update_analytics", job, False)
+    assert calls == ["first", "second", "second"]
+    state = job_status(str(tmpdir), "update_analytics")[0]
+    assert state["status"] == "succeeded"
+    assert state["stages"]["first"]["status"] == "succeeded"
+    assert state["stages"]["second"]["seconds"] is not None
+
+    run_job(app, "update_analytics", job, False)
+    assert calls == ["first", "second", "second", "first", "second"]
+    assert current_job() is None
+
+
+def test_update_datasets_retries_failed_install(app, tmpdir, monkeypatch):
+    """
+    GIVEN an update of the datasets whose subdataset install failed
+    WHEN the update is run again
+    THEN the install stage is retried before the subdatasets are updated
+    """
+    import app.cli as cli
+
+    monkeypatch.setitem(app.config, "JOBS_STATE_PATH", str(tmpdir))
+    calls = []
+
+    def install(app, datasetsdir):
+        calls.append("install")
+        if calls.count("install") == 1:
+            raise RuntimeError("The conp-dataset subdatasets could not be installed")
+
+    monkeypatch.setattr(cli, "_update_conp_dataset", install)
+    monkeypatch.setattr(cli, "_update_subdatasets",
+                        lambda app, datasetsdir: calls.append("subdatasets"))
+    monkeypatch.setattr(cli, "_update_dataset_search_index",
+                        lambda app: calls.append("search_index"))
+    monkeypatch.setattr(cli, "_bump_catalog_generation", lambda app: None)
+
+    with pytest.raises(RuntimeError):
+        run_job(app, "update_datasets", cli._update_datasets, app)
+    state = job_status(str(tmpdir), "update_datasets")[0]
+    assert state["status"] == "failed"
+    assert state["stages"]["conp_dataset"]["status"] == "failed"
+    assert calls == ["install"]
+
+    run_job(app, "update_datasets", cli._update_datasets, app)
+    assert calls == ["install", "install", "subdatasets", "search_index"]
+    assert job_status(str(tmpdir), "update_datasets")[0]["status"] == "succeeded"
+
+
+def test_job_does_not_resume_old_failure(tmpdir):
+    """
+    GIVEN a job that failed longer ago than the resume max age
+    WHEN the job is run again
+    THEN the run starts over instead of resuming the failed one
+    """
+    state_dir = str(tmpdir)
+    with pytest.raises(ValueError):
+        with Job("update_analytics", state_dir) as job:
+            with job.stage("first"):
+                pass
+            raise ValueError("Matomo is down")
+
+    state_path = tmpdir.join("update_analytics.json")
+    state = json.loads(state_path.read())
+    state["started"] = "2020-01-01T00:00:00"
+    state_path.write(json.dumps(state))
+
+    with Job("update_analytics", state_dir, resume_max_age=3600) as job:
+        assert not job.resumed
+        assert not job.stage_completed("first")
+
+    with pytest.raises(ValueError):
+        with Job("update_analytics", state_dir) as job:
+            with job.stage("first"):
+                pass
+            raise ValueError("Matomo is down")
+    with Job("update_analytics", state_dir, resume_max_age=3600) as job:
+        assert job.resumed
+        assert job.stage_completed("first")
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+import json
+import threading
+import pytest
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+import app.cli as cli
+from app.analytics.matomo import MatomoClient, MatomoError, date_ranges
+from app.models import Dataset, MatomoDailyGetDatasetPageViewsSummary
+
+
+def _days(date):
+    if "," not in date:
+        return [date]
+    start, end = [datetime.strptime(d, "%Y-%m-%d") for d in date.split(",")]
+    return [str((start + timedelta(days=n)).date())
+            for n in range((end - start).days + 1)]
+
+
+def _report(query):
+    """
+    Answers an API request like Matomo, views only on even days
+    """
+    if query["token_auth"] != "secret":
+        return {"result": "error", "message": "token_auth is invalid"}
+
+    def day_report(day):
+        if int(day[-2:]) % 2:
+            return []
+        if query["method"] == "VisitsSummary.get":
+            return {"nb_visits": int(day[-2:])}
+        return [{"label": "dataset", "url": query["pageUrl"], "nb_hits": 1,
+                 "nb_visits": 1, "nb_uniq_visitors": 1, "sum_time_spent": 5,
+                 "avg_time_on_page": 5}]
+
+    days = _days(query["date"])
+    if "," not in query["date"]:
+        return day_report(days[0])
+    return dict((day, day_report(day)) for day in days)
+
+
+class _StubMatomo(BaseHTTPRequestHandler):
+    calls = []
+
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        form = dict((k, v[0]) for k, v in parse_qs(self.rfile.read(length).decode()).items())
+        query = dict((k, v[0]) for k, v in parse_qs(urlparse(self.path).query).items())
+        query.update(form)
+        self.calls.append(query.get("method"))
+
+        if query.get("method") == "API.getBulkRequest":
+            body = []
+            for index in range(len([k for k in query if k.startswith("urls[")])):
+                subquery = dict((k, v[0]) for k, v in parse_qs(query["urls[{}]".format(index)]).items())
+                body.append(_report(dict(subquery, token_auth=query["token_auth"])))
+        else:
+            body = _report(query)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps(body).encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def matomo_url():
+    server = HTTPServer(("127.0.0.1", 0), _StubMatomo)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    _StubMatomo.calls = []
+    yield "http://127.0.0.1:{}/".format(server.server_port)
+    server.shutdown()
+    server.server_close()
+
+
+def test_date_ranges():
+    """
+    GIVEN missing dates
+    WHEN they are grouped
+    THEN consecutive days form ranges of at most the maximum length
+    """
+    dates = ["2021-01-03", "2021-01-01", "2021-01-02", "2021-01-05",
+             "2021-01-06", "2021-01-07", "2021-01-08"]
+    assert date_ranges(dates, max_days=3) == [
+        ("2021-01-01", "2021-01-03"), ("2021-01-05", "2021-01-07"),
+        ("2021-01-08", "2021-01-08")]
+    assert date_ranges([]) == []
+
+
+def test_bulk_requests_match_daily_requests(matomo_url):
+    """
+    GIVEN a Matomo server
+    WHEN daily reports are requested in bulk mode
+    THEN the reports are those of the daily requests with far fewer calls
+    AND Matomo errors are raised
+    """
+    dates = ["2021-03-0{}".format(d) for d in range(1, 8)]
+    params_list = [{"pageUrl": "https://portal.conp.ca/dataset?id=projects/{}".format(n)}
+                   for n in range(5)]
+
+    bulk = MatomoClient(matomo_url, 2, "secret", bulk_size=4)
+    bulk_reports = bulk.get_days_bulk("Actions.getPageUrl", dates, params_list)
+    assert _StubMatomo.calls == ["API.getBulkRequest"] * 2
+
+    _StubMatomo.calls = []
+    daily = MatomoClient(matomo_url, 2, "secret", bulk=False, max_workers=2)
+    assert daily.get_days_bulk("Actions.getPageUrl", dates, params_list) == bulk_reports
+    assert len(_StubMatomo.calls) == len(dates) * len(params_list)
+
+    assert bulk_reports[0]["2021-03-01"] == []
+    assert bulk_reports[0]["2021-03-02"][0]["url"] == params_list[0]["pageUrl"]
+    assert bulk.get_days("VisitsSummary.get", dates)["2021-03-04"] == {"nb_visits": 4}
+
+    with pytest.raises(MatomoError):
+        MatomoClient(matomo_url, 2, "wrong").get_days("VisitsSummary.get", dates)
+
+
+def test_update_dataset_views_in_bulk(session, app, matomo_url, monkeypatch):
+    """
+    GIVEN a dataset and a Matomo server
+    WHEN the daily dataset views are updated
+    THEN the views of every missing day are inserted from bulk requests
+    """
+    session.add(Dataset(
+        dataset_id="projects/bulk-views",
+        name="Bulk Views",
+        version="1.0",
+        is_private=False,
+        fspath="./test/bulk-views"
+    ))
+    session.commit()
+    monkeypatch.setattr(cli, "determine_dates_to_query_on_matomo",
+                        lambda dates_in_database: ["2021-03-01", "2021-03-02"])
+
+    client = MatomoClient(matomo_url, 2, "secret")
+    cli._update_analytics_matomo_get_daily_dataset_views_summary(app, client)
+
+    assert _StubMatomo.calls == ["API.getBulkRequest"]
+    rows = MatomoDailyGetDatasetPageViewsSummary.query.filter_by(
+        dataset_id="projects/bulk-views").all()
+    assert [row.date for row in rows] == ["2021-03-02"]
+    assert rows[0].nb_hits == 1
+
+    # committed rows are not rolled back by the session fixture
+    Dataset.query.filter_by(dataset_id="projects/bulk-views").delete()
+    MatomoDailyGetDatasetPageViewsSummary.query.delete()
+    session.commit()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import pytest
+from datetime import date
+from app.analytics.rollups import period_end, refresh_matomo_rollups, rollups_current
+from app.models import (
+    Dataset, MatomoDailyGetDatasetPageViewsSummary, MatomoDailyVisitsSummary,
+    MatomoPageViewsRollup, MatomoRollupState, MatomoVisitsSummaryRollup)
+
+
+def _add_days(session, days):
+    for day, nb_visits in days:
+        session.add(MatomoDailyVisitsSummary(
+            date=day.isoformat(), day=day, nb_visits=nb_visits, max_actions=nb_visits))
+        session.add(MatomoDailyGetDatasetPageViewsSummary(
+            date=day.isoformat(), day=day, dataset_id="projects/rollup",
+            url="https://portal.conp.ca/dataset?id=projects/rollup",
+            label="dataset?id=projects/rollup", nb_hits=nb_visits, nb_visits=1))
+    session.commit()
+
+
+def test_period_end():
+    """
+    GIVEN the first day of a period
+    WHEN the end of the period is computed
+    THEN the first day of the next period is returned
+    """
+    assert period_end(date(2021, 1, 1), "month") == date(2021, 2, 1)
+    assert period_end(date(2021, 12, 1), "month") == date(2022, 1, 1)
+    assert period_end(date(2021, 1, 1), "year") == date(2022, 1, 1)
+
+
+def test_refresh_matomo_rollups(session):
+    """
+    GIVEN daily Matomo statistics
+    WHEN the rollups are refreshed after new days are inserted
+    THEN only the months and years of the new days are recomputed
+    """
+    _add_days(session, [(date(2020, 12, 31), 1), (date(2021, 1, 1), 2), (date(2021, 1, 2), 4)])
+    assert not rollups_current("visits_summary")
+
+    counts = refresh_matomo_rollups()
+    assert counts["visits_summary"] == 4
+    assert counts["dataset_views"] == 4
+    assert rollups_current("visits_summary")
+
+    months = MatomoVisitsSummaryRollup.query.filter_by(period="month") \
+        .order_by(MatomoVisitsSummaryRollup.period_start).all()
+    assert [(m.period_start, m.nb_visits, m.nb_days, m.max_actions) for m in months] == [
+        (date(2020, 12, 1), 1, 1, 1), (date(2021, 1, 1), 6, 2, 4)]
+
+    _add_days(session, [(date(2021, 2, 1), 8)])
+    assert not rollups_current("dataset_views")
+    counts = refresh_matomo_rollups()
+    assert counts["visits_summary"] == 2
+    assert refresh_matomo_rollups()["visits_summary"] == 0
+
+    year = MatomoVisitsSummaryRollup.query.filter_by(
+        period="year", period_start=date(2021, 1, 1)).one()
+    assert year.nb_visits == 14
+    views = MatomoPageViewsRollup.query.filter_by(
+        report="dataset_views", period="year", period_start=date(2021, 1, 1)).one()
+    assert (views.item, views.nb_hits, views.nb_visits) == ("projects/rollup", 14, 3)
+
+    # committed rows are not rolled back by the session fixture
+    for model in (MatomoDailyVisitsSummary, MatomoDailyGetDatasetPageViewsSummary,
+                  MatomoVisitsSummaryRollup, MatomoPageViewsRollup, MatomoRollupState):
+        model.query.delete()
+    session.commit()
+
+
+def test_analytics_routes_read_rollups(session, test_client):
+    """
+    GIVEN up to date rollups
+    WHEN the analytics routes are called on month or year boundaries
+    THEN the rollups give the same response as the daily rows
+    """
+    session.add(Dataset(dataset_id="projects/rollup", name="Rollup", version="1.0",
+                        is_private=False, fspath="./test/rollup"))
+    _add_days(session, [(date(2020, 12, 31), 1), (date(2021, 1, 1), 2), (date(2021, 2, 2), 4)])
+
+    urls = ["/analytics/visitors?granularity=month",
+            "/analytics/datasets/views",
+            "/analytics/datasets/views?granularity=month&from=2021-01-01",
+            "/analytics/datasets/views?granularity=year&to=2020-12-31",
+            # not aligned on a month, read from the daily rows
+            "/analytics/datasets/views?granularity=month&from=2021-01-02"]
+    daily_bodies = [test_client.get(url).get_json(force=True) for url in urls]
+    refresh_matomo_rollups()
+    rollup_bodies = [test_client.get(url).get_json(force=True) for url in urls]
+
+    assert rollup_bodies == daily_bodies
+    assert [e["nb_visits"] for e in rollup_bodies[0]] == [1, 2, 4]
+    assert [(e["date"], e["nb_hits"]) for e in rollup_bodies[2]] == [
+        ("2021-01-01", 2), ("2021-02-01", 4)]
+
+    # committed rows are not rolled back by the session fixture
+    Dataset.query.filter_by(dataset_id="projects/rollup").delete()
+    for model in (MatomoDailyVisitsSummary, MatomoDailyGetDatasetPageViewsSummary,
+                  MatomoVisitsSummaryRollup, MatomoPageViewsRollup, MatomoRollupState):
+        model.query.delete()
+    session.commit()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import json
+import pytest
+from app.pipelines.listing import get_pipeline_listing, parse_sort_keys
+from app.pipelines.registry import PipelineRegistry
+
+
+PIPELINES = [
+    {"ID": "zenodo.1", "TITLE": "FSL BET", "DOWNLOADS": 12,
+     "DEPRECATED": False, "tool-version": "6.0"},
+    {"ID": "zenodo.2", "TITLE": "dcm2niix", "DOWNLOADS": 30,
+     "DEPRECATED": False},
+    {"ID": "zenodo.3", "TITLE": "Old BET", "DOWNLOADS": 5,
+     "DEPRECATED": True},
+    {"ID": "zenodo.4", "TITLE": "Blocked BET", "DOWNLOADS": 1,
+     "DEPRECATED": False},
+]
+
+IMAGES = ("/static/gray.png", "/static/green.png")
+
+
+def _write_static_files(static_dir, cbrain_urls, blocked_ids):
+    static_dir.join("cbrain-conp-pipeline.json").write(json.dumps(cbrain_urls))
+    static_dir.join("block-list-pipeline.json").write(json.dumps(blocked_ids))
+
+
+def _ids(listing, positions):
+    return [listing.records[p]["id"] for p in positions]
+
+
+def test_pipeline_listing(tmpdir):
+    """
+    GIVEN a pipeline registry and the static pipeline files
+    WHEN the pipeline listing is built
+    THEN deprecated and blocked pipelines are left out
+    AND the listing records carry their CBRAIN platform
+    AND the listing is rebuilt once a static file is replaced
+    """
+    registry = PipelineRegistry(("test",), PIPELINES)
+    _write_static_files(
+        tmpdir, {"zenodo.1": "https://cbrain/1"}, ["zenodo.4"])
+
+    listing = get_pipeline_listing(registry, str(tmpdir), IMAGES)
+    assert get_pipeline_listing(registry, str(tmpdir), IMAGES) is listing
+    assert _ids(listing, listing.positions()) == ["zenodo.1", "zenodo.2"]
+    assert listing.records[0]["toolversion"] == "6.0"
+    assert listing.records[0]["platforms"] == [
+        {"img": "/static/green.png", "uri": "https://cbrain/1"}]
+    assert listing.records[1]["platforms"] == [
+        {"img": "/static/gray.png", "uri": ""}]
+    assert _ids(listing, listing.positions("bet")) == ["zenodo.1"]
+    assert _ids(listing, listing.positions(cbrain=True)) == ["zenodo.1"]
+
+    _write_static_files(tmpdir, {}, ["zenodo.4", "zenodo.1", "extra"])
+    rebuilt = get_pipeline_listing(registry, str(tmpdir), IMAGES)
+    assert rebuilt is not listing
+    assert _ids(rebuilt, rebuilt.positions()) == ["zenodo.2"]
+
+
+def test_pipeline_listing_facets_and_sorting(tmpdir):
+    """
+    GIVEN a pipeline listing
+    WHEN the pipelines are filtered by domain tags and sorted
+    THEN the selected pipelines have every tag and the tags are counted
+    AND the presorted orderings and multi-key sorts are applied
+    """
+    pipelines = [
+        {"ID": "zenodo.1", "TITLE": "b", "DOWNLOADS": 10,
+         "tags": {"domain": ["MRI", "neuroinformatics"]}},
+        {"ID": "zenodo.2", "TITLE": "a", "DOWNLOADS": 10,
+         "tags": {"domain": ["mri"]}},
+        {"ID": "zenodo.3", "TITLE": "c", "DOWNLOADS": 20,
+         "tags": {"domain": "eeg"}},
+    ]
+    _write_static_files(tmpdir, {}, [])
+    listing = get_pipeline_listing(
+        PipelineRegistry(("facets",), pipelines), str(tmpdir), IMAGES)
+
+    positions = listing.positions()
+    selected = listing.select_tags(positions, ["mri"])
+    assert selected == {0, 1}
+    assert listing.tag_counts(positions, selected) == {
+        "eeg": 0, "mri": 2, "neuroinformatics": 1}
+
+    def ids(sort_key, selected=set(positions)):
+        return _ids(listing, listing.sort(
+            positions, selected, parse_sort_keys(sort_key)))
+
+    assert ids("downloads-desc") == ["zenodo.3", "zenodo.1", "zenodo.2"]
+    assert ids("title-asc") == ["zenodo.2", "zenodo.1", "zenodo.3"]
+    assert ids("downloads-asc,title-asc") == ["zenodo.2", "zenodo.1", "zenodo.3"]
+    assert ids("downloads-desc,id-desc", selected) == ["zenodo.2", "zenodo.1"]
+    assert ids("relevance") == ["zenodo.1", "zenodo.2", "zenodo.3"]
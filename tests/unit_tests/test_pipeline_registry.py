@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import pytest
+from app.pipelines.registry import get_pipeline_registry
+from app.pipelines.snapshot import (
+    SNAPSHOT_FILENAME, merge_descriptors, read_pipeline_shard,
+    write_pipeline_shards, write_pipeline_snapshot)
+
+
+ALL_DESCRIPTORS = [
+    {"ID": "zenodo.1", "TITLE": "FSL BET", "DESCRIPTION": "Brain extraction",
+     "DOWNLOADS": 12, "DEPRECATED": False},
+    {"ID": "zenodo.2", "TITLE": "dcm2niix", "DESCRIPTION": "DICOM conversion",
+     "DOWNLOADS": 30, "DEPRECATED": False},
+]
+
+DETAILED_ALL_DESCRIPTORS = [
+    {"name": "bet", "tags": {"domain": ["neuroinformatics", "mri"]}},
+    {"name": "dcm2niix", "tags": {"domain": ["mri"]}},
+]
+
+
+def _write_cache(cache_dir, all_descriptors, detailed_all_descriptors):
+    with open(os.path.join(cache_dir, "all_descriptors.json"), "w") as f:
+        json.dump(all_descriptors, f)
+    with open(os.path.join(cache_dir, "detailed_all_descriptors.json"), "w") as f:
+        json.dump(detailed_all_descriptors, f)
+
+
+def test_registry_reloads_modified_cache(tmpdir):
+    """
+    GIVEN the Boutiques cache files
+    WHEN the pipeline registry is requested twice
+    THEN the files are loaded once and the descriptors merged by id
+    AND the registry is reloaded once the files are replaced
+    """
+    cache_dir = str(tmpdir)
+    _write_cache(cache_dir, ALL_DESCRIPTORS, DETAILED_ALL_DESCRIPTORS)
+
+    registry = get_pipeline_registry(cache_dir)
+    assert len(registry) == 2
+    assert get_pipeline_registry(cache_dir) is registry
+    assert registry.get("zenodo.1")["name"] == "bet"
+    assert registry.get("zenodo.1")["TITLE"] == "FSL BET"
+    assert registry.get("zenodo.3") is None
+
+    _write_cache(cache_dir, ALL_DESCRIPTORS[:1], DETAILED_ALL_DESCRIPTORS[:1])
+    reloaded = get_pipeline_registry(cache_dir)
+    assert reloaded is not registry
+    assert len(reloaded) == 1
+
+
+def test_registry_summaries(tmpdir):
+    """
+    GIVEN the Boutiques cache files
+    WHEN the summary of a pipeline is looked up by id
+    THEN its title, domain tags, downloads and deprecation are returned
+    """
+    cache_dir = str(tmpdir)
+    _write_cache(cache_dir, ALL_DESCRIPTORS, DETAILED_ALL_DESCRIPTORS)
+
+    summary = get_pipeline_registry(cache_dir).summary("zenodo.1")
+    assert summary.title == "FSL BET"
+    assert summary.tags == ("neuroinformatics", "mri")
+    assert summary.downloads == 12
+    assert summary.deprecated is False
+    assert get_pipeline_registry(cache_dir).summary("zenodo.3") is None
+
+
+def test_registry_search(tmpdir):
+    """
+    GIVEN the Boutiques cache files
+    WHEN the pipelines are searched
+    THEN the matching pipelines are ranked, words matching as prefixes
+    AND punctuation of the descriptors is not matched
+    """
+    cache_dir = str(tmpdir)
+    _write_cache(cache_dir, ALL_DESCRIPTORS, DETAILED_ALL_DESCRIPTORS)
+    registry = get_pipeline_registry(cache_dir)
+
+    assert [p["ID"] for p in registry.search("mri")] == ["zenodo.1", "zenodo.2"]
+    assert [p["ID"] for p in registry.search("dcm")] == ["zenodo.2"]
+    assert [p["ID"] for p in registry.search("brain extr")] == ["zenodo.1"]
+    assert registry.search("mri dicom bet") == []
+    assert registry.search("'") == registry.pipelines
+
+
+def test_registry_reads_snapshot(tmpdir):
+    """
+    GIVEN a pipeline snapshot next to the older cache files
+    WHEN the pipeline registry is requested
+    THEN the descriptors and listing records of the snapshot are used
+    """
+    cache_dir = str(tmpdir)
+    _write_cache(cache_dir, ALL_DESCRIPTORS, DETAILED_ALL_DESCRIPTORS)
+    snapshot_path = os.path.join(cache_dir, SNAPSHOT_FILENAME)
+    write_pipeline_snapshot(snapshot_path, merge_descriptors(
+        ALL_DESCRIPTORS[1:], DETAILED_ALL_DESCRIPTORS[1:]))
+    assert not [f for f in os.listdir(cache_dir) if f.endswith(".tmp")]
+
+    registry = get_pipeline_registry(cache_dir)
+    assert [p["ID"] for p in registry.pipelines] == ["zenodo.2"]
+    assert registry.records[0]["id"] == "zenodo.2"
+    assert registry.records[0]["downloads"] == 30
+    assert registry.search("dicom", records=True) == registry.records
+
+
+def test_pipeline_shards(tmpdir):
+    """
+    GIVEN the shards of a pipeline refresh
+    WHEN a pipeline is read by id
+    THEN its page record is returned, keys lowercase without spaces
+    AND unknown or invalid ids and removed pipelines are not found
+    """
+    shard_dir = str(tmpdir.join("pipelines"))
+    pipelines = merge_descriptors(ALL_DESCRIPTORS, DETAILED_ALL_DESCRIPTORS)
+    assert write_pipeline_shards(shard_dir, pipelines) == 2
+
+    record = read_pipeline_shard(shard_dir, "zenodo.1")
+    assert record["id"] == "zenodo.1"
+    assert record["title"] == "FSL BET"
+    assert record["tags"] == {"domain": ["neuroinformatics", "mri"]}
+    assert read_pipeline_shard(shard_dir, "zenodo.3") is None
+    assert read_pipeline_shard(shard_dir, "../zenodo.1") is None
+    assert read_pipeline_shard(shard_dir, None) is None
+
+    write_pipeline_shards(shard_dir, pipelines[1:])
+    assert read_pipeline_shard(shard_dir, "zenodo.1") is None
+    assert read_pipeline_shard(shard_dir, "zenodo.2")["downloads"] == 30
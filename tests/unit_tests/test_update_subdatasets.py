@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import git
+import pytest
+from datetime import datetime
+from app.cli import _read_git_metadata, _save_subdatasets
+from app.models import ArkId, Dataset, DatasetAncestry
+
+
+def test_read_git_metadata(tmpdir):
+    """
+    GIVEN a git repository with two commits and a remote
+    WHEN its metadata is read
+    THEN the first and last commit timestamps and the remote URL are returned
+    """
+    repo = git.Repo.init(str(tmpdir))
+    repo.create_remote("origin", "https://github.com/conpdatasets/test.git")
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "Test")
+        config.set_value("user", "email", "test@example.com")
+    for date in ("2020-01-01T00:00:00", "2021-06-01T00:00:00"):
+        tmpdir.join("README.md").write(date)
+        repo.index.add(["README.md"])
+        repo.index.commit(date, author_date=date, commit_date=date)
+
+    create_timestamp, update_timestamp, remote_url = _read_git_metadata(str(tmpdir))
+    assert datetime.fromtimestamp(create_timestamp).year == 2020
+    assert datetime.fromtimestamp(update_timestamp).year == 2021
+    assert remote_url == "https://github.com/conpdatasets/test.git"
+
+    assert _read_git_metadata(str(tmpdir.join("missing"))) == (None, None, None)
+
+
+def test_save_subdatasets(session, app):
+    """
+    GIVEN subdatasets read by the worker processes
+    WHEN they are saved
+    THEN the datasets and their ancestry are written in one batch
+    AND the new datasets get an ARK identifier
+    """
+    dats = {
+        "title": "Batch Child",
+        "extraProperties": [{"category": "parent_dataset_id",
+                             "values": [{"value": "batch-parent"}]}],
+    }
+    subdataset_reads = [{
+        "dataset_id": "projects/batch-child",
+        "path": "/data/conp-dataset/projects/batch-child",
+        "dats": dats,
+        "create_timestamp": 1577836800,
+        "update_timestamp": None,
+        "remote_url": "https://github.com/conpdatasets/batch-child.git",
+    }]
+
+    with app.app_context():
+        _save_subdatasets(app, subdataset_reads)
+        _save_subdatasets(app, subdataset_reads)
+
+    dataset = Dataset.query.filter_by(dataset_id="projects/batch-child").one()
+    assert dataset.name == "Batch Child"
+    assert dataset.description == "No description in DATS.json"
+    assert dataset.date_created == datetime.fromtimestamp(1577836800)
+    assert dataset.remoteUrl == "https://github.com/conpdatasets/batch-child.git"
+    assert DatasetAncestry.query.filter_by(
+        child_dataset_id="projects/batch-child").count() == 1
+    assert ArkId.query.filter_by(dataset_id="projects/batch-child").count() == 1
+
+    # committed rows are not rolled back by the session fixture
+    Dataset.query.filter_by(dataset_id="projects/batch-child").delete()
+    DatasetAncestry.query.filter_by(child_dataset_id="projects/batch-child").delete()
+    ArkId.query.filter_by(dataset_id="projects/batch-child").delete()
+    session.commit()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+import pytest
+from app.pipelines import zenodo
+from app.pipelines.zenodo import (
+    previous_descriptors, pull_descriptors, search_descriptors)
+
+
+def _hit(record_id, downloads, version="1.0"):
+    return {
+        "id": record_id,
+        "doi": "10.5281/zenodo.{}".format(record_id),
+        "stats": {"version_downloads": downloads},
+        "metadata": {
+            "title": "Tool {}".format(record_id),
+            "description": "A tool",
+            "publication_date": "2020-01-01",
+            "creators": [{"name": "Author"}],
+            "version": version,
+            "keywords": ["Boutiques", "schema-version:0.5", "docker"],
+        },
+    }
+
+
+class _Response(object):
+    def __init__(self, hits, total):
+        self.hits = hits
+        self.total = total
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"hits": {"hits": self.hits, "total": self.total}}
+
+
+class _Session(object):
+    def __init__(self, hits):
+        self.hits = hits
+        self.pages = []
+
+    def get(self, url, params):
+        self.pages.append(params["page"])
+        start = (params["page"] - 1) * params["size"]
+        return _Response(self.hits[start:start + params["size"]], len(self.hits))
+
+
+def test_search_descriptors_paginates():
+    """
+    GIVEN more Boutiques records on Zenodo than the page size
+    WHEN the descriptors are searched
+    THEN every page is requested and the summaries sorted by downloads
+    """
+    session = _Session([_hit(i, downloads=i) for i in range(1, 6)])
+    summaries = search_descriptors(page_size=2, session=session)
+
+    assert session.pages == [1, 2, 3]
+    assert [s["ID"] for s in summaries] == [
+        "zenodo.5", "zenodo.4", "zenodo.3", "zenodo.2", "zenodo.1"]
+    assert summaries[0]["CONTAINER"] == "docker"
+    assert summaries[0]["DEPRECATED"] is False
+
+
+def test_pull_descriptors_only_pulls_changes(tmpdir, monkeypatch):
+    """
+    GIVEN the descriptors of a previous refresh
+    WHEN the descriptors found on Zenodo are pulled
+    THEN only the new or updated descriptors are pulled
+    AND the descriptors that cannot be pulled are left out
+    """
+    pulled = []
+
+    def pull(zid):
+        pulled.append(zid)
+        if zid == "zenodo.4":
+            raise ValueError("not found")
+        return {"name": "pulled {}".format(zid)}
+
+    monkeypatch.setattr(zenodo, "_pull_descriptor", pull)
+
+    searcher = zenodo.Searcher(query=None, no_trunc=True)
+    old = [zenodo._descriptor_summary(searcher, _hit(i, 0)) for i in (1, 2)]
+    previous = previous_descriptors([
+        dict(old[0], name="one"), dict(old[1], name="two")])
+
+    summaries = [zenodo._descriptor_summary(searcher, h) for h in (
+        _hit(1, 0), _hit(2, 0, version="2.0"), _hit(3, 0), _hit(4, 0))]
+    tmpdir.join("zenodo-2.json").write("{}")
+
+    summaries, detailed = pull_descriptors(
+        summaries, previous, str(tmpdir), max_workers=2)
+
+    assert previous[("zenodo.1", "1.0", "10.5281/zenodo.1")] == {"name": "one"}
+    assert sorted(pulled) == ["zenodo.2", "zenodo.3", "zenodo.4"]
+    assert not tmpdir.join("zenodo-2.json").exists()
+    assert [s["ID"] for s in summaries] == ["zenodo.1", "zenodo.2", "zenodo.3"]
+    assert [d["name"] for d in detailed] == [
+        "one", "pulled zenodo.2", "pulled zenodo.3"]
+
+
+def test_pull_descriptors_keeps_previous_version(tmpdir, monkeypatch):
+    """
+    GIVEN a descriptor with a new version on Zenodo
+    WHEN the new version cannot be pulled
+    THEN the previous version of the descriptor and its cached file are kept
+    AND the next refresh pulls the new version again
+    """
+    def pull(zid):
+        raise IOError("Zenodo is down")
+
+    monkeypatch.setattr(zenodo, "_pull_descriptor", pull)
+
+    searcher = zenodo.Searcher(query=None, no_trunc=True)
+    previous = previous_descriptors([
+        dict(zenodo._descriptor_summary(searcher, _hit(1, 0)), name="one")])
+    tmpdir.join("zenodo-1.json").write("{}")
+
+    summaries, detailed = pull_descriptors(
+        [zenodo._descriptor_summary(searcher, _hit(1, 5, version="2.0")),
+         zenodo._descriptor_summary(searcher, _hit(2, 0))],
+        previous, str(tmpdir), max_workers=2)
+
+    assert tmpdir.join("zenodo-1.json").read() == "{}"
+    assert not tmpdir.join("zenodo-1.json.previous").exists()
+    assert [(s["ID"], s["VERSION"], s["DOWNLOADS"]) for s in summaries] == [
+        ("zenodo.1", "1.0", 5)]
+    assert detailed == [{"name": "one"}]
+    assert previous_descriptors([dict(summaries[0], **detailed[0])]) == previous